@@ -1,10 +1,22 @@
-import numpy as np
-import pathos.multiprocessing as mproc  # type: ignore
+import functools
 import itertools
-from typing import Callable, Sequence, TypeVar, Iterable, NamedTuple, Any, Optional
+from typing import (Callable, Sequence, TypeVar, Iterable, Iterator, NamedTuple, Any,
+                    Optional, Protocol, Union, TYPE_CHECKING)
 import logging
-import pickle
+import math
+import os
+import tempfile
+import time
 import traceback
+import uuid
+
+# numpy and pathos are imported where they're used, so that importing
+# GamePayoffs, and so auto_chess, needs only the standard library. Worker
+# processes and tests which only play games start much faster for it.
+if TYPE_CHECKING:
+    import numpy as np
+    from analysis.packed import PackedMatrix
+    from analysis.streaming import RunningMeans
 
 Deck = TypeVar("Deck")
 
@@ -12,23 +24,14 @@ Deck = TypeVar("Deck")
 log = logging.getLogger(__name__)
 
 
-# each Job stores the indices with which it corresponds in the payoff
-# matrix so that we can evaluate them out of order and then insert
-# them into the matrix as appropriate.
-
-# if mypy sucked less, this would be defined as:
-# class Job(NamedTuple, Generic[Deck]):
-#     i: int
-#     deck_i: Deck
-#     j: int
-#     deck_j: Deck
-# but for some stupid reason, mypy doesn't support generic named tuple
-# types, so instead we get the following.
-class Job(NamedTuple):
-    i: int
-    deck_i: Any
-    j: int
-    deck_j: Any
+# each Chunk stores the indices with which its games correspond in the
+# payoff matrix, deck i playing first against deck j, so that we can
+# evaluate them out of order and then insert them into the matrix as
+# appropriate. Worker processes get the decks once per tournament, so a
+# Chunk is all they need to play its games.
+class Chunk(NamedTuple):
+    i: 'np.ndarray'
+    j: 'np.ndarray'
 
 
 class DeckResults(NamedTuple):
@@ -48,13 +51,76 @@ class GamePayoffs(NamedTuple):
         return cls(p0_payoff, - p0_payoff)
 
 
-class FinishedJob(NamedTuple):
-    job: Job
-    payoffs: GamePayoffs
+class FinishedChunk(NamedTuple):
+    chunk: Chunk
+    # None if a worker wrote them into a shared matrix itself
+    p0_payoffs: Optional['np.ndarray']
+    p1_payoffs: Optional['np.ndarray']
+    # whatever else the payoff function reported about each game, if
+    # the tournament asked for it
+    stats: Optional[list] = None
 
 
 PayoffFn = Callable[[Deck, Deck], GamePayoffs]
-RunnerFn = Callable[[PayoffFn, Iterable[Job]], Iterable[FinishedJob]]
+# a dense float64 payoff matrix, a packed one, or running means in
+# place of one
+Matrix = Union['np.ndarray', 'PackedMatrix', 'RunningMeans']
+# (payoff_fn, decks, with_stats)
+RunnerFn = Callable[[PayoffFn, Sequence[Any], bool], Iterable[FinishedChunk]]
+
+
+class StatsSink(Protocol):
+    """Where a tournament puts the stats of each game, e.g. an
+    auto_chess.stats.StatsTable."""
+    def record(self, i: int, j: int, stats: Any) -> None:
+        """Store the stats of the game between decks i and j, in which
+        deck i played first."""
+
+
+class BatchedPayoffFn:
+    """A PayoffFn which can also play many games in one call.
+
+    many takes a sequence of (deck_0, deck_1) and returns their
+    payoffs in the same order. The runners pass it a chunk of games at
+    a time, BATCH_SIZE of them in the calling process, rather than
+    calling one for each game, which saves the payoff function's setup
+    per call.
+
+    with_stats, if given, is like many, but returns (payoffs, stats)
+    for each game, for tournaments which collect stats.
+
+    flush, if given, is called after each chunk, to write out anything
+    the payoff function buffers. Worker processes exit without running
+    atexit handlers, so what isn't flushed by then is lost.
+    """
+    def __init__(
+            self,
+            one: Callable[[Any, Any], GamePayoffs],
+            many: Callable[[Sequence[tuple[Any, Any]]], Sequence[GamePayoffs]],
+            *,
+            with_stats: Optional[
+                Callable[[Sequence[tuple[Any, Any]]], Sequence[tuple[GamePayoffs, Any]]]
+            ] = None,
+            flush: Optional[Callable[[], None]] = None,
+    ):
+        self.one = one
+        self.many = many
+        self.with_stats = with_stats
+        self.flush = flush
+
+    def __call__(self, deck_0: Any, deck_1: Any) -> GamePayoffs:
+        return self.one(deck_0, deck_1)
+
+
+BATCH_SIZE: int = 64
+
+# the multiprocess runner sizes its chunks to take about CHUNK_SECONDS
+# each to play, judging by PROBE_GAMES games it plays itself first, but
+# makes at least CHUNKS_PER_WORKER per worker, so that none is left
+# idle while the others finish long chunks.
+CHUNK_SECONDS: float = 0.1
+PROBE_GAMES: int = 64
+CHUNKS_PER_WORKER: int = 4
 
 
 def zero_sum_payoff_fn(fn: Callable[[Deck, Deck], float]) -> PayoffFn:
@@ -63,77 +129,311 @@ def zero_sum_payoff_fn(fn: Callable[[Deck, Deck], float]) -> PayoffFn:
     return payoff_inner
 
 
-def _jobs_iterator(decks) -> Iterable[Job]:
-    """Iterate over the Jobs required to compute a payoff matrix for the decks."""
-    for ((i, d0), (j, d1)) in itertools.product(
-            enumerate(decks),
-            enumerate(decks),
-    ):
-        if j <= i:
-            yield Job(i, d0, j, d1)
+def _pairs(n_decks: int) -> Chunk:
+    """The indices of every game needed to compute a payoff matrix for
+    n_decks decks, row by row."""
+    import numpy as np
+
+    (i, j) = np.tril_indices(n_decks)
+    return Chunk(i.astype(np.int32), j.astype(np.int32))
+
+
+def _split(pairs: Chunk, size: int) -> Iterator[Chunk]:
+    for start in range(0, len(pairs.i), size):
+        yield Chunk(pairs.i[start:start + size], pairs.j[start:start + size])
+
+
+def _play_one(payoff_fn: PayoffFn, i: int, deck_i: Any, j: int, deck_j: Any,
+              catch_errors: bool) -> GamePayoffs:
+    if not catch_errors:
+        return payoff_fn(deck_i, deck_j)
+    try:
+        return payoff_fn(deck_i, deck_j)
+    except Exception as err:
+        log.exception(
+            "error %s in game at %d, %d between %s, %s",
+            err,
+            i, j,
+            deck_i, deck_j,
+        )
+        # punish both players for causing an error
+        return GamePayoffs(-1, -1)
+
+
+def _play_chunk(
+        payoff_fn: PayoffFn,
+        decks: Sequence[Any],
+        chunk: Chunk,
+        with_stats: bool,
+        *,
+        catch_errors: bool = False,
+) -> FinishedChunk:
+    """Play chunk's games. With catch_errors, a game which raises an
+    exception costs both decks a game rather than the tournament."""
+    import numpy as np
+
+    indices = list(zip(chunk.i.tolist(), chunk.j.tolist()))
+    pairs = [(decks[i], decks[j]) for (i, j) in indices]
+    payoffs: Sequence[GamePayoffs]
+    stats: Optional[list] = None
+    try:
+        if not isinstance(payoff_fn, BatchedPayoffFn):
+            payoffs = [_play_one(payoff_fn, i, deck_i, j, deck_j, catch_errors)
+                       for ((i, j), (deck_i, deck_j)) in zip(indices, pairs)]
+        elif with_stats:
+            assert payoff_fn.with_stats is not None
+            results = payoff_fn.with_stats(pairs)
+            payoffs = [payoffs for (payoffs, _) in results]
+            stats = [game_stats for (_, game_stats) in results]
+        else:
+            payoffs = payoff_fn.many(pairs)
+    except Exception:
+        if not catch_errors:
+            raise
+        # play them one at a time, to find out which failed. They have
+        # no stats.
+        stats = None
+        payoffs = [_play_one(payoff_fn, i, deck_i, j, deck_j, catch_errors)
+                   for ((i, j), (deck_i, deck_j)) in zip(indices, pairs)]
+    if isinstance(payoff_fn, BatchedPayoffFn) and payoff_fn.flush is not None:
+        payoff_fn.flush()
+    p0_payoffs = np.array([p0 for (p0, _) in payoffs], dtype=np.float64)
+    p1_payoffs = np.array([p1 for (_, p1) in payoffs], dtype=np.float64)
+    return FinishedChunk(chunk, p0_payoffs, p1_payoffs, stats)
 
 
 def _run_sequentially(
         payoff_fn: PayoffFn,
-        jobs: Iterable[Job],
-) -> Iterable[FinishedJob]:
-    """Run the jobs in the calling process by applying payoff_fn to the two decks"""
-    for job in jobs:
-        payoff = payoff_fn(job.deck_i, job.deck_j)
-        yield FinishedJob(job, payoff)
+        decks: Sequence[Any],
+        with_stats: bool = False,
+) -> Iterable[FinishedChunk]:
+    """Run the games in the calling process by applying payoff_fn to the
+    two decks, BATCH_SIZE at a time"""
+    for chunk in _split(_pairs(len(decks)), BATCH_SIZE):
+        yield _play_chunk(payoff_fn, decks, chunk, with_stats)
+
+
+def _temporary_path(suffix: str, directory: Optional[str] = None) -> str:
+    return os.path.join(directory or tempfile.gettempdir(),
+                        f"ludus-tournament-{uuid.uuid4().hex}{suffix}")
+
+
+def _shared_matrix(n_decks: int, packed: bool) -> tuple[str, Matrix]:
+    """A new payoff matrix which worker processes can write into, and
+    the path of the .npy file they map it from. On Linux, the file is in
+    memory."""
+    import numpy as np
+    from analysis.packed import PackedMatrix
+
+    path = _temporary_path(".npy", "/dev/shm" if os.path.isdir("/dev/shm") else None)
+    if packed:
+        return (path, PackedMatrix.zeros(n_decks, path))
+    return (path, np.lib.format.open_memmap(path, mode="w+", dtype=np.float64,
+                                            shape=(n_decks, n_decks)))
+
+
+def _open_matrix(path: str) -> Matrix:
+    import numpy as np
+    from analysis.packed import PackedMatrix
+
+    entries = np.load(path, mmap_mode="r+")
+    return entries if entries.ndim == 2 else PackedMatrix(entries)
+
+
+# in a worker process, the path the current tournament's payoff
+# function and decks were loaded from, and them
+_TOURNAMENT: Optional[tuple[str, PayoffFn, Sequence[Any]]] = None
+
+
+def _play_chunk_in_worker(
+        path: str,
+        shared_path: Optional[str],
+        number: int,
+        chunk: Chunk,
+        with_stats: bool,
+) -> tuple[int, Optional['np.ndarray'], Optional['np.ndarray'], Optional[list]]:
+    global _TOURNAMENT
+    if _TOURNAMENT is None or _TOURNAMENT[0] != path:
+        import dill  # type: ignore
+
+        with open(path, "rb") as saved:
+            (payoff_fn, decks) = dill.load(saved)
+        _TOURNAMENT = (path, payoff_fn, decks)
+    (_, payoff_fn, decks) = _TOURNAMENT
+    finished = _play_chunk(payoff_fn, decks, chunk, with_stats, catch_errors=True)
+    if shared_path is not None:
+        # mapped for this chunk only: a worker outlives the tournament,
+        # and its mapping would keep the file's memory after the parent
+        # removes it
+        matrix = _open_matrix(shared_path)
+        _collect_finished_chunks(matrix, decks, [finished])
+        del matrix
+        return (number, None, None, finished.stats)
+    # the parent knows which games chunk number holds, so only send back
+    # their results
+    return (number, finished.p0_payoffs, finished.p1_payoffs, finished.stats)
+
+
+def _end_tournament_in_worker(path: str) -> None:
+    """Drop the payoff function and decks loaded from path, if this
+    worker has them."""
+    global _TOURNAMENT
+    if _TOURNAMENT is not None and _TOURNAMENT[0] == path:
+        _TOURNAMENT = None
+
+
+class WorkerPool:
+    """Worker processes for multiprocess tournaments, kept from one to
+    the next.
+
+    Pass one to round_robin, sampling.group_tournament or the
+    optimizers in simulated_annealing, and all their tournaments are
+    played in the same workers, which keep their imported modules, card
+    registry and game cache warm between them:
+
+        with analysis.WorkerPool() as pool:
+            for group in groups:
+                analysis.round_robin(payoff_fn, group, pool=pool)
+
+    The workers are forked when the pool is made, so they see the
+    calling process as it was then: enable the disk cache, tracing or
+    profiling first.
+    """
+    def __init__(self, processes: Optional[int] = None):
+        import pathos.multiprocessing as mproc  # type: ignore
+
+        self.processes: int = processes if processes is not None else mproc.cpu_count()
+        # an id of its own, so that pathos neither hands these workers
+        # to another caller nor replaces them when a pool with other
+        # settings is asked for
+        self._pool = mproc.ProcessPool(self.processes,
+                                       id=f"ludus-{uuid.uuid4().hex}")
+
+    def uimap(self, fn: Callable, *args: Iterable) -> Iterator:
+        """fn applied to each of args' items in a worker, in the order
+        they finish."""
+        return self._pool.uimap(fn, *args)
+
+    def close(self) -> None:
+        """Stop the workers, once they've finished what they were given."""
+        self._pool.clear()
+
+    def __enter__(self) -> 'WorkerPool':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+
+def _chunk_size(seconds_per_game: float, n_games: int, workers: int) -> int:
+    size = int(CHUNK_SECONDS / max(seconds_per_game, 1e-9))
+    return max(1, min(size, math.ceil(n_games / (workers * CHUNKS_PER_WORKER))))
 
 
 def _run_multiprocess(
         payoff_fn: PayoffFn,
-        jobs: Iterable[Job],
-) -> Iterable[FinishedJob]:
-    """Run the jobs in parallel in multiple processes"""
-    def run_job(job):
-        try:
-            payoff = payoff_fn(job.deck_i, job.deck_j)
-        except Exception as err:
-            log.exception(
-                "error %s in game at %d, %d between %s, %s",
-                err,
-                job.i, job.j,
-                job.deck_i, job.deck_j,
+        decks: Sequence[Any],
+        with_stats: bool = False,
+        pool: Optional[WorkerPool] = None,
+        shared_path: Optional[str] = None,
+) -> Iterable[FinishedChunk]:
+    """Run the games in parallel in pool's worker processes, or if it's
+    None, in the pool pathos shares between its callers. With
+    shared_path, the workers write their results into the matrix in the
+    .npy file there themselves, and only their stats come back.
+
+    The payoff function and decks go to each worker once, through a
+    temporary file, and after that, chunks of games only as their
+    indices. A few games spread across the tournament are first played
+    in this process, to size the chunks by how long a game takes.
+    """
+    import dill
+    import numpy as np
+    import pathos.multiprocessing as mproc  # type: ignore
+
+    pairs = _pairs(len(decks))
+    n_games = len(pairs.i)
+    probed = np.zeros(n_games, dtype=bool)
+    probed[np.linspace(0, n_games - 1, min(n_games, PROBE_GAMES)).astype(int)] = True
+    start = time.perf_counter()
+    yield _play_chunk(payoff_fn, decks, Chunk(pairs.i[probed], pairs.j[probed]),
+                      with_stats, catch_errors=True)
+    seconds_per_game = (time.perf_counter() - start) / max(probed.sum(), 1)
+
+    rest = Chunk(pairs.i[~probed], pairs.j[~probed])
+    if not len(rest.i):
+        # a small group, already played
+        return
+    workers = pool.processes if pool is not None else mproc.cpu_count()
+    size = _chunk_size(seconds_per_game, len(rest.i), workers)
+    chunks = list(_split(rest, size))
+    log.info("playing %d games in %d chunks of %d", len(rest.i), len(chunks), size)
+
+    path = _temporary_path(".dill")
+    workers_pool = pool or mproc.ProcessPool()
+    try:
+        with open(path, "wb") as out:
+            dill.dump((payoff_fn, decks), out)
+        results = workers_pool.uimap(
+            _play_chunk_in_worker,
+            itertools.repeat(path),
+            itertools.repeat(shared_path),
+            range(len(chunks)),
+            chunks,
+            itertools.repeat(with_stats),
+        )
+        for (number, p0_payoffs, p1_payoffs, stats) in results:
+            yield FinishedChunk(chunks[number], p0_payoffs, p1_payoffs, stats)
+        # one per worker, for the idle workers to take: one which misses
+        # out drops the decks when it's given its next tournament
+        list(workers_pool.uimap(_end_tournament_in_worker,
+                                itertools.repeat(path, workers)))
+    finally:
+        os.remove(path)
+
+
+def _collect_finished_chunks(
+        matrix: Matrix,
+        decks: Sequence[Any],
+        chunks: Iterable[FinishedChunk],
+        stats: Optional[StatsSink] = None,
+) -> Matrix:
+    """Insert the results of all the finished chunks into a payoff matrix,
+    unless they're already there, and their stats into stats, if given"""
+    import numpy as np
+
+    for ((i, j), p0_payoffs, p1_payoffs, chunk_stats) in chunks:
+        if stats is not None and chunk_stats is not None:
+            for (row, column, game_stats) in zip(i.tolist(), j.tolist(), chunk_stats):
+                stats.record(row, column, game_stats)
+        if p0_payoffs is None or p1_payoffs is None:
+            continue
+
+        mirror = i == j
+        for k in np.flatnonzero(mirror & (p0_payoffs != p1_payoffs)):
+            log.error(
+                "mismatched payoffs %d, %d in mirror match at (%d, %d) between %s, %s",
+                p0_payoffs[k], p1_payoffs[k],
+                i[k], j[k],
+                decks[i[k]], decks[j[k]],
             )
-            # punish both players for causing an error
-            payoff = GamePayoffs(-1, -1)
-        return FinishedJob(job, payoff)
-
-    with mproc.ProcessPool() as pool:
-        return pool.uimap(run_job, jobs)
-
-
-def _collect_finished_jobs(
-        matrix: np.ndarray,
-        jobs: Iterable[FinishedJob],
-) -> np.ndarray:
-    """Insert the results of all the finished jobs into a payoff matrix"""
-    for (job, payoffs) in jobs:
-        i = job.i
-        j = job.j
-
-        if i == j:
-            if payoffs.p0_payoff != payoffs.p1_payoff:
-                log.error(
-                    "mismatched payoffs %d, %d in mirror match at (%d, %d) between %s, %s",
-                    payoffs.p0_payoff, payoffs.p1_payoff,
-                    i, j,
-                    job.deck_i, job.deck_j,
-                )
-            matrix[i, j] = 0
-        else:
-            matrix[i, j] = payoffs.p0_payoff
-            matrix[j, i] = payoffs.p1_payoff
+        if not isinstance(matrix, np.ndarray):
+            matrix.record(i, j, p0_payoffs, p1_payoffs)
+            continue
+        matrix[i, j] = p0_payoffs
+        matrix[j, i] = p1_payoffs
+        matrix[i[mirror], i[mirror]] = 0
 
     return matrix
 
 
-def _runner_fn(multiprocess: bool) -> RunnerFn:
-    if multiprocess:
-        return _run_multiprocess
+def _runner_fn(
+        multiprocess: bool,
+        pool: Optional[WorkerPool] = None,
+        shared_path: Optional[str] = None,
+) -> RunnerFn:
+    if multiprocess or pool is not None:
+        return functools.partial(_run_multiprocess, pool=pool, shared_path=shared_path)
     else:
         return _run_sequentially
 
@@ -143,7 +443,12 @@ def round_robin(
         decks: Sequence[Deck],
         *,
         multiprocess: bool = False,
-        pickle_matrix: Optional[str] = None,
+        matrix_path: Optional[str] = None,
+        packed: bool = False,
+        stats: Optional[StatsSink] = None,
+        pool: Optional[WorkerPool] = None,
+        shared_matrix: bool = False,
+        streaming: Optional['RunningMeans'] = None,
 ) -> Iterable[DeckResults]:
     """Compute and return the Pareto optimal frontier among the decks.
 
@@ -158,11 +463,53 @@ def round_robin(
     If multiprocess is provided and True, payoff_fn will be evaluated
     in parallel using multiple processes. If multiprocess is False or
     unspecified, payoff_fn will be evaluated sequentially within the
-    calling process.
+    calling process. If pool is given, payoff_fn will be evaluated in
+    its workers, whatever multiprocess is. With shared_matrix too, the
+    payoff matrix is kept in shared memory, and the workers write their
+    results into it directly, rather than sending them back for the
+    calling process to write in.
+
+    With packed, the payoff matrix is kept as an analysis.packed
+    PackedMatrix, a byte for each pair of decks, which needs payoffs to
+    be zero-sum integers. If matrix_path is given, the matrix is packed
+    and kept in a .npy file there, where it is built and then left to be
+    opened with PackedMatrix.open, so that it needn't fit in memory.
+
+    If streaming is given, an analysis.streaming.RunningMeans for the
+    decks, no payoff matrix is kept at all: each game's payoffs are added
+    to streaming's sums as they arrive, and the results are its means.
+
+    If stats is given, payoff_fn must be a BatchedPayoffFn with
+    with_stats, and the stats of each game are recorded in stats.
 
     """
+    import numpy as np
+    from analysis.packed import PackedMatrix
+
+    if stats is not None and getattr(payoff_fn, "with_stats", None) is None:
+        raise ValueError("collecting stats needs a BatchedPayoffFn with with_stats")
+    if streaming is not None and (matrix_path is not None or packed or shared_matrix):
+        raise ValueError("streaming keeps no matrix to pack, save or share")
+
     n_decks = len(decks)
-    payoffs = np.empty((n_decks, n_decks))
+    payoffs: Matrix
+    # where worker processes write results, if they do, and whether it's
+    # a temporary file
+    shared_path = None
+    temporary = False
+    if streaming is not None:
+        payoffs = streaming
+    elif matrix_path is not None:
+        payoffs = PackedMatrix.zeros(n_decks, matrix_path)
+        if shared_matrix:
+            shared_path = matrix_path
+    elif shared_matrix and (multiprocess or pool is not None) and n_decks:
+        (shared_path, payoffs) = _shared_matrix(n_decks, packed)
+        temporary = True
+    elif packed:
+        payoffs = PackedMatrix.zeros(n_decks)
+    else:
+        payoffs = np.empty((n_decks, n_decks))
 
     log.info(
         "this tournament is %d matches",
@@ -170,19 +517,32 @@ def round_robin(
         (n_decks * (n_decks - 1)) // 2 + n_decks,
     )
 
-    payoffs = _collect_finished_jobs(
-        payoffs,
-        _runner_fn(multiprocess)(
-            payoff_fn,
-            _jobs_iterator(decks),
-        ),
-    )
-
-    if pickle_matrix:
-        with open(pickle_matrix, "wb") as picklefile:
-            pickle.dump(payoffs.tolist(), picklefile)
-
-    payoff_avgs = np.mean(payoffs, axis=1, dtype=np.float64)
+    try:
+        payoffs = _collect_finished_chunks(
+            payoffs,
+            decks,
+            _runner_fn(multiprocess, pool, shared_path)(
+                payoff_fn,
+                decks,
+                stats is not None,
+            ),
+            stats,
+        )
+    finally:
+        if temporary:
+            assert shared_path is not None
+            if isinstance(payoffs, np.ndarray):
+                payoffs = np.array(payoffs)
+            elif isinstance(payoffs, PackedMatrix):
+                payoffs = PackedMatrix(np.array(payoffs.entries), n_decks)
+            os.remove(shared_path)
+
+    if isinstance(payoffs, np.ndarray):
+        payoff_avgs = np.mean(payoffs, axis=1, dtype=np.float64)
+    else:
+        if isinstance(payoffs, PackedMatrix):
+            payoffs.flush()
+        payoff_avgs = payoffs.row_means()
 
     return (
         DeckResults(deck, payoff) for (deck, payoff)
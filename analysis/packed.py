@@ -0,0 +1,147 @@
+"""Payoff matrices of zero-sum games, a byte per pair of decks.
+
+A round robin's payoff matrix is antisymmetric, entry [j, i] being the
+negation of [i, j], with zeros on the diagonal, and auto_chess's
+payoffs are -1, 0 or 1. A PackedMatrix stores only the entries below
+the diagonal, row by row, as int8: about n_decks ** 2 / 2 bytes, where
+the dense float64 matrix takes 8 * n_decks ** 2. For the 38,416 decks of
+4 cards from ALL_CARDS, that's 0.7 GB rather than 11.8 GB.
+
+A PackedMatrix lives either in memory or in a .npy file which it maps,
+so that it needn't fit in memory at all:
+
+    analysis.round_robin(payoff_fn, decks, matrix_path="payoffs.npy")
+    matrix = PackedMatrix.open("payoffs.npy")
+    matrix.row_means()
+
+Entry [i, j] for j < i is at i * (i - 1) // 2 + j, which is also the
+order round_robin plays its games in, so the games of a chunk are
+stored next to each other.
+"""
+
+import math
+from typing import Literal, Optional
+
+import numpy as np
+
+
+# the stored value of a game which cost both decks, as the
+# multiprocess runner's games which raise do: GamePayoffs(-1, -1)
+ERROR = -128
+
+
+def packed_size(n_decks: int) -> int:
+    """The number of entries below the diagonal of an n_decks matrix."""
+    return n_decks * (n_decks - 1) // 2
+
+
+def _n_decks(size: int) -> int:
+    n_decks = (1 + math.isqrt(1 + 8 * size)) // 2
+    if packed_size(n_decks) != size:
+        raise ValueError(f"{size} entries aren't the triangle of a square matrix")
+    return n_decks
+
+
+class PackedMatrix:
+    """An antisymmetric payoff matrix, stored as the int8 entries below
+    its diagonal."""
+    def __init__(self, entries: np.ndarray, n_decks: Optional[int] = None):
+        if entries.dtype != np.int8 or entries.ndim != 1:
+            raise ValueError(f"entries must be a flat int8 array, not {entries.dtype} "
+                             f"with shape {entries.shape}")
+        self.entries = entries
+        self.n_decks = n_decks if n_decks is not None else _n_decks(len(entries))
+
+    @classmethod
+    def zeros(cls, n_decks: int, path: Optional[str] = None) -> 'PackedMatrix':
+        """A matrix of zeros in memory, or if path is given, in a new
+        .npy file there."""
+        if path is None:
+            entries = np.zeros(packed_size(n_decks), dtype=np.int8)
+        else:
+            entries = np.lib.format.open_memmap(path, mode="w+", dtype=np.int8,
+                                                shape=(packed_size(n_decks),))
+        return cls(entries, n_decks)
+
+    @classmethod
+    def open(cls, path: str, mode: Literal["r", "r+", "c"] = "r") -> 'PackedMatrix':
+        """The matrix in the .npy file at path, mapped rather than read."""
+        return cls(np.load(path, mmap_mode=mode))
+
+    def flush(self) -> None:
+        """Write the matrix out to its file, if it has one."""
+        if isinstance(self.entries, np.memmap):
+            self.entries.flush()
+
+    def record(self, i: np.ndarray, j: np.ndarray,
+               p0_payoffs: np.ndarray, p1_payoffs: np.ndarray) -> None:
+        """Store the payoffs of the games in which deck i[k] played first
+        against deck j[k], for j[k] <= i[k]. Mirror matches aren't
+        stored: they're always 0."""
+        i = np.asarray(i, dtype=np.int64)
+        j = np.asarray(j, dtype=np.int64)
+        p0_payoffs = np.asarray(p0_payoffs)
+        p1_payoffs = np.asarray(p1_payoffs)
+        if (j > i).any():
+            raise ValueError("only games with j <= i are stored")
+        games = j < i
+        errors = (p0_payoffs == -1) & (p1_payoffs == -1)
+        storable = ((p1_payoffs == -p0_payoffs) & (p0_payoffs == np.round(p0_payoffs))
+                    & (np.abs(p0_payoffs) <= 127))
+        if not (storable | errors | ~games).all():
+            k = np.flatnonzero(~(storable | errors) & games)[0]
+            raise ValueError(f"payoffs {p0_payoffs[k]}, {p1_payoffs[k]} at "
+                             f"({i[k]}, {j[k]}) aren't zero-sum small integers")
+        values = np.where(errors, ERROR, p0_payoffs).astype(np.int8)
+        self.entries[(i * (i - 1) // 2 + j)[games]] = values[games]
+
+    def __getitem__(self, index: tuple[int, int]) -> int:
+        (i, j) = index
+        if i == j:
+            return 0
+        if i > j:
+            value = int(self.entries[i * (i - 1) // 2 + j])
+            return -1 if value == ERROR else value
+        value = int(self.entries[j * (j - 1) // 2 + i])
+        return -1 if value == ERROR else -value
+
+    def row(self, i: int) -> np.ndarray:
+        """Deck i's payoff against each deck."""
+        row = np.zeros(self.n_decks, dtype=np.int8)
+        left = np.asarray(self.entries[i * (i - 1) // 2:i * (i + 1) // 2])
+        row[:i] = np.where(left == ERROR, -1, left)
+        below = np.asarray(self.entries[self._column_indices(i)])
+        row[i + 1:] = np.where(below == ERROR, -1, -below)
+        return row
+
+    def column(self, j: int) -> np.ndarray:
+        """Each deck's payoff against deck j."""
+        column = np.zeros(self.n_decks, dtype=np.int8)
+        above = np.asarray(self.entries[j * (j - 1) // 2:j * (j + 1) // 2])
+        column[:j] = np.where(above == ERROR, -1, -above)
+        below = np.asarray(self.entries[self._column_indices(j)])
+        column[j + 1:] = np.where(below == ERROR, -1, below)
+        return column
+
+    def _column_indices(self, j: int) -> np.ndarray:
+        """Where entries [i, j] for i > j are stored."""
+        i = np.arange(j + 1, self.n_decks, dtype=np.int64)
+        return i * (i - 1) // 2 + j
+
+    def row_means(self) -> np.ndarray:
+        """Each deck's mean payoff against every deck, itself included,
+        like np.mean(dense, axis=1). Reads the matrix a row at a time,
+        so it needn't fit in memory."""
+        sums = np.zeros(self.n_decks, dtype=np.int64)
+        for i in range(1, self.n_decks):
+            left = np.asarray(self.entries[packed_size(i):packed_size(i + 1)])
+            errors = left == ERROR
+            sums[i] += np.where(errors, -1, left).sum(dtype=np.int64)
+            # and [j, i] for each j < i
+            sums[:i] += np.where(errors, -1, -left.astype(np.int64))
+        return sums / max(self.n_decks, 1)
+
+    def to_dense(self) -> np.ndarray:
+        """The whole matrix, as round_robin's dense float64 matrices are."""
+        return np.array([self.row(i) for i in range(self.n_decks)],
+                        dtype=np.float64).reshape(self.n_decks, self.n_decks)
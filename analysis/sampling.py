@@ -1,6 +1,6 @@
 import logging
-from typing import Iterable
-from analysis import Deck, round_robin, PayoffFn, DeckResults
+from typing import Iterable, Optional
+from analysis import Deck, round_robin, PayoffFn, DeckResults, WorkerPool
 from random import shuffle
 
 
@@ -17,12 +17,14 @@ def group_tournament(
         decks: list[Deck],
         *,
         group_size: int = 64,
+        pool: Optional[WorkerPool] = None,
 ) -> list[DeckResults]:
     def run_group(group: list[Deck]) -> Iterable[DeckResults]:
         return round_robin(
             payoff_fn,
             group,
             multiprocess=True,
+            pool=pool,
         )
 
     my_decks: list[Deck] = decks.copy()
@@ -2,9 +2,8 @@
 import numpy as np
 import random
 import analysis.sampling as sampling
-from analysis import DeckResults
+from analysis import DeckResults, WorkerPool
 from typing import Callable, Iterable, Optional
-import run_tournament as tourney
 
 import auto_chess as ac
 
@@ -128,6 +127,7 @@ def opt_fun(
         group_size: int,
         num_decks: Optional[int],
         x0: list[int],
+        pool: Optional[WorkerPool] = None,
 ) -> float:
     log.info("chosen params for this run are %s", x0)
     cards = build_cards_fn(*x0)
@@ -142,9 +142,10 @@ def opt_fun(
             group_size, len(decks), len(cards),
         )
     results = sampling.group_tournament(
-        ac.play_auto_chess,
+        ac.payoff_fn,
         decks,
-        group_size=group_size
+        group_size=group_size,
+        pool=pool,
     )
     score = metric(results)
     log.info(f"metric evaluated to {score}")
@@ -170,7 +171,7 @@ def show_minima(x):
     log.info(f"found minimum at {x}")
 
 
-def optimize(metric, group_size, initval, build_cards_fn, num_decks=None):
+def optimize(metric, group_size, initval, build_cards_fn, num_decks=None, pool=None):
     def step(x):
         return opt_fun(
             metric=metric,
@@ -178,6 +179,7 @@ def optimize(metric, group_size, initval, build_cards_fn, num_decks=None):
             group_size=group_size,
             num_decks=num_decks,
             x0=x,
+            pool=pool,
         )
     res = minimize(
         step,
@@ -191,14 +193,17 @@ def optimize(metric, group_size, initval, build_cards_fn, num_decks=None):
     return res
 
 
-import pygad
-
-
 def generation_callback(ga):
     log.info(f"finished generation {ga.generations_completed}")
 
 
-def genetic_optimize(metric, group_size, num_genes, build_cards_fn, num_decks=None):
+def genetic_optimize(metric, group_size, num_genes, build_cards_fn, num_decks=None,
+                     pool=None):
+    """Search for the parameters of build_cards_fn which maximize metric
+    over a group tournament of their decks. Every tournament is played
+    in pool, or if it's None, in a WorkerPool kept for the whole search."""
+    import pygad
+
     evaluations = {}
     def fitness_func(params, idx):
         key = tuple(params)
@@ -210,7 +215,8 @@ def genetic_optimize(metric, group_size, num_genes, build_cards_fn, num_decks=No
                 build_cards_fn,
                 group_size,
                 num_decks,
-                params
+                params,
+                pool=pool,
             )
             return evaluations[key]
 
@@ -228,7 +234,11 @@ def genetic_optimize(metric, group_size, num_genes, build_cards_fn, num_decks=No
         init_range_high=10,
         gene_space=[list(range(1, 11))]*num_genes
     )
-    ga.run()
+    if pool is None:
+        with WorkerPool() as pool:
+            ga.run()
+    else:
+        ga.run()
     sol, sol_fitness, sol_idx = ga.best_solution()
     log.info(f'found minimum {sol} with fitness {sol_fitness} at index {sol_idx}')
     return sol
@@ -0,0 +1,90 @@
+"""Each deck's mean payoff, kept up to date as games finish, in place of
+a payoff matrix.
+
+Most tournaments only need DeckResults.avg_payoff, a payoff matrix's
+row means. Passing a RunningMeans to round_robin keeps each deck's
+payoff sum and game count instead, updating both decks' from each game,
+so memory is O(n_decks) rather than O(n_decks ** 2) and no pass over a
+matrix is needed at the end:
+
+    means = RunningMeans(len(decks), sample_size=1000)
+    results = analysis.round_robin(payoff_fn, decks, streaming=means)
+    for (i, j, payoffs) in means.sample():
+        ...
+
+The sample, if asked for, is a uniformly random set of up to
+sample_size of the games, kept by reservoir sampling, for spot checks.
+"""
+
+from typing import Optional
+
+import numpy as np
+
+from analysis import GamePayoffs
+
+
+class RunningMeans:
+    """The payoff sums and game counts of n_decks decks, and a random
+    sample of up to sample_size of their games."""
+    def __init__(
+            self,
+            n_decks: int,
+            *,
+            sample_size: int = 0,
+            seed: Optional[int] = None,
+    ):
+        self.n_decks = n_decks
+        self.sums = np.zeros(n_decks, dtype=np.float64)
+        self.counts = np.zeros(n_decks, dtype=np.int64)
+        # the games seen so far, and those sampled: (i, j, p0 payoff, p1
+        # payoff) in the first sampled of the sample_size rows
+        self.games = 0
+        self.sampled = 0
+        self._sample = np.zeros(sample_size, dtype=[
+            ("i", np.int32), ("j", np.int32), ("p0", np.float64), ("p1", np.float64),
+        ])
+        self._rng = np.random.default_rng(seed)
+
+    def record(self, i: np.ndarray, j: np.ndarray,
+               p0_payoffs: np.ndarray, p1_payoffs: np.ndarray) -> None:
+        """Add the payoffs of the games in which deck i[k] played first
+        against deck j[k]. A mirror match counts once, as a 0, as it
+        does in a payoff matrix."""
+        i = np.asarray(i)
+        j = np.asarray(j)
+        p0_payoffs = np.asarray(p0_payoffs, dtype=np.float64)
+        p1_payoffs = np.asarray(p1_payoffs, dtype=np.float64)
+        other = i != j
+        self.sums += np.bincount(i, np.where(other, p0_payoffs, 0),
+                                 minlength=self.n_decks)
+        self.sums += np.bincount(j[other], p1_payoffs[other], minlength=self.n_decks)
+        self.counts += np.bincount(i, minlength=self.n_decks)
+        self.counts += np.bincount(j[other], minlength=self.n_decks)
+        if len(self._sample):
+            self._keep(i, j, p0_payoffs, p1_payoffs)
+        self.games += len(i)
+
+    def _keep(self, i: np.ndarray, j: np.ndarray,
+              p0_payoffs: np.ndarray, p1_payoffs: np.ndarray) -> None:
+        # algorithm R: game number t replaces a random one of the sample
+        # with probability sample_size / (t + 1). Where two games of a
+        # chunk pick the same slot, numpy keeps the later, as playing
+        # them one at a time would.
+        size = len(self._sample)
+        numbers = np.arange(self.games, self.games + len(i))
+        slots = np.where(numbers < size, numbers,
+                         self._rng.integers(0, numbers + 1))
+        kept = slots < size
+        for (field, values) in (("i", i), ("j", j), ("p0", p0_payoffs),
+                                ("p1", p1_payoffs)):
+            self._sample[field][slots[kept]] = values[kept]
+        self.sampled = min(size, self.games + len(i))
+
+    def row_means(self) -> np.ndarray:
+        """Each deck's mean payoff over the games recorded so far."""
+        return self.sums / np.maximum(self.counts, 1)
+
+    def sample(self) -> list[tuple[int, int, GamePayoffs]]:
+        """The sampled games, as (i, j, deck i's and deck j's payoffs)."""
+        return [(int(i), int(j), GamePayoffs(float(p0), float(p1)))
+                for (i, j, p0, p1) in self._sample[:self.sampled]]
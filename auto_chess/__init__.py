@@ -25,8 +25,10 @@ these hooks will take at least three arguments:
 Generally, you should not subclass Monster, as they are intended only
 as proxy objects for accessing Cards. You may, however, store
 arbitrary mutable properties within a Monster, as if it were a
-dict. You should not mutate the private properties defined in Monster
-below, nor overwrite its card.
+dict. List the keys your card uses in its state_fields, so that they
+get a fixed place in the monster rather than a dict of their own. You
+should not mutate the private properties defined in Monster below, nor
+overwrite its card.
 
 If you want do define a new hook on Card, you must:
 
@@ -43,13 +45,34 @@ If you want do define a new hook on Card, you must:
   2. invoke the method on Monster, with the GameState and any other
      arguments.
 
+Each hook also has a batched counterpart, Card.batch_<hook>, which the
+lockstep engine in auto_chess.vectorized uses to run the hook for many
+games at once. If you override a hook, override its batched
+counterpart to match, or games including your card will be played by
+the slower object engine. See the batched hooks on Card for how.
+
+Hooks should not log what they do, since formatting the messages costs
+far more than the game itself. Record an event in auto_chess.trace
+instead, which costs a single check unless the game is being traced.
+
 """
 
 import collections
 import itertools
-from typing import Iterable, Optional, NamedTuple, Sequence, Tuple, TypedDict
+import math
+import os
+from typing import (Callable, Hashable, Iterable, Literal, Optional, NamedTuple,
+                    Sequence, Tuple, TypedDict, Union, TYPE_CHECKING, overload)
 import logging
-from analysis import GamePayoffs
+from analysis import BatchedPayoffFn, GamePayoffs
+from auto_chess import profiling, trace
+from auto_chess.caching import LRUCache, Outcome, TranspositionTable
+from auto_chess.registry import REGISTRY
+
+if TYPE_CHECKING:
+    from auto_chess.persistent import MatchupStore
+    from auto_chess.stats import GameStats
+    from auto_chess.vectorized import Batch, Indices
 
 
 log = logging.getLogger(__name__)
@@ -68,22 +91,84 @@ class GameState(NamedTuple):
         return GameState(self.opponent, self.player, self.defender, self.attacker)
 
 
+class _Unset:
+    def __repr__(self) -> str:
+        return "<unset>"
+
+
+# the value of a field of a monster's state which hasn't been set
+_UNSET = _Unset()
+
+
 class Monster:
-    """A monster wihin an active game of auto-chess."""
+    """A monster wihin an active game of auto-chess.
+
+    The state its card keeps, monster["key"], lives in _state, a list
+    with a place for each field in the card's state_fields, and in the
+    dict _extra for any other key.
+    """
+    __slots__ = ("_card", "_remaining_health", "_lazy_name", "_hooks",
+                 "_fields", "_state", "_extra", "_player", "_queued",
+                 "_armed")
+
     def __init__(self, card: 'Card'):
         self._card: 'Card' = card
         self._remaining_health: int = card.health
-        self._name: str = card._monster_name()
-        self._dict: dict = {}
+        self._lazy_name: Optional[str] = None
+        card_class = type(card)
+        self._hooks: Hooks = hooks(card_class)
+        self._fields: dict[str, int] = state_layout(card_class)
+        self._state: list = [_UNSET] * len(self._fields)
+        self._extra: Optional[dict] = None
+        # maintained by the Player which controls this monster, see
+        # Player.has_atk
+        self._player: Optional['Player'] = None
+        self._queued: bool = False
+        self._armed: Optional[bool] = None
 
     def __getitem__(self, key):
-        return self._dict[key]
+        try:
+            value = self._state[self._fields[key]]
+        except KeyError:
+            if self._extra is None:
+                raise
+            return self._extra[key]
+        if value is _UNSET:
+            raise KeyError(key)
+        return value
 
     def __setitem__(self, key, value) -> None:
-        self._dict[key] = value
+        try:
+            self._state[self._fields[key]] = value
+        except KeyError:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def state(self) -> dict:
+        """The state its card keeps, as a dict."""
+        state = {key: self._state[index]
+                 for (key, index) in self._fields.items()
+                 if self._state[index] is not _UNSET}
+        if self._extra:
+            state.update(self._extra)
+        return state
+
+    def _reset(self) -> None:
+        """Return to full health and no state, for another game."""
+        self._remaining_health = self._card.health
+        self._state[:] = [_UNSET] * len(self._state)
+        self._extra = None
+
+    @property
+    def _name(self) -> str:
+        # only needed to describe the monster, so made on demand
+        if self._lazy_name is None:
+            self._lazy_name = self._card._monster_name()
+        return self._lazy_name
 
     def __str__(self) -> str:
-        return f"<monster {self._name} {self._dict}>"
+        return f"<monster {self._name} {self.state()}>"
 
     def current_atk(self, gamestate: GameState) -> int:
         return self._card.current_atk(self, gamestate)
@@ -91,6 +176,22 @@ class Monster:
     def is_alive(self) -> bool:
         return self._remaining_health > 0
 
+    def atk_changed(self) -> None:
+        """Note that this monster's atk may have changed.
+
+        Call this whenever writing something its card's current_atk
+        reads.
+        """
+        if self._player is not None:
+            self._player._atk_changed(self)
+        else:
+            self._armed = None
+
+    def _health_changed(self) -> None:
+        # only a card with its own current_atk can read the health
+        if self._hooks.current_atk is not None:
+            self.atk_changed()
+
     def print_at_game_state(self, game: GameState) -> str:
         return (f"<monster {self._name} ({self._remaining_health}) "
                 f": {self._card}>")
@@ -136,6 +237,12 @@ class Card:
     fight and both die, their cards' on_death methods may be called
     either m0 -> m1 or m1 -> m0.
     """
+    # The keys of the state this class's hooks keep in each monster,
+    # e.g. ("armor_points",), in addition to its superclasses'. Declared
+    # keys get a fixed place in the monster rather than a dict entry,
+    # but monster["key"] works for any key.
+    state_fields: tuple[str, ...] = ()
+
     def __init__(self, atk: int, health: int, name: str):
         self.base_atk = atk
         self.health = health
@@ -185,18 +292,13 @@ class Card:
         """
         if health <= 0:
             return
-        log.info(
-            "%s heals %d health",
-            monster.print_at_game_state(gamestate), health,
-        )
+        if trace.TRACE is not None:
+            trace.TRACE.record(trace.HEAL, trace.snapshot(monster), health)
         new_hp = monster._remaining_health + health
         if new_hp > self.health:
-            log.debug(
-                "clamping healing %s for %d at %d",
-                monster.print_at_game_state(gamestate), health, self.health,
-            )
             new_hp = self.health
         monster._remaining_health = new_hp
+        monster._health_changed()
 
     def take_damage(self, monster: Monster, gamestate: GameState, damage: int) -> None:
         """Called when monster would take damage during a fight.
@@ -207,9 +309,10 @@ class Card:
         """
         if damage <= 0 or not monster.is_alive():
             return
-        log.info("%s takes %d damage",
-                 monster.print_at_game_state(gamestate), damage)
+        if trace.TRACE is not None:
+            trace.TRACE.record(trace.DAMAGE, trace.snapshot(monster), damage)
         monster._remaining_health -= damage
+        monster._health_changed()
         if not monster.is_alive():
             monster.on_death(gamestate)
 
@@ -224,6 +327,13 @@ class Card:
 
         These methods should not write any fields of the game, nor of
         the monster, as they may be called multiple times.
+
+        Whether a monster's atk is positive is remembered between
+        turns, so if it changes, e.g. because a hook wrote a field of
+        the monster this method reads, the hook must call
+        monster.atk_changed(). Card.take_damage and Card.heal do so for
+        changes of remaining_health. Depending on anything but the
+        monster itself is unsupported.
         """
         return self.base_atk
 
@@ -239,9 +349,139 @@ class Card:
         # assign this to ensure is_alive returns false in the future
         monster._remaining_health = 0
         gamestate.player._remove_monster(monster)
-        log.info("player %s's %s has died",
-                 gamestate.player.name,
-                 monster.print_at_game_state(gamestate))
+        if trace.TRACE is not None:
+            trace.TRACE.record(trace.DEATH, gamestate.player.name,
+                               trace.snapshot(monster))
+
+    # batched hooks, for auto_chess.vectorized:
+    #
+    # Each hook above has a batched counterpart, a classmethod which
+    # runs that hook for many monsters of this class at once, each in
+    # a different game. monsters is an array of indices into the
+    # Batch's per-monster arrays, and amounts (damage or health) is an
+    # array of the same length.
+    #
+    # A batched hook may read and write the Batch's arrays directly,
+    # which takes effect immediately. Anything which would invoke a
+    # hook (batch.take_damage, batch.heal, batch.on_death) or run more
+    # code afterwards (batch.call) is instead scheduled, and runs to
+    # completion, in the order it was scheduled, after the batched hook
+    # returns. So if an object hook does something after invoking
+    # another hook, e.g. calls super().on_death after damaging some
+    # enemies, the batched hook must batch.call it.
+    #
+    # A class which overrides an object hook without overriding its
+    # batched counterpart can't be simulated by auto_chess.vectorized,
+    # which then plays its games with the object engine instead.
+    @classmethod
+    def batch_on_game_start(cls, batch: 'Batch', monsters: 'Indices') -> None:
+        pass
+
+    @classmethod
+    def batch_before_combat(cls, batch: 'Batch', monsters: 'Indices') -> None:
+        pass
+
+    @classmethod
+    def batch_heal(cls, batch: 'Batch', monsters: 'Indices', health: 'Indices') -> None:
+        batch.base_heal(monsters, health)
+
+    @classmethod
+    def batch_take_damage(
+            cls,
+            batch: 'Batch',
+            monsters: 'Indices',
+            damage: 'Indices',
+    ) -> None:
+        batch.base_take_damage(monsters, damage)
+
+    @classmethod
+    def batch_current_atk(cls, batch: 'Batch', monsters: 'Indices') -> 'Indices':
+        return batch.param("base_atk", monsters)
+
+    @classmethod
+    def batch_on_death(cls, batch: 'Batch', monsters: 'Indices') -> None:
+        batch.base_on_death(monsters)
+
+
+def _defining_class(cls: type, name: str) -> type:
+    for klass in cls.__mro__:
+        if name in vars(klass):
+            return klass
+    raise AttributeError(f"{cls} has no attribute {name}")
+
+
+class Hooks(NamedTuple):
+    """The hooks a Card subclass overrides, as plain functions.
+
+    A hook the class inherits from Card is None, so the engine can skip
+    it if Card's does nothing, or run Card's inline. Hooks are looked
+    up on the class, so the engine will not see a hook assigned to a
+    Card instance.
+    """
+    on_game_start: Optional[Callable[..., None]]
+    before_combat: Optional[Callable[..., None]]
+    current_atk: Optional[Callable[..., int]]
+    heal: Optional[Callable[..., None]]
+    take_damage: Optional[Callable[..., None]]
+    on_death: Optional[Callable[..., None]]
+
+
+_HOOKS: dict[type, Hooks] = {}
+
+
+def hooks(card_class: type) -> Hooks:
+    """The dispatch table of card_class's hooks, built once per class."""
+    try:
+        return _HOOKS[card_class]
+    except KeyError:
+        if profiling.PROFILE is not None:
+            profiling.instrument(card_class)
+        _HOOKS[card_class] = Hooks(*(
+            None if _defining_class(card_class, hook) is Card
+            else getattr(card_class, hook)
+            for hook in Hooks._fields
+        ))
+        return _HOOKS[card_class]
+
+
+_LAYOUTS: dict[type, dict[str, int]] = {}
+
+
+def state_layout(card_class: type) -> dict[str, int]:
+    """The index in Monster._state of each of card_class's
+    state_fields, including its superclasses', built once per class."""
+    try:
+        return _LAYOUTS[card_class]
+    except KeyError:
+        fields: dict[str, int] = {}
+        for klass in reversed(card_class.__mro__):
+            for field in vars(klass).get("state_fields", ()):
+                fields.setdefault(field, len(fields))
+        _LAYOUTS[card_class] = fields
+        return fields
+
+
+def _atk(monster: Monster, gamestate: GameState) -> int:
+    current_atk = monster._hooks.current_atk
+    if current_atk is None:
+        return monster._card.base_atk
+    return current_atk(monster._card, monster, gamestate)
+
+
+def _take_damage(monster: Monster, gamestate: GameState, damage: int) -> None:
+    take_damage = monster._hooks.take_damage
+    if take_damage is not None:
+        take_damage(monster._card, monster, gamestate, damage)
+        return
+    # Card.take_damage, inline
+    if damage <= 0 or monster._remaining_health <= 0:
+        return
+    if trace.TRACE is not None:
+        trace.TRACE.record(trace.DAMAGE, trace.snapshot(monster), damage)
+    monster._remaining_health -= damage
+    monster._health_changed()
+    if monster._remaining_health <= 0:
+        monster.on_death(gamestate)
 
 
 def _instantiate_deck(deck: Iterable[Card]) -> collections.deque[Monster]:
@@ -252,6 +492,9 @@ class Player:
     def __init__(self, deck: Iterable[Card], name: Optional[str] = None):
         self.name: str = name or f"player-{_get_monster_id()}"
         self.monsters: collections.deque[Monster] = _instantiate_deck(deck)
+        # the monsters as they were dealt, for reset
+        self._dealt: tuple[Monster, ...] = tuple(self.monsters)
+        self._reset_aggregates()
 
     def __str__(self) -> str:
         return " ".join([
@@ -261,22 +504,76 @@ class Player:
             ", ".join(map(str, self.monsters))
         ]) + ">"
 
+    def reset(self) -> None:
+        """Return to the start of a game: every monster dealt queues in
+        order, with full health and no state."""
+        for monster in self._dealt:
+            monster._reset()
+        self.monsters.clear()
+        self.monsters.extend(self._dealt)
+        self._reset_aggregates()
+
     def has_monsters(self) -> bool:
+        # dead monsters leave the queue, so between turns this is the
+        # number of live monsters
         return len(self.monsters) > 0
 
     def has_atk(self, gamestate: GameState) -> bool:
-        def monster_has_attack(monster: Monster) -> bool:
-            return monster.atk(gamestate) > 0
-        return any(map(monster_has_attack, self.monsters))
+        """Whether any queued monster has positive atk.
+
+        Rather than asking every monster for its atk each turn, each
+        monster remembers whether its atk was positive (in _armed)
+        until it calls atk_changed(), and this player counts its queued
+        monsters which were. So only the monsters whose atk has changed
+        since it was last asked are asked again, and only until one of
+        them has positive atk.
+        """
+        while self._armed == 0 and self._unknown:
+            monster = self._unknown.pop()
+            monster._armed = _atk(monster, gamestate) > 0
+            self._armed += monster._armed
+        return self._armed > 0
+
+    def _reset_aggregates(self) -> None:
+        # the number of queued monsters whose atk was positive when
+        # last asked, and the queued monsters whose atk is not known.
+        self._armed: int = 0
+        self._unknown: list[Monster] = list(self.monsters)
+        for monster in self.monsters:
+            monster._player = self
+            monster._queued = True
+            monster._armed = None
+
+    def _join(self, monster: Monster) -> None:
+        monster._queued = True
+        if monster._armed is None:
+            self._unknown.append(monster)
+        elif monster._armed:
+            self._armed += 1
+
+    def _leave(self, monster: Monster) -> None:
+        monster._queued = False
+        if monster._armed is None:
+            self._unknown.remove(monster)
+        elif monster._armed:
+            self._armed -= 1
+
+    def _atk_changed(self, monster: Monster) -> None:
+        if monster._queued:
+            self._leave(monster)
+            monster._armed = None
+            self._join(monster)
+        else:
+            monster._armed = None
 
     def _next_monster(self) -> Optional[Monster]:
         if self.has_monsters():
             monster = self.monsters.popleft()
             assert monster.is_alive()
-            log.info(
-                "player %s's next monster is %s",
-                self.name, monster,
-            )
+            self._leave(monster)
+            if trace.TRACE is not None:
+                trace.TRACE.record(trace.NEXT, self.name,
+                                   trace.snapshot(monster, with_state=True))
             return monster
         else:
             log.info("%s has no monsters", self)
@@ -284,28 +581,21 @@ class Player:
 
     def _enqueue_monster(self, monster):
         self.monsters.append(monster)
+        self._join(monster)
+        if trace.TRACE is not None:
+            trace.TRACE.record(trace.ENQUEUE, self.name, trace.snapshot(monster))
 
     def _remove_monster(self, monster):
-        log.debug(
-            "%s will remove %s",
-            self, monster,
-        )
-        try:
+        # e.g. a fighting monster is not in the queue
+        if monster._queued and monster._player is self:
             self.monsters.remove(monster)
-            log.debug(
-                "%s has removed %s",
-                self, monster,
-            )
-        except ValueError:
-            log.debug(
-                "%s did not contain %s",
-                self, monster,
-            )
-            pass
+            self._leave(monster)
 
     def _on_game_start(self, gamestate):
         for monster in list(self.monsters):
-            monster.on_game_start(gamestate)
+            on_game_start = monster._hooks.on_game_start
+            if on_game_start is not None:
+                on_game_start(monster._card, monster, gamestate)
 
 
 P0_WIN = GamePayoffs.zero_sum_payoff(1)
@@ -313,6 +603,19 @@ P1_WIN = GamePayoffs.zero_sum_payoff(-1)
 TIE = GamePayoffs.zero_sum_payoff(0)
 
 
+# how many turns without a death a game plays before it starts looking
+# for a repeated board.
+QUIET_TURNS: int = 8
+
+# the TranspositionTable games use unless told otherwise, if any. Set
+# this to share one between every game in the process.
+TRANSPOSITIONS: Optional[TranspositionTable] = None
+
+# the on-disk cache of results which play_auto_chess shares with other
+# processes and runs, if any. See auto_chess.persistent.
+DISK_CACHE: Optional['MatchupStore'] = None
+
+
 class _Game:
     """A running game of auto chess."""
     def __init__(
@@ -321,10 +624,23 @@ class _Game:
             p1_deck: Iterable[Card],
             *,
             max_turns: int = 128,
+            quiet_turns: int = QUIET_TURNS,
+            transpositions: Optional[TranspositionTable] = None,
+            players: Optional[tuple['Player', 'Player']] = None,
     ):
+        """players, if given, are Players which were already dealt
+        p0_deck and p1_deck, e.g. reset after a previous game, to play
+        with rather than building new ones."""
         self.max_turns = max_turns
-        self.players: tuple[Player, Player] = (Player(p0_deck, "zero"),
-                                               Player(p1_deck, "one"))
+        self.quiet_turns = quiet_turns
+        self.transpositions = (transpositions if transpositions is not None
+                               else TRANSPOSITIONS)
+        if players is None:
+            players = (Player(p0_deck, "zero"), Player(p1_deck, "one"))
+        self.players: tuple[Player, Player] = players
+        # GameStates are immutable, so the ones without any fighting
+        # monsters can be shared by every turn of the game.
+        self._idle_gamestates = self._gamestates(None, None)
 
     def p0(self) -> Player:
         return self.players[0]
@@ -341,7 +657,7 @@ class _Game:
                 return TIE
             else:
                 return None
-        elif (not self.p0().has_monsters()) and (not self.p0().has_monsters()):
+        elif (not self.p0().has_monsters()) and (not self.p1().has_monsters()):
             return TIE
         elif self.p0().has_monsters():
             return P0_WIN
@@ -358,54 +674,47 @@ class _Game:
         assert isinstance(monsters, tuple), f"{monsters} is a {type(monsters)}"
         if monsters[0] is not None:
             assert monsters[1] is not None
+            return self._gamestates(*monsters)
         else:
             assert monsters[1] is None
+            return self._idle_gamestates
 
-        return (GameState(self.players[0],
-                          self.players[1],
-                          monsters[0],
-                          monsters[1]),
-                GameState(self.players[1],
-                          self.players[0],
-                          monsters[1],
-                          monsters[0]))
+    def _gamestates(
+            self,
+            m0: Optional[Monster],
+            m1: Optional[Monster],
+    ) -> tuple[GameState, GameState]:
+        return (GameState(self.players[0], self.players[1], m0, m1),
+                GameState(self.players[1], self.players[0], m1, m0))
 
-    def fight_in_parallel(self, monsters: tuple[Monster, Monster]):
+    def fight_in_parallel(self, monsters: tuple[Monster, Monster]) -> None:
         gamestates = self.gamestates(monsters)
 
-        log.info(
-            "%s is fighting %s",
-            monsters[0].print_at_game_state(gamestates[0]),
-            monsters[1].print_at_game_state(gamestates[1]),
-        )
+        if trace.TRACE is not None:
+            trace.TRACE.record(trace.FIGHT, trace.snapshot(monsters[0]),
+                               trace.snapshot(monsters[1]))
 
+        # the hooks are called through the monsters' dispatch tables,
+        # skipping Card.before_combat, which does nothing.
         for (monster, gamestate) in zip(monsters, gamestates):
-            monster.before_combat(gamestate)
+            before_combat = monster._hooks.before_combat
+            if before_combat is not None:
+                before_combat(monster._card, monster, gamestate)
 
         # the above step may have killed one or both monsters, so test
         # for that before battling.
-        if all(monster.is_alive() for monster in monsters):
+        if monsters[0].is_alive() and monsters[1].is_alive():
             # read these in parallel before writing anything, in case
             # taking damage changes them
-            atks = [
-                monster.atk(gamestate)
-                for (monster, gamestate)
-                in zip(monsters, gamestates)
-            ]
-
-            for (monster, damage, gamestate) in zip(
-                    monsters,
-                    reversed(atks),
-                    gamestates,
-            ):
-                monster.take_damage(gamestate, damage)
+            atk0 = _atk(monsters[0], gamestates[0])
+            atk1 = _atk(monsters[1], gamestates[1])
+            _take_damage(monsters[0], gamestates[0], atk1)
+            _take_damage(monsters[1], gamestates[1], atk0)
 
         for (monster, gamestate) in zip(monsters, gamestates):
             if monster.is_alive():
                 gamestate.player._enqueue_monster(monster)
 
-        return self.maybe_end()
-
     def get_monsters(self) -> tuple[Monster, Monster]:
         m0 = self.p0()._next_monster()
         assert m0 is not None
@@ -429,36 +738,215 @@ class _Game:
             self.print_players()
 
     def print_players(self) -> None:
-        for gamestate in self.gamestates():
-            log.info(f"{gamestate.player}:")
-            for monster in gamestate.player.monsters:
-                log.info(f"  {monster.print_at_game_state(gamestate)}")
+        """Record every player's monsters in the trace, if any."""
+        if trace.TRACE is not None:
+            for player in self.players:
+                trace.TRACE.board(player)
+
+    def board_key(self) -> Hashable:
+        """The state of the board between turns, as a hashable value.
+
+        Two boards have equal keys if and only if every monster of
+        each player's queue, in order, has the same card, remaining
+        health and state. So the rest of the game will go the same way
+        from either. Cards appear as their ids in the REGISTRY, which
+        are much cheaper to hash.
+        """
+        card_id = REGISTRY.card_id
+        return tuple(
+            tuple((card_id(monster._card), monster._remaining_health,
+                   *monster._state,
+                   tuple(monster._extra.items()) if monster._extra else ())
+                  for monster in player.monsters)
+            for player in self.players
+        )
 
     def play(self) -> GamePayoffs:
         log.info("Starting game between %s and %s", self.p0(), self.p1())
+        if trace.TRACE is not None:
+            trace.TRACE.record(trace.START, str(self.p0()), str(self.p1()))
         self.start_battle()
+        # the boards at the start of some turns, for the transposition
+        # table
+        boards: list[tuple[int, Hashable]] = []
+        (turn, outcome) = self._play_turns(boards)
+        if self.transpositions is not None and boards:
+            self.transpositions.add_game(boards, turn, outcome)
+
+        res = outcome.within(self.max_turns - turn)
+        assert res is not None
+        if turn == self.max_turns:
+            log.info("Cutting off a game at %d turns", self.max_turns)
+        if trace.TRACE is not None:
+            trace.TRACE.record(trace.END, res, turn)
+        return res
+
+    def _play_turns(self, boards: list[tuple[int, Hashable]]) -> tuple[int, Outcome]:
+        """Play until the game is over or its outcome is known.
+
+        Returns the turn it stopped at, and the outcome from there. If
+        the game has a transposition table, looks up the board at the
+        start of the first turn and of each turn after a death, when
+        the board is most likely to be one another game reached too,
+        and appends each (turn, board) it looked up to boards.
+        """
+        table = self.transpositions
+        # the boards seen at the end of each turn since the last death,
+        # once there have been a few turns without any. The game is
+        # deterministic, so if a board repeats, so will every turn
+        # since it was first seen, forever, and nobody will win.
+        seen: Optional[set[Hashable]] = set()
+        alive = len(self.players[0].monsters) + len(self.players[1].monsters)
+        quiet = 0
+        died = True
         for i in range(self.max_turns):
+            if table is not None and died:
+                try:
+                    board = self.board_key()
+                    known = table.lookup(board, self.max_turns - i)
+                except TypeError:
+                    # some card keeps unhashable state, so this game
+                    # can't use the table
+                    (table, known) = (None, None)
+                    boards.clear()
+                if known is not None:
+                    if trace.TRACE is not None:
+                        trace.TRACE.note("the board at turn %d is a transposition "
+                                         "of an earlier game's", i)
+                    return (i, known)
+                if table is not None:
+                    boards.append((i, board))
+
             res = self.single_turn()
-            log.debug(f"that turn's result was {res}")
             if res is not None:
-                return res
-        log.info("Cutting off a game at %d turns", self.max_turns)
-        return TIE
+                return (i, Outcome(res, 0))
+            living = len(self.players[0].monsters) + len(self.players[1].monsters)
+            died = living != alive
+            if died:
+                # nothing can come back from the dead, so no board
+                # from before a death can repeat
+                alive = living
+                quiet = 0
+                if seen is not None:
+                    seen.clear()
+            if seen is None:
+                continue
+            quiet += 1
+            if quiet <= self.quiet_turns:
+                # most games have a death every few turns, so don't pay
+                # for the boards' keys until they stop
+                continue
+            try:
+                board = self.board_key()
+                if board in seen:
+                    log.info("Ending a game at a repeated board after %d turns", i + 1)
+                    if trace.TRACE is not None:
+                        trace.TRACE.note("the board repeats after %d turns", i + 1)
+                    return (i + 1, Outcome(None, math.inf))
+                seen.add(board)
+            except TypeError:
+                # some card keeps unhashable state, so don't look for
+                # repeats in this game
+                seen = None
+        return (self.max_turns, Outcome(None, 0))
+
+
+# The results of games played so far, keyed on the decks packed by the
+# REGISTRY. It holds GAME_CACHE_SIZE results at most, dropping the least
+# recently used; GAME_CACHE.resize changes that, and GAME_CACHE.stats()
+# counts its hits, misses and evictions.
+GAME_CACHE_SIZE = 1 << 19
+GAME_CACHE: LRUCache[Tuple[int, int], GamePayoffs] = LRUCache(GAME_CACHE_SIZE)
+# the cache's old name
+GAME_HASH_TABLE = GAME_CACHE
+
+
+def _forget_card_ids() -> None:
+    GAME_CACHE.clear()
+    if TRANSPOSITIONS is not None:
+        TRANSPOSITIONS.clear()
+
+
+REGISTRY.on_reset(_forget_card_ids)
+
+
+def _play(
+        p0_deck: Sequence[Card],
+        p1_deck: Sequence[Card],
+        players: Optional['_PlayerPool'] = None,
+) -> GamePayoffs:
+    if (trace.TRACE is None
+            and all(type(card) is Card for card in itertools.chain(p0_deck, p1_deck))):
+        from auto_chess import closed_form
+        return closed_form.resolve(p0_deck, p1_deck)
+    if players is None:
+        return _Game(p0_deck, p1_deck).play()
+    keys = (REGISTRY.pack(p0_deck), REGISTRY.pack(p1_deck))
+    dealt = (players.acquire(keys[0], p0_deck, "zero"),
+             players.acquire(keys[1], p1_deck, "one"))
+    result = _Game(p0_deck, p1_deck, players=dealt).play()
+    players.release(keys[0], dealt[0])
+    players.release(keys[1], dealt[1])
+    return result
 
 
-GAME_HASH_TABLE: dict[Tuple[Tuple[Card, Card, Card], Tuple[Card, Card, Card]], GamePayoffs] = {}
+def _play_stored(
+        p0_deck: Sequence[Card],
+        p1_deck: Sequence[Card],
+        players: Optional['_PlayerPool'] = None,
+) -> GamePayoffs:
+    store = DISK_CACHE
+    if store is None or trace.TRACE is not None:
+        return _play(p0_deck, p1_deck, players)
+    result = store.get(p0_deck, p1_deck)
+    if result is None:
+        result = _play(p0_deck, p1_deck, players)
+        store.put(p0_deck, p1_deck, result)
+    return result
 
-def decks_to_tuple(deck: Iterable[Card]):
-    if len(deck) != 3:
-        log.error(f"Invalid deck length {deck}")
-        return None
-    else:
-        return tuple([deck[0], deck[1], deck[2]])
 
-def play_auto_chess(
-        p0_deck: Iterable[Card],
-        p1_deck: Iterable[Card],
+def _play_cached(
+        p0_deck: Sequence[Card],
+        p1_deck: Sequence[Card],
+        players: Optional['_PlayerPool'] = None,
 ) -> GamePayoffs:
+    REGISTRY.reset_if_full()
+    key = (REGISTRY.pack(p0_deck), REGISTRY.pack(p1_deck))
+    cached = GAME_CACHE.get(key)
+    if cached is not None:
+        log.debug("Using cached value %s for decks %s", cached, (p0_deck, p1_deck))
+        return cached
+
+    result = _play_stored(p0_deck, p1_deck, players)
+    GAME_CACHE.put(key, result)
+    log.debug("Cached new value %s for decks %s", result, (p0_deck, p1_deck))
+    return result
+
+
+@overload
+def play_auto_chess(
+        p0_deck: Sequence[Card],
+        p1_deck: Sequence[Card],
+        *,
+        with_stats: Literal[False] = ...,
+) -> GamePayoffs: ...
+
+
+@overload
+def play_auto_chess(
+        p0_deck: Sequence[Card],
+        p1_deck: Sequence[Card],
+        *,
+        with_stats: Literal[True],
+) -> tuple[GamePayoffs, 'GameStats']: ...
+
+
+def play_auto_chess(
+        p0_deck: Sequence[Card],
+        p1_deck: Sequence[Card],
+        *,
+        with_stats: bool = False,
+) -> Union[GamePayoffs, tuple[GamePayoffs, 'GameStats']]:
     """Entry point: run a game between two decks.
 
     p0_deck and p1_deck should each be a list (or possibly an
@@ -467,22 +955,113 @@ def play_auto_chess(
     Return's p0's payoff against p1: 1 if p0 wins, -1 if p1 wins, 0 if
     tie.
 
+    Games between decks of plain Cards are not played at all, but
+    resolved arithmetically by auto_chess.closed_form, unless they are
+    being traced.
+
+    Results are remembered in GAME_CACHE, so a game between the same
+    decks is only played once while it stays there.
+
+    With with_stats, returns (payoffs, stats) instead, where stats is
+    an auto_chess.stats.GameStats. The game is then played in full,
+    never resolved arithmetically.
+
+    To play many games, use play_many.
+
     """
-    deck0 = decks_to_tuple(p0_deck)
-    deck1 = decks_to_tuple(p1_deck)
+    if with_stats:
+        from auto_chess import stats
+        return stats.play_with_stats(p0_deck, p1_deck)
+    return _play_cached(p0_deck, p1_deck)
+
+
+class _PlayerPool:
+    """Players which have finished a game, by packed deck, to be reset
+    for the deck's next game rather than built again."""
+    def __init__(self) -> None:
+        self._idle: dict[int, list[Player]] = {}
+        self._generation = REGISTRY.generation
+
+    def acquire(self, key: int, deck: Sequence[Card], name: str) -> Player:
+        if self._generation != REGISTRY.generation:
+            # the keys are of cards the registry has since forgotten
+            self._idle.clear()
+            self._generation = REGISTRY.generation
+        try:
+            player = self._idle[key].pop()
+        except (KeyError, IndexError):
+            return Player(deck, name)
+        player.reset()
+        player.name = name
+        return player
 
-    if deck0 == None or deck1 == None:
-        return _Game(p0_deck, p1_deck).play()
+    def release(self, key: int, player: Player) -> None:
+        self._idle.setdefault(key, []).append(player)
 
-    cached = GAME_HASH_TABLE.get((deck0, deck1))
-    if cached != None:
-        log.debug(f"Using cached value {cached} for decks {(deck0, deck1)}")
-        return cached
 
-    result = _Game(p0_deck, p1_deck).play()
-    GAME_HASH_TABLE[(deck0, deck1)] = result
-    log.debug(f"Cached new value {result} for decks {(deck0, deck1)}")
-    return result
+Matchup = tuple[Sequence[Card], Sequence[Card]]
+
+
+def play_many(pairs: Iterable[Matchup]) -> list[GamePayoffs]:
+    """play_auto_chess for each (p0_deck, p1_deck) in pairs.
+
+    Returns p0's payoffs in the same order as pairs. Each deck's
+    Players are kept between its games and reset for the next one, so
+    in a tournament, where every deck plays many games, each monster
+    is built once rather than once per game. For one deck against many
+    opponents, use play_against.
+    """
+    players = _PlayerPool()
+    results = [_play_cached(p0_deck, p1_deck, players)
+               for (p0_deck, p1_deck) in pairs]
+    _flush()
+    return results
+
+
+def _flush() -> None:
+    """Write out what the disk cache and the profile hold."""
+    if DISK_CACHE is not None:
+        DISK_CACHE.flush()
+    if profiling.PROFILE is not None:
+        profiling.PROFILE.flush()
+
+
+def play_against(
+        deck: Sequence[Card],
+        opponents: Iterable[Sequence[Card]],
+) -> list[GamePayoffs]:
+    """deck's payoffs against each of opponents, playing first."""
+    return play_many((deck, opponent) for opponent in opponents)
+
+
+def _play_many_with_stats(
+        pairs: Sequence[Matchup],
+) -> list[tuple[GamePayoffs, 'GameStats']]:
+    from auto_chess import stats
+    return stats.play_many_with_stats(pairs)
+
+
+# play_auto_chess as a payoff function for analysis, whose runners then
+# play their jobs in batches through play_many, or with stats, through
+# auto_chess.stats
+payoff_fn = BatchedPayoffFn(play_auto_chess, play_many,
+                            with_stats=_play_many_with_stats, flush=_flush)
+
 
 def possible_decks(deck_size: int, cards: Sequence[Card]) -> list[Sequence[Card]]:
+    """Every deck of deck_size cards from cards, made of the canonical
+    cards in the REGISTRY so that packing them is cheap."""
+    cards = [REGISTRY.canonical(card) for card in cards]
     return list(itertools.product(cards, repeat=deck_size))
+
+
+# last, since it imports Card from here
+from auto_chess import persistent  # noqa: E402
+
+if os.environ.get(persistent.ENV_VAR):
+    # started by a process which called auto_chess.persistent.enable
+    DISK_CACHE = persistent.MatchupStore(os.environ[persistent.ENV_VAR])
+
+if os.environ.get(profiling.ENV_VAR):
+    # started within auto_chess.profiling.profiling(processes=True)
+    profiling.PROFILE = profiling.Profile(os.environ[profiling.ENV_VAR], worker=True)
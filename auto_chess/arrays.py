@@ -0,0 +1,182 @@
+"""A struct-of-arrays engine for auto-chess.
+
+Rather than giving every monster of every game its own Monster object
+with its own health and state, each player's side of the board is a
+Board: flat parallel lists indexed by slot, where slot k is the k-th
+card of the deck:
+
+- card_ids[k] is an index into Board.cards, the distinct cards of the
+  deck,
+- health[k] is the monster's remaining health,
+- state[k] is the monster's per-card state, i.e. what the cards'
+  hooks read and write through monster["key"], laid out as
+  Monster._state.
+
+The cards' hooks still expect Monster and Player objects, so each slot
+is exposed through a BoardMonster, a view which reads and writes the
+Board's arrays. The views, the Player and its deque belong to the
+Board, so a Board can be reset and replayed without allocating any of
+them again.
+
+It runs the same turn loop as auto_chess._Game, so every card's hooks
+see exactly the same semantics and the outcome is identical. Reading
+every monster's health through its Board costs more than the views
+save, so play_auto_chess doesn't use it: _ArrayGame is a second
+implementation of the game, which auto_chess.golden checks the others
+against.
+"""
+
+import collections
+from typing import Iterable, Optional
+
+from analysis import GamePayoffs
+import auto_chess
+from auto_chess import (
+    QUIET_TURNS, Card, Monster, Player, _Game, _UNSET, hooks, state_layout,
+)
+from auto_chess.caching import TranspositionTable
+from auto_chess.registry import REGISTRY
+
+
+class Board:
+    """One player's monsters, held as flat parallel arrays indexed by slot."""
+    def __init__(self, deck: Iterable[Card]):
+        self.cards: list[Card] = []
+        self.card_ids: list[int] = []
+        # by REGISTRY id rather than by Card.__eq__, which ignores the
+        # class: Card(0, 3, "m") and MorphOpponents(0, 3, "m") differ
+        card_ids: dict[int, int] = {}
+        for card in deck:
+            card_id = card_ids.setdefault(REGISTRY.card_id(card), len(self.cards))
+            if card_id == len(self.cards):
+                self.cards.append(card)
+            self.card_ids.append(card_id)
+        self.health: list[int] = [self.card(slot).health
+                                  for slot in range(len(self.card_ids))]
+        self.state: list[list] = [
+            [_UNSET] * len(state_layout(type(self.card(slot))))
+            for slot in range(len(self.card_ids))
+        ]
+        self.monsters: list[BoardMonster] = [BoardMonster(self, slot)
+                                             for slot in range(len(self.card_ids))]
+        self._player = BoardPlayer(self)
+
+    def __len__(self) -> int:
+        return len(self.card_ids)
+
+    def card(self, slot: int) -> Card:
+        return self.cards[self.card_ids[slot]]
+
+    def reset(self) -> None:
+        """Restore every slot to its state at the start of a game."""
+        for slot in range(len(self.card_ids)):
+            self.health[slot] = self.card(slot).health
+            state = self.state[slot]
+            state[:] = [_UNSET] * len(state)
+            self.monsters[slot]._extra = None
+        self._player.monsters.clear()
+        self._player.monsters.extend(self.monsters)
+        self._player._reset_aggregates()
+
+    def player(self, name: str) -> 'BoardPlayer':
+        """The Player which controls this board's monsters, named name."""
+        self._player.name = name
+        return self._player
+
+
+class BoardMonster(Monster):
+    """A view of one slot of a Board which behaves like a Monster."""
+    __slots__ = ("_board", "_slot")
+
+    def __init__(self, board: Board, slot: int):
+        # deliberately not calling Monster.__init__: the health lives
+        # in the board, and the card and state slot of a given slot
+        # never change, so they can be bound once.
+        self._board = board
+        self._slot = slot
+        self._card = board.card(slot)
+        self._hooks = hooks(type(self._card))
+        self._fields = state_layout(type(self._card))
+        self._state = board.state[slot]
+        self._extra = None
+
+    @property  # type: ignore[override]
+    def _remaining_health(self) -> int:
+        return self._board.health[self._slot]
+
+    @_remaining_health.setter
+    def _remaining_health(self, health: int) -> None:
+        self._board.health[self._slot] = health
+
+    @property
+    def _name(self) -> str:  # type: ignore[override]
+        return f"{self._card.name}-{self._slot}"
+
+    def is_alive(self) -> bool:
+        return self._board.health[self._slot] > 0
+
+
+class BoardPlayer(Player):
+    """A Player whose monsters are the views of a Board."""
+    def __init__(self, board: Board):
+        self.name = ""
+        self.board = board
+        self.monsters = collections.deque(board.monsters)
+        self._reset_aggregates()
+
+
+# Boards which are not in use by a running game, by deck, packed by the
+# REGISTRY so that cards of different classes never share a Board.
+# Decks recur constantly in a tournament, so a game usually resets an
+# idle Board rather than building a new one.
+_IDLE_BOARDS: dict[int, list[Board]] = {}
+MAX_IDLE_DECKS: int = 1 << 14
+REGISTRY.on_reset(_IDLE_BOARDS.clear)
+
+
+def _acquire_board(key: int, deck: tuple[Card, ...]) -> Board:
+    try:
+        board = _IDLE_BOARDS[key].pop()
+    except (KeyError, IndexError):
+        return Board(deck)
+    board.reset()
+    return board
+
+
+def _release_board(key: int, board: Board) -> None:
+    if len(_IDLE_BOARDS) >= MAX_IDLE_DECKS and key not in _IDLE_BOARDS:
+        # cards are rebuilt every generation of an optimizer, so rather
+        # than grow forever, start over.
+        _IDLE_BOARDS.clear()
+    _IDLE_BOARDS.setdefault(key, []).append(board)
+
+
+class _ArrayGame(_Game):
+    """A running game of auto chess between two Boards."""
+    def __init__(
+            self,
+            p0_deck: Iterable[Card],
+            p1_deck: Iterable[Card],
+            *,
+            max_turns: int = 128,
+            quiet_turns: int = QUIET_TURNS,
+            transpositions: Optional[TranspositionTable] = None,
+    ):
+        self.max_turns = max_turns
+        self.quiet_turns = quiet_turns
+        self.transpositions = (transpositions if transpositions is not None
+                               else auto_chess.TRANSPOSITIONS)
+        decks = (tuple(p0_deck), tuple(p1_deck))
+        self.keys = (REGISTRY.pack(decks[0]), REGISTRY.pack(decks[1]))
+        self.boards = (_acquire_board(self.keys[0], decks[0]),
+                       _acquire_board(self.keys[1], decks[1]))
+        self.players = (self.boards[0].player("zero"),
+                        self.boards[1].player("one"))
+        self._idle_gamestates = self._gamestates(None, None)
+
+    def play(self) -> GamePayoffs:
+        try:
+            return super().play()
+        finally:
+            for (key, board) in zip(self.keys, self.boards):
+                _release_board(key, board)
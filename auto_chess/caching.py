@@ -0,0 +1,165 @@
+"""Bounded caches for game results, which count their hits and misses.
+
+Each process keeps its own caches, so the statistics are per process.
+"""
+
+import collections
+import math
+from typing import Generic, Hashable, NamedTuple, Optional, Sequence, TypeVar
+
+from analysis import GamePayoffs
+
+
+K = TypeVar("K", bound=Hashable)
+V = TypeVar("V")
+
+
+class CacheStats(NamedTuple):
+    hits: int
+    misses: int
+    evictions: int
+    size: int
+    maxsize: int
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class LRUCache(Generic[K, V]):
+    """A mapping which holds at most maxsize entries, evicting the least
+    recently used."""
+    def __init__(self, maxsize: int):
+        if maxsize < 1:
+            raise ValueError(f"cache size must be positive, not {maxsize}")
+        self.maxsize = maxsize
+        self._entries: collections.OrderedDict[K, V] = collections.OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: K) -> bool:
+        return key in self._entries
+
+    def get(self, key: K) -> Optional[V]:
+        try:
+            value = self._entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def peek(self, key: K) -> Optional[V]:
+        """Like get, but neither counted nor marked as used."""
+        return self._entries.get(key)
+
+    def put(self, key: K, value: V) -> None:
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        if len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def resize(self, maxsize: int) -> None:
+        """Hold at most maxsize entries from now on, evicting the least
+        recently used until it does."""
+        if maxsize < 1:
+            raise ValueError(f"cache size must be positive, not {maxsize}")
+        self.maxsize = maxsize
+        while len(self._entries) > maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """Drop every entry, and reset the statistics."""
+        self._entries.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> CacheStats:
+        return CacheStats(self.hits, self.misses, self.evictions,
+                          len(self._entries), self.maxsize)
+
+
+# as auto_chess.TIE, which this module can't import
+_TIE = GamePayoffs.zero_sum_payoff(0)
+
+
+class Outcome(NamedTuple):
+    """How a game goes on from some board at the start of a turn.
+
+    If payoffs is not None, the game ends with payoffs at the start of
+    the turn after fights more fights, provided the game is not cut
+    off first. Otherwise, the game does not end in the next fights
+    fights, which is infinite if it never will.
+    """
+    payoffs: Optional[GamePayoffs]
+    fights: float
+
+    def within(self, turns: int) -> Optional[GamePayoffs]:
+        """The result of the game if it may only run turns more fights,
+        or None if that is not known."""
+        if self.payoffs is not None:
+            return self.payoffs if self.fights < turns else _TIE
+        return _TIE if self.fights >= turns else None
+
+
+class TranspositionTable:
+    """The outcomes of the boards which games have reached.
+
+    Games are deterministic, so every game which reaches a board at the
+    start of a turn goes on the same way from there, whatever decks it
+    started with. A _Game with a TranspositionTable returns as soon as
+    it reaches a board in the table, and afterwards adds every board
+    it saw.
+    """
+    def __init__(self, maxsize: int = 1 << 18):
+        self._boards: LRUCache[Hashable, Outcome] = LRUCache(maxsize)
+        # an entry which doesn't decide the game is a miss, so count
+        # lookups here rather than in the LRUCache
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._boards)
+
+    def lookup(self, board: Hashable, turns: int) -> Optional[Outcome]:
+        """The outcome from board, if it decides a game which may only
+        run turns more fights."""
+        outcome = self._boards.peek(board)
+        if outcome is None or outcome.within(turns) is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._boards.get(board)
+        return outcome
+
+    def add_game(
+            self,
+            boards: Sequence[tuple[int, Hashable]],
+            turn: int,
+            outcome: Outcome,
+    ) -> None:
+        """Add the boards a game saw at the start of some turns, as
+        (turn, board), given the outcome from the start of turn turn."""
+        for (i, board) in boards:
+            later = outcome.fights + (turn - i)
+            if outcome.payoffs is None and not math.isinf(later):
+                known = self._boards.peek(board)
+                if known is not None and (known.payoffs is not None
+                                          or known.fights >= later):
+                    # it knows more about the board than this game did
+                    continue
+            self._boards.put(board, Outcome(outcome.payoffs, later))
+
+    def clear(self) -> None:
+        self._boards.clear()
+        self.hits = self.misses = 0
+
+    def stats(self) -> CacheStats:
+        return self._boards.stats()._replace(hits=self.hits, misses=self.misses)
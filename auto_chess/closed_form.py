@@ -0,0 +1,174 @@
+"""Resolving games between decks of plain Cards without playing them.
+
+Plain Cards have no hooks, so a game between them is pure arithmetic:
+each turn, the monster at the front of each queue deals its atk (or
+nothing, if that is negative) to the other, and the survivors go to
+the back. Until somebody dies, each queue simply rotates, so player
+s's monster at position i fights on turns i, i + n_s, i + 2 n_s, ...
+and meets the opposing monsters in a pattern which repeats every
+lcm(n_0, n_1) turns. That gives the turn of the next death in closed
+form, so resolve() jumps from death to death, doing work proportional
+to the number of monsters rather than the number of turns.
+
+The results of games between single cards are kept in a DuelTable,
+which precompute_duels fills in for a whole pool of cards at once.
+Only one-card decks are looked up there: in longer decks, the
+survivors of a fight carry their damage into the next, so a game
+between them isn't made of full-health duels.
+"""
+
+import math
+from typing import Iterable, Sequence
+
+from analysis import GamePayoffs
+from auto_chess import Card, P0_WIN, P1_WIN, TIE
+from auto_chess.registry import REGISTRY
+
+
+def is_vanilla(card: Card) -> bool:
+    """Whether card is a plain Card, without any hooks."""
+    return type(card) is Card
+
+
+def resolve(
+        p0_deck: Sequence[Card],
+        p1_deck: Sequence[Card],
+        *,
+        max_turns: int = 128,
+) -> GamePayoffs:
+    """The result of auto_chess._Game(p0_deck, p1_deck).play(), for
+    decks of plain Cards."""
+    if len(p0_deck) == 1 and len(p1_deck) == 1:
+        return DUELS.duel(p0_deck[0], p1_deck[0], max_turns=max_turns)
+    return _resolve(p0_deck, p1_deck, max_turns)
+
+
+def _resolve(
+        p0_deck: Iterable[Card],
+        p1_deck: Iterable[Card],
+        max_turns: int,
+) -> GamePayoffs:
+    # each player's queue, as the damage its monsters deal (atk, but
+    # not less than 0) and their remaining health
+    damage = ([max(card.base_atk, 0) for card in p0_deck],
+              [max(card.base_atk, 0) for card in p1_deck])
+    health = ([card.health for card in p0_deck],
+              [card.health for card in p1_deck])
+    turns = 0
+    while True:
+        # as _Game.maybe_end, at the start of each turn
+        if turns >= max_turns:
+            return TIE
+        if damage[0] and damage[1]:
+            if not (any(damage[0]) or any(damage[1])):
+                return TIE
+        elif damage[0]:
+            return P0_WIN
+        elif damage[1]:
+            return P1_WIN
+        else:
+            return TIE
+
+        sizes = (len(damage[0]), len(damage[1]))
+        common = math.gcd(*sizes)
+        # the turn, counting from this one as 0, in which the first
+        # monster dies, if any does before the game is cut off
+        last = max_turns - turns
+        for side in (0, 1):
+            (size, other) = (sizes[side], sizes[1 - side])
+            # the monster at position i fights the opponents at
+            # positions congruent to i modulo common, in a cycle of
+            # period fights
+            period = other // common
+            hits = damage[1 - side]
+            per_period = [sum(hits[r::common]) for r in range(common)]
+            for (i, hp) in enumerate(health[side]):
+                if i >= last:
+                    break
+                total = per_period[i % common]
+                if total == 0:
+                    continue
+                # the number of whole periods it survives, and the
+                # health it has left for the last
+                periods = (hp - 1) // total
+                hp -= periods * total
+                fight = 0
+                while hp > 0:
+                    hp -= hits[(i + fight * size) % other]
+                    fight += 1
+                turn = i + (periods * period + fight - 1) * size
+                if turn < last:
+                    last = turn
+        if last == max_turns - turns:
+            # nobody dies before the game is cut off
+            return TIE
+
+        for side in (0, 1):
+            (size, other) = (sizes[side], sizes[1 - side])
+            period = other // common
+            hits = damage[1 - side]
+            remaining = health[side]
+            for i in range(min(size, last + 1)):
+                fights = (last - i) // size + 1
+                (periods, rest) = divmod(fights, period)
+                if periods:
+                    remaining[i] -= periods * sum(hits[i % common::common])
+                for fight in range(rest):
+                    remaining[i] -= hits[(i + fight * size) % other]
+        for side in (0, 1):
+            (size, remaining) = (sizes[side], health[side])
+            # the survivors, in the order they queue after the turn
+            order = [(last + 1 + i) % size for i in range(size)]
+            order = [i for i in order if remaining[i] > 0]
+            damage[side][:] = [damage[side][i] for i in order]
+            remaining[:] = [remaining[i] for i in order]
+        turns += last + 1
+
+
+class DuelTable:
+    """The results of one-on-one games between single plain Cards."""
+    def __init__(self) -> None:
+        # keyed on the cards' ids in the REGISTRY
+        self._results: dict[tuple[int, int, int], GamePayoffs] = {}
+
+    def __len__(self) -> int:
+        return len(self._results)
+
+    def clear(self) -> None:
+        self._results.clear()
+
+    def duel(
+            self,
+            p0_card: Card,
+            p1_card: Card,
+            *,
+            max_turns: int = 128,
+    ) -> GamePayoffs:
+        key = (REGISTRY.card_id(p0_card), REGISTRY.card_id(p1_card), max_turns)
+        try:
+            return self._results[key]
+        except KeyError:
+            pass
+        if len(self._results) >= MAX_DUELS:
+            # cards are rebuilt every generation of an optimizer, so
+            # rather than grow forever, start over.
+            self._results.clear()
+        result = self._results[key] = _resolve([p0_card], [p1_card], max_turns)
+        return result
+
+    def add(self, cards: Iterable[Card], *, max_turns: int = 128) -> None:
+        """Resolve every duel between two of cards, in either order."""
+        cards = [card for card in cards if is_vanilla(card)]
+        for p0_card in cards:
+            for p1_card in cards:
+                self.duel(p0_card, p1_card, max_turns=max_turns)
+
+
+MAX_DUELS: int = 1 << 16
+DUELS = DuelTable()
+REGISTRY.on_reset(DUELS.clear)
+
+
+def precompute_duels(cards: Iterable[Card], *, max_turns: int = 128) -> None:
+    """Fill in the duel table for the plain Cards of a pool."""
+    DUELS.add(cards, max_turns=max_turns)
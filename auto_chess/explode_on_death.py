@@ -1,4 +1,4 @@
-from auto_chess import Card, Monster, GameState
+from auto_chess import Card, Monster, GameState, trace
 import logging
 
 
@@ -20,13 +20,27 @@ class ExplodeOnDeath(Card):
         return hash((super().__hash__(), self.explode_damage))
 
     def on_death(self, monster: Monster, gamestate: GameState) -> None:
-        log.info((f"{monster.print_at_game_state(gamestate)} explodes "
-                  f"for {self.explode_damage} damage"))
+        if trace.TRACE is not None:
+            trace.TRACE.note("%s explodes for %d damage",
+                             trace.snapshot(monster), self.explode_damage)
         opponent_gamestate = gamestate.invert()
         for enemy in list(gamestate.opponent.monsters):
-            log.debug(f"{enemy.print_at_game_state(opponent_gamestate)} taking {self.explode_damage} explosion damage")
             enemy.take_damage(opponent_gamestate, self.explode_damage)
         if gamestate.defender and gamestate.defender.is_alive():
-            log.debug(f"Defender {gamestate.defender.print_at_game_state(opponent_gamestate)} taking {self.explode_damage} explosion damage")
             gamestate.defender.take_damage(opponent_gamestate, self.explode_damage)
         super().on_death(monster, gamestate)
+
+    @classmethod
+    def batch_on_death(cls, batch, monsters) -> None:
+        damage = batch.param("explode_damage", monsters)
+        (enemies, present) = batch.enemies(monsters)
+        for (enemy, here) in zip(enemies.T, present.T):
+            batch.take_damage(enemy[here], damage[here])
+        batch.call(cls._batch_explode_at_defender, monsters, damage)
+        batch.call(super().batch_on_death, monsters)
+
+    @classmethod
+    def _batch_explode_at_defender(cls, batch, monsters, damage) -> None:
+        defender = batch.defender(monsters)
+        hit = (defender >= 0) & (batch.hp[defender] > 0)
+        batch.take_damage(defender[hit], damage[hit])
@@ -1,4 +1,4 @@
-from auto_chess import Card, Monster, GameState
+from auto_chess import Card, Monster, GameState, trace
 import logging
 
 
@@ -30,8 +30,16 @@ class FriendlyVampire(Card):
                 break
 
         if heal_target is None:
-            log.info("no friendly monster to heal.")
+            if trace.TRACE is not None:
+                trace.TRACE.note("no friendly monster to heal.")
             return
 
         heal_target.heal(gamestate, self.heal_amount)
         super().before_combat(monster, gamestate)
+
+    @classmethod
+    def batch_before_combat(cls, batch, monsters) -> None:
+        (heal_target, has_target) = batch.last(*batch.allies(monsters))
+        batch.heal(heal_target[has_target],
+                   batch.param("heal_amount", monsters[has_target]))
+        batch.call(super().batch_before_combat, monsters[has_target])
@@ -0,0 +1,306 @@
+"""Reference outcomes of every matchup in a pool, to check other engines by.
+
+Every faster way of finding a game's result (auto_chess.arrays,
+auto_chess.vectorized, the caches and transposition tables) must give
+exactly what _Game(p0_deck, p1_deck).play() does. A Corpus holds that
+reference result for every ordered pair of decks of deck_size cards
+from a pool, one byte per matchup:
+
+    corpus = golden.generate(ALL_CARDS, 3, multiprocess=True)
+    corpus.save("all_cards_3.golden")
+
+and check plays every matchup again with another backend and reports
+the first which comes out differently, if any:
+
+    divergence = golden.check(golden.Corpus.load("all_cards_3.golden"),
+                              "vectorized", multiprocess=True)
+    if divergence is not None:
+        print(divergence)
+        divergence.trace().log()
+
+From the command line,
+
+    python -m auto_chess.golden generate all_cards_3.golden
+    python -m auto_chess.golden check all_cards_3.golden --backend arrays
+
+The matchups are numbered row by row: matchup k is decks[k // n]
+against decks[k % n], where decks is possible_decks(deck_size, cards)
+and n is its length.
+"""
+
+import argparse
+import importlib
+import itertools
+import logging
+import pickle
+import random
+import zlib
+from typing import Callable, Iterable, NamedTuple, Optional, Sequence, Union
+
+from analysis import GamePayoffs
+from auto_chess import (
+    P0_WIN, P1_WIN, TIE, Card, Matchup, _Game, play_many, possible_decks, trace,
+)
+from auto_chess.caching import TranspositionTable
+from auto_chess.registry import REGISTRY
+
+
+log = logging.getLogger(__name__)
+
+
+# a backend plays a sequence of matchups, returning their payoffs in order
+Backend = Callable[[Sequence[Matchup]], Sequence[GamePayoffs]]
+
+
+def _play_object(matchups: Sequence[Matchup]) -> list[GamePayoffs]:
+    return [_Game(p0_deck, p1_deck).play() for (p0_deck, p1_deck) in matchups]
+
+
+def _play_arrays(matchups: Sequence[Matchup]) -> list[GamePayoffs]:
+    from auto_chess.arrays import _ArrayGame
+    return [_ArrayGame(p0_deck, p1_deck).play() for (p0_deck, p1_deck) in matchups]
+
+
+def _play_vectorized(matchups: Sequence[Matchup]) -> list[GamePayoffs]:
+    from auto_chess.vectorized import play_batch
+    return play_batch(matchups)
+
+
+def _play_transpositions(matchups: Sequence[Matchup]) -> list[GamePayoffs]:
+    # one table for the whole chunk, so that its games find each
+    # other's boards
+    table = TranspositionTable()
+    return [_Game(p0_deck, p1_deck, transpositions=table).play()
+            for (p0_deck, p1_deck) in matchups]
+
+
+BACKENDS: dict[str, Backend] = {
+    # the reference, which generate uses
+    "object": _play_object,
+    "arrays": _play_arrays,
+    "vectorized": _play_vectorized,
+    "transpositions": _play_transpositions,
+    # everything play_auto_chess does: the game cache, closed forms for
+    # plain cards, reused players, and the disk cache if it's enabled
+    "play_many": play_many,
+}
+
+
+# each matchup's result as one byte
+_CODES: dict[GamePayoffs, int] = {TIE: 0, P0_WIN: 1, P1_WIN: 2}
+_PAYOFFS: dict[int, GamePayoffs] = {code: payoffs for (payoffs, code) in _CODES.items()}
+# a result other than those, which only a broken backend gives
+_UNKNOWN = 255
+
+# matchups per task given to a worker process
+CHUNK_SIZE = 1 << 13
+
+
+class Corpus:
+    """The reference result of every matchup between the decks of
+    deck_size cards from cards."""
+    def __init__(self, cards: Sequence[Card], deck_size: int, outcomes: bytes):
+        self.cards = list(cards)
+        self.deck_size = deck_size
+        self.decks = possible_decks(deck_size, self.cards)
+        if len(outcomes) != len(self.decks) ** 2:
+            raise ValueError(f"{len(outcomes)} outcomes for "
+                             f"{len(self.decks)} ** 2 matchups")
+        self.outcomes = outcomes
+
+    def __len__(self) -> int:
+        return len(self.outcomes)
+
+    def matchup(self, k: int) -> Matchup:
+        (i, j) = divmod(k, len(self.decks))
+        return (self.decks[i], self.decks[j])
+
+    def payoffs(self, k: int) -> GamePayoffs:
+        return _PAYOFFS[self.outcomes[k]]
+
+    def save(self, path: str) -> None:
+        with open(path, "wb") as out:
+            pickle.dump({
+                "cards": self.cards,
+                "deck_size": self.deck_size,
+                "outcomes": zlib.compress(self.outcomes, 9),
+            }, out)
+
+    @classmethod
+    def load(cls, path: str) -> 'Corpus':
+        with open(path, "rb") as saved:
+            contents = pickle.load(saved)
+        return cls(contents["cards"], contents["deck_size"],
+                   zlib.decompress(contents["outcomes"]))
+
+
+class Divergence(NamedTuple):
+    """The first matchup for which a backend disagreed with the corpus,
+    and how many it disagreed on in all."""
+    k: int
+    p0_deck: Sequence[Card]
+    p1_deck: Sequence[Card]
+    expected: GamePayoffs
+    actual: Optional[GamePayoffs]
+    differing: int
+
+    def __str__(self) -> str:
+        return (f"matchup {self.k}: {list(map(str, self.p0_deck))} against "
+                f"{list(map(str, self.p1_deck))} should be {self.expected}, "
+                f"not {self.actual} ({self.differing} matchups differ)")
+
+    def trace(self) -> trace.Trace:
+        """The reference game, event by event."""
+        return trace.replay(self.p0_deck, self.p1_deck)
+
+
+# possible_decks for each (card ids, deck_size) a worker has seen
+_DECKS: dict[tuple[tuple[int, ...], int], list[Sequence[Card]]] = {}
+REGISTRY.on_reset(_DECKS.clear)
+
+
+def _decks(cards: Sequence[Card], deck_size: int) -> list[Sequence[Card]]:
+    key = (tuple(map(REGISTRY.card_id, cards)), deck_size)
+    try:
+        return _DECKS[key]
+    except KeyError:
+        _DECKS.clear()
+        decks = _DECKS[key] = possible_decks(deck_size, cards)
+        return decks
+
+
+def _encode(results: Iterable[GamePayoffs]) -> bytes:
+    return bytes(_CODES.get(payoffs, _UNKNOWN) for payoffs in results)
+
+
+def _play_chunk(
+        cards: Sequence[Card],
+        deck_size: int,
+        backend: Union[str, Backend],
+        indices: Sequence[int],
+) -> bytes:
+    REGISTRY.reset_if_full()
+    decks = _decks(cards, deck_size)
+    n = len(decks)
+    play = BACKENDS[backend] if isinstance(backend, str) else backend
+    return _encode(play([(decks[k // n], decks[k % n]) for k in indices]))
+
+
+def _chunks(indices: Sequence[int]) -> list[Sequence[int]]:
+    return [indices[start:start + CHUNK_SIZE]
+            for start in range(0, len(indices), CHUNK_SIZE)]
+
+
+def _run(
+        cards: Sequence[Card],
+        deck_size: int,
+        backend: Union[str, Backend],
+        chunks: list[Sequence[int]],
+        multiprocess: bool,
+) -> Iterable[bytes]:
+    args = (itertools.repeat(cards), itertools.repeat(deck_size),
+            itertools.repeat(backend), chunks)
+    if not multiprocess:
+        return map(_play_chunk, *args)
+    import pathos.multiprocessing as mproc  # type: ignore
+
+    with mproc.ProcessPool() as pool:
+        return pool.imap(_play_chunk, *args)
+
+
+def generate(
+        cards: Sequence[Card],
+        deck_size: int = 3,
+        *,
+        multiprocess: bool = False,
+) -> Corpus:
+    """Play every matchup between decks of deck_size cards with the
+    reference engine."""
+    cards = [REGISTRY.canonical(card) for card in cards]
+    n = len(possible_decks(deck_size, cards))
+    log.info("playing %d matchups", n * n)
+    outcomes = b"".join(_run(cards, deck_size, "object",
+                             _chunks(range(n * n)), multiprocess))
+    if _UNKNOWN in outcomes:
+        k = outcomes.index(_UNKNOWN)
+        raise ValueError(f"matchup {k} has payoffs other than a win, loss or tie")
+    return Corpus(cards, deck_size, outcomes)
+
+
+def check(
+        corpus: Corpus,
+        backend: Union[str, Backend] = "object",
+        *,
+        multiprocess: bool = False,
+        sample: Optional[int] = None,
+        seed: int = 0,
+) -> Optional[Divergence]:
+    """Play the corpus's matchups with backend, a name in BACKENDS or a
+    function like them, and return the first whose result differs from
+    the corpus, or None if none do.
+
+    sample, if given, plays only that many of the matchups, chosen at
+    random with seed.
+    """
+    indices: Sequence[int] = range(len(corpus))
+    if sample is not None and sample < len(corpus):
+        indices = sorted(random.Random(seed).sample(indices, sample))
+    chunks = _chunks(indices)
+    first: Optional[int] = None
+    count = 0
+    for (chunk, outcomes) in zip(chunks, _run(corpus.cards, corpus.deck_size, backend,
+                                              chunks, multiprocess)):
+        for (k, outcome) in zip(chunk, outcomes):
+            if outcome != corpus.outcomes[k]:
+                count += 1
+                if first is None:
+                    first = k
+    if first is None:
+        return None
+    (p0_deck, p1_deck) = corpus.matchup(first)
+    play = BACKENDS[backend] if isinstance(backend, str) else backend
+    return Divergence(first, p0_deck, p1_deck, corpus.payoffs(first),
+                      play([(p0_deck, p1_deck)])[0], count)
+
+
+def _load_cards(name: str) -> list[Card]:
+    (module, attribute) = name.split(":")
+    return list(getattr(importlib.import_module(module), attribute))
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m auto_chess.golden")
+    parser.add_argument("--processes", action="store_true",
+                        help="play in parallel in worker processes")
+    commands = parser.add_subparsers(dest="command", required=True)
+    make = commands.add_parser("generate", help="build a corpus")
+    make.add_argument("path")
+    make.add_argument("--cards", default="run_tournament:ALL_CARDS",
+                      help="the pool, as module:attribute")
+    make.add_argument("--deck-size", type=int, default=3)
+    diff = commands.add_parser("check", help="compare a backend to a corpus")
+    diff.add_argument("path")
+    diff.add_argument("--backend", choices=sorted(BACKENDS), default="object")
+    diff.add_argument("--sample", type=int)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    log.setLevel(logging.INFO)
+    if args.command == "generate":
+        corpus = generate(_load_cards(args.cards), args.deck_size,
+                          multiprocess=args.processes)
+        corpus.save(args.path)
+        log.info("saved %d outcomes to %s", len(corpus), args.path)
+        return 0
+    divergence = check(Corpus.load(args.path), args.backend,
+                       multiprocess=args.processes, sample=args.sample)
+    if divergence is None:
+        log.info("%s agrees with %s", args.backend, args.path)
+        return 0
+    log.error("%s", divergence)
+    divergence.trace().log(log, logging.ERROR)
+    return 1
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
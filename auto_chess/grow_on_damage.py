@@ -6,6 +6,8 @@ log = logging.getLogger(__name__)
 
 
 class GrowOnDamage(Card):
+    state_fields = ("current_atk",)
+
     def __init__(self, *args, atk_per_hit: int = 1, **kwargs):
         self.atk_per_hit = atk_per_hit
         super().__init__(*args, **kwargs)
@@ -32,4 +34,20 @@ class GrowOnDamage(Card):
     def take_damage(self, monster: Monster, gamestate: GameState, damage: int) -> None:
         if damage > 0:
             monster["current_atk"] += self.atk_per_hit
+            monster.atk_changed()
         super().take_damage(monster, gamestate, damage)
+
+    @classmethod
+    def batch_on_game_start(cls, batch, monsters) -> None:
+        batch.state("current_atk")[monsters] = batch.param("base_atk", monsters)
+        super().batch_on_game_start(batch, monsters)
+
+    @classmethod
+    def batch_current_atk(cls, batch, monsters):
+        return batch.state("current_atk")[monsters]
+
+    @classmethod
+    def batch_take_damage(cls, batch, monsters, damage) -> None:
+        hit = monsters[damage > 0]
+        batch.state("current_atk")[hit] += batch.param("atk_per_hit", hit)
+        super().batch_take_damage(batch, monsters, damage)
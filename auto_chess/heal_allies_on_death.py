@@ -1,4 +1,4 @@
-from auto_chess import Card, Monster, GameState
+from auto_chess import Card, Monster, GameState, trace
 import logging
 
 
@@ -20,9 +20,18 @@ class HealOnDeath(Card):
         return hash((super().__hash__(), self.explode_heal))
 
     def on_death(self, monster: Monster, gamestate: GameState) -> None:
-        log.info((f"{monster.print_at_game_state(gamestate)} "
-                  f"heals its allies for {self.explode_heal} health"))
+        if trace.TRACE is not None:
+            trace.TRACE.note("%s heals its allies for %d health",
+                             trace.snapshot(monster), self.explode_heal)
         for ally in list(gamestate.player.monsters):
             if ally is not monster:
                 ally.heal(gamestate, self.explode_heal)
         super().on_death(monster, gamestate)
+
+    @classmethod
+    def batch_on_death(cls, batch, monsters) -> None:
+        health = batch.param("explode_heal", monsters)
+        (allies, present) = batch.allies(monsters)
+        for (ally, here) in zip(allies.T, present.T):
+            batch.heal(ally[here], health[here])
+        batch.call(super().batch_on_death, monsters)
@@ -1,6 +1,6 @@
 # Shares healing amount with allies, partitioning it between them
 
-from auto_chess import Card, Monster, GameState
+from auto_chess import Card, Monster, GameState, trace
 import logging
 
 
@@ -28,15 +28,19 @@ class HealthDonor(Card):
             if len(gamestate.player.monsters) == 0:
                 # If no additional allies left, then this card
                 # receives all the health regardless
-                log.info((f"{monster.print_at_game_state(gamestate)}"
-                          " shares health with allies, but no allies left"))
+                if trace.TRACE is not None:
+                    trace.TRACE.note("%s shares health with allies, "
+                                     "but no allies left",
+                                     trace.snapshot(monster))
                 super().heal(monster, gamestate, health)
             else:
                 # Compute health allocated to current card and allies,
                 # then distribute
-                log.info((f"{monster.print_at_game_state(gamestate)}"
-                          " shares health with allies, "
-                          f"recovers {self.heal_percent} percent of {health} health"))
+                if trace.TRACE is not None:
+                    trace.TRACE.note("%s shares health with allies, "
+                                     "recovers %d percent of %d health",
+                                     trace.snapshot(monster),
+                                     self.heal_percent, health)
                 # Round for this monster such that the remaining
                 # health to distribute is even (handling either 1 or 2
                 # remaining without reducing total damage taken)
@@ -48,3 +52,26 @@ class HealthDonor(Card):
                 for ally in list(gamestate.player.monsters):
                     if ally is not monster:
                         ally.heal(gamestate, ally_health)
+
+    @classmethod
+    def batch_heal(cls, batch, monsters, health) -> None:
+        healed = health > 0
+        (monsters, health) = (monsters[healed], health[healed])
+        (allies, present) = batch.queue(batch.side(monsters))
+        n_allies = present.sum(axis=1)
+
+        # If no additional allies left, then this card receives all
+        # the health regardless
+        alone = n_allies == 0
+        super().batch_heal(batch, monsters[alone], health[alone])
+
+        sharing = ~alone
+        (monsters, health) = (monsters[sharing], health[sharing])
+        (allies, present) = (allies[sharing], present[sharing])
+        kept = (health * batch.param("heal_percent", monsters)) // 100
+        received_health = kept + (health - kept) % 2
+        super().batch_heal(batch, monsters, received_health)
+        ally_health = (health - received_health) // n_allies[sharing]
+        present &= allies != monsters[:, None]
+        for (ally, here) in zip(allies.T, present.T):
+            batch.heal(ally[here], ally_health[here])
@@ -1,4 +1,4 @@
-from auto_chess import Card, Monster, GameState
+from auto_chess import Card, Monster, GameState, trace
 import logging
 
 
@@ -6,6 +6,8 @@ log = logging.getLogger(__name__)
 
 
 class IgnoreFirstDamage(Card):
+    state_fields = ("armor_points",)
+
     def __init__(
             self,
             *args,
@@ -29,7 +31,21 @@ class IgnoreFirstDamage(Card):
 
     def take_damage(self, monster: Monster, gamestate: GameState, damage: int) -> None:
         if monster["armor_points"] > 0:
-            log.info(f"{monster.print_at_game_state(gamestate)} loses an armor point")
+            if trace.TRACE is not None:
+                trace.TRACE.note("%s loses an armor point",
+                                 trace.snapshot(monster))
             monster["armor_points"] -= 1
         else:
             super().take_damage(monster, gamestate, damage)
+
+    @classmethod
+    def batch_on_game_start(cls, batch, monsters) -> None:
+        batch.state("armor_points")[monsters] = \
+            batch.param("armor_points", monsters)
+
+    @classmethod
+    def batch_take_damage(cls, batch, monsters, damage) -> None:
+        armor_points = batch.state("armor_points")
+        armored = armor_points[monsters] > 0
+        armor_points[monsters[armored]] -= 1
+        super().batch_take_damage(batch, monsters[~armored], damage[~armored])
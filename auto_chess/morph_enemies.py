@@ -3,7 +3,7 @@
 #
 # To maintain determinism, iterate over the opponent's cards in order
 
-from auto_chess import Card, Monster, GameState
+from auto_chess import Card, Monster, GameState, trace
 import logging
 
 
@@ -11,6 +11,8 @@ log = logging.getLogger(__name__)
 
 
 class MorphOpponents(Card):
+    state_fields = ("next_to_morph", "current_atk")
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -22,9 +24,11 @@ class MorphOpponents(Card):
 
     def copy_atk(self, monster: Monster, state: GameState, copy_from: Monster) -> None:
         opponent_state = state.invert()
-        log.info((f"{monster.print_at_game_state(state)} sets its attack to "
-                  f"match {copy_from.print_at_game_state(opponent_state)}'s attack"))
+        if trace.TRACE is not None:
+            trace.TRACE.note("%s sets its attack to match %s's attack",
+                             trace.snapshot(monster), trace.snapshot(copy_from))
         monster["current_atk"] = copy_from.current_atk(opponent_state)
+        monster.atk_changed()
 
     def before_combat(self, monster: Monster, gamestate: GameState) -> None:
         candidates = [defender for defender in [gamestate.defender] if defender]
@@ -38,3 +42,24 @@ class MorphOpponents(Card):
             return monster["current_atk"]
         except KeyError:
             return self.base_atk
+
+    @classmethod
+    def batch_on_game_start(cls, batch, monsters) -> None:
+        batch.state("next_to_morph")[monsters] = 0
+        # stands in for current_atk's KeyError, until the first copy
+        batch.state("current_atk")[monsters] = batch.param("base_atk", monsters)
+
+    @classmethod
+    def batch_before_combat(cls, batch, monsters) -> None:
+        (candidates, present) = batch.enemies(monsters, with_defender=True)
+        next_to_morph = batch.state("next_to_morph")
+        copy_from = batch.pick(
+            candidates,
+            next_to_morph[monsters] % present.sum(axis=1),
+        )
+        batch.state("current_atk")[monsters] = batch.atk(copy_from)
+        next_to_morph[monsters] += 1
+
+    @classmethod
+    def batch_current_atk(cls, batch, monsters):
+        return batch.state("current_atk")[monsters]
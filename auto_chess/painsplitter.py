@@ -1,6 +1,6 @@
 # Shares damage taken with allies, partitioning it between them
 
-from auto_chess import Card, Monster, GameState
+from auto_chess import Card, Monster, GameState, trace
 import logging
 
 
@@ -30,15 +30,19 @@ class PainSplitter(Card):
             if len(friends) == 0:
                 # If no additional allies left, then this card
                 # receives all the damage regardless
-                log.info((f"{monster.print_at_game_state(gamestate)} shares"
-                          f" {damage} damage with allies, but no allies left"))
+                if trace.TRACE is not None:
+                    trace.TRACE.note("%s shares %d damage with allies, "
+                                     "but no allies left",
+                                     trace.snapshot(monster), damage)
                 super().take_damage(monster, gamestate, damage)
             else:
                 # Compute damage allocated to current card and allies,
                 # then distribute
-                log.info((f"{monster.print_at_game_state(gamestate)} shares"
-                          " damage with allies, and takes "
-                          f"{self.dmg_percent} percent of {damage} damage"))
+                if trace.TRACE is not None:
+                    trace.TRACE.note("%s shares damage with allies, and takes "
+                                     "%d percent of %d damage",
+                                     trace.snapshot(monster),
+                                     self.dmg_percent, damage)
 
                 # Round for this monster such that the remaining
                 # damage to distribute is even (handling either 1 or 2
@@ -50,3 +54,34 @@ class PainSplitter(Card):
                 for ally in friends:
                     if ally is not monster:
                         ally.take_damage(gamestate, ally_dmg)
+
+    @classmethod
+    def batch_take_damage(cls, batch, monsters, damage) -> None:
+        hit = (damage > 0) & (batch.hp[monsters] > 0)
+        (monsters, damage) = (monsters[hit], damage[hit])
+        (friends, present) = batch.allies(monsters)
+
+        # If no additional allies left, then this card receives all
+        # the damage regardless
+        alone = ~present.any(axis=1)
+        super().batch_take_damage(batch, monsters[alone], damage[alone])
+
+        sharing = ~alone
+        (monsters, damage) = (monsters[sharing], damage[sharing])
+        kept = (damage * batch.param("dmg_percent", monsters)) // 100
+        received_dmg = kept + (damage - kept) % 2
+        super().batch_take_damage(batch, monsters, received_dmg)
+        batch.call(
+            cls._batch_split_damage,
+            monsters,
+            damage - received_dmg,
+            batch.slot_mask(friends[sharing], present[sharing]),
+        )
+
+    @classmethod
+    def _batch_split_damage(cls, batch, monsters, damage, friends) -> None:
+        (_, queued) = batch.queue(batch.side(monsters))
+        ally_dmg = damage // queued.sum(axis=1)
+        (friends, present) = batch.unpack_slot_mask(monsters, friends)
+        for (ally, here) in zip(friends.T, present.T):
+            batch.take_damage(ally[here], ally_dmg[here])
@@ -0,0 +1,269 @@
+"""An on-disk cache of game results, shared between processes and runs.
+
+GAME_CACHE lives in one process, so every worker of a
+multiprocess tournament starts without it, and it is gone when the
+run ends. A MatchupStore keeps results in an SQLite database instead,
+which every process opens for itself:
+
+    auto_chess.persistent.enable("matchups.sqlite")
+
+makes play_auto_chess (and play_many) look there before playing a
+game, in this process and in any worker process started afterwards.
+
+Results are keyed by a fingerprint of what the decks do, not of the
+Card objects: each card's class, its parameters except its name, the
+code of every class it inherits from, taken as the source of the
+module which defines the class, and the source of the engine modules
+which decide games without going through the cards' classes. So equal
+cards rebuilt by another run find their results, and editing a card's
+module or the engine orphans its old results rather than returning
+them.
+
+Pending results are written when the process exits, but worker
+processes exit without doing so, so the tournament runners flush
+after every chunk through auto_chess.payoff_fn.
+"""
+
+import atexit
+import importlib.util
+import inspect
+import logging
+import marshal
+import os
+import sys
+from typing import Optional, Sequence, TYPE_CHECKING
+
+from analysis import GamePayoffs
+import auto_chess
+from auto_chess import Card
+from auto_chess.registry import REGISTRY
+
+if TYPE_CHECKING:
+    import hashlib
+    import sqlite3
+
+
+log = logging.getLogger(__name__)
+
+
+# the environment variable which tells new processes which store to use
+ENV_VAR = "LUDUS_MATCHUP_CACHE"
+
+
+# auto_chess imports this module to find ENV_VAR, so hashlib and
+# sqlite3, which take half as long to import as auto_chess itself, are
+# imported on first use
+def _sha256(data: bytes = b"") -> 'hashlib._Hash':
+    import hashlib
+    return hashlib.sha256(data)
+
+
+def _module_digest(module_name: str) -> Optional[bytes]:
+    try:
+        source = inspect.getsource(sys.modules[module_name])
+    except (KeyError, OSError, TypeError):
+        return None
+    return _sha256(source.encode()).digest()
+
+
+def _class_digest(klass: type) -> bytes:
+    """A digest of the code klass runs, which changes whenever it does."""
+    digest = _sha256(
+        f"{klass.__module__}.{klass.__qualname__}".encode())
+    module = _module_digest(klass.__module__)
+    if module is not None:
+        digest.update(module)
+        return digest.digest()
+    # defined somewhere without source, e.g. interactively: use the
+    # bytecode of its own methods
+    for (name, value) in sorted(vars(klass).items()):
+        value = getattr(value, "__func__", value)
+        code = getattr(value, "__code__", None)
+        if code is not None:
+            digest.update(name.encode())
+            digest.update(marshal.dumps(code))
+    return digest.digest()
+
+
+# modules which decide games besides those of the cards' classes
+ENGINE_MODULES = (
+    "auto_chess.arrays",
+    "auto_chess.caching",
+    "auto_chess.closed_form",
+    "auto_chess.vectorized",
+)
+_ENGINE_DIGEST: Optional[bytes] = None
+
+
+def _engine_digest() -> bytes:
+    # read rather than imported, so that keying a game needn't import
+    # numpy for auto_chess.vectorized
+    global _ENGINE_DIGEST
+    if _ENGINE_DIGEST is None:
+        digest = _sha256()
+        for module_name in ENGINE_MODULES:
+            spec = importlib.util.find_spec(module_name)
+            assert spec is not None and spec.origin is not None
+            with open(spec.origin, "rb") as source:
+                digest.update(_sha256(source.read()).digest())
+        _ENGINE_DIGEST = digest.digest()
+    return _ENGINE_DIGEST
+
+
+_CLASS_DIGESTS: dict[type, bytes] = {}
+# by card id in the REGISTRY
+_CARD_DIGESTS: dict[int, bytes] = {}
+REGISTRY.on_reset(_CARD_DIGESTS.clear)
+
+
+def _class_fingerprint(card_class: type) -> bytes:
+    try:
+        return _CLASS_DIGESTS[card_class]
+    except KeyError:
+        digest = _sha256(_engine_digest())
+        for klass in card_class.__mro__[:-1]:  # all but object
+            digest.update(_class_digest(klass))
+        _CLASS_DIGESTS[card_class] = digest.digest()
+        return _CLASS_DIGESTS[card_class]
+
+
+def card_fingerprint(card: Card) -> bytes:
+    """A digest of what card does, which is the same in every process
+    and run until its code changes."""
+    card_id = REGISTRY.card_id(card)
+    try:
+        return _CARD_DIGESTS[card_id]
+    except KeyError:
+        pass
+    # the name only labels the card
+    params = sorted((key, value) for (key, value) in vars(card).items()
+                    if key != "name")
+    digest = _sha256(_class_fingerprint(type(card)))
+    digest.update(repr(params).encode())
+    _CARD_DIGESTS[card_id] = digest.digest()
+    return _CARD_DIGESTS[card_id]
+
+
+def matchup_key(
+        p0_deck: Sequence[Card],
+        p1_deck: Sequence[Card],
+        max_turns: int = 128,
+) -> bytes:
+    digest = _sha256(str(max_turns).encode())
+    for deck in (p0_deck, p1_deck):
+        digest.update(len(deck).to_bytes(4, "little"))
+        for card in deck:
+            digest.update(card_fingerprint(card))
+    return digest.digest()
+
+
+class MatchupStore:
+    """Game results in an SQLite database, which any number of
+    processes may read and write at once.
+
+    Each process opens its own connection on first use. New results
+    are written in batches of flush_every, and when the process exits.
+    """
+    def __init__(
+            self,
+            path: str,
+            *,
+            flush_every: int = 256,
+            timeout: float = 60.0,
+    ):
+        self.path = path
+        self.flush_every = flush_every
+        self.timeout = timeout
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+        self._pending: list[tuple[bytes, float, float]] = []
+
+    def _connect(self) -> 'sqlite3.Connection':
+        import sqlite3
+        if self._pid != os.getpid():
+            # a connection must not cross a fork; start this process's own
+            self._connection = sqlite3.connect(self.path, timeout=self.timeout)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute("PRAGMA synchronous=NORMAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS games "
+                "(key BLOB PRIMARY KEY, p0_payoff REAL, p1_payoff REAL) "
+                "WITHOUT ROWID")
+            self._connection.commit()
+            self._pid = os.getpid()
+            self._pending = []
+            atexit.register(self.flush)
+        assert self._connection is not None
+        return self._connection
+
+    def __len__(self) -> int:
+        self.flush()
+        (count,) = self._connect().execute(
+            "SELECT COUNT(*) FROM games").fetchone()
+        return count
+
+    def get(
+            self,
+            p0_deck: Sequence[Card],
+            p1_deck: Sequence[Card],
+    ) -> Optional[GamePayoffs]:
+        row = self._connect().execute(
+            "SELECT p0_payoff, p1_payoff FROM games WHERE key = ?",
+            (matchup_key(p0_deck, p1_deck),),
+        ).fetchone()
+        return None if row is None else GamePayoffs(*row)
+
+    def put(
+            self,
+            p0_deck: Sequence[Card],
+            p1_deck: Sequence[Card],
+            payoffs: GamePayoffs,
+    ) -> None:
+        self._connect()
+        self._pending.append((matchup_key(p0_deck, p1_deck), *payoffs))
+        if len(self._pending) >= self.flush_every:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write the results put since the last flush."""
+        if not self._pending or self._pid != os.getpid():
+            return
+        connection = self._connect()
+        with connection:
+            connection.executemany(
+                "INSERT OR REPLACE INTO games VALUES (?, ?, ?)", self._pending)
+        self._pending.clear()
+
+    def clear(self) -> None:
+        """Forget every result, including those of other runs."""
+        connection = self._connect()
+        self._pending.clear()
+        with connection:
+            connection.execute("DELETE FROM games")
+
+    def close(self) -> None:
+        self.flush()
+        if self._connection is not None and self._pid == os.getpid():
+            self._connection.close()
+        self._connection = None
+        self._pid = None
+
+    def __getstate__(self) -> dict:
+        # connections can't be pickled; the unpickled store opens its own
+        return dict(vars(self), _connection=None, _pid=None, _pending=[])
+
+
+def enable(path: str, **kwargs) -> MatchupStore:
+    """Cache game results in the store at path, in this process and in
+    processes it starts from now on."""
+    store = MatchupStore(path, **kwargs)
+    auto_chess.DISK_CACHE = store
+    os.environ[ENV_VAR] = os.path.abspath(path)
+    return store
+
+
+def disable() -> None:
+    if auto_chess.DISK_CACHE is not None:
+        auto_chess.DISK_CACHE.close()
+    auto_chess.DISK_CACHE = None
+    os.environ.pop(ENV_VAR, None)
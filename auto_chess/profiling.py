@@ -0,0 +1,273 @@
+"""Counting the calls and time spent in each card's hooks.
+
+cProfile attributes a card's work to its hook functions, so every
+card which overrides take_damage looks alike, and time spent in one
+card's hooks on behalf of another (an explosion damaging a whole
+board, say) is hard to pin on either. While profiling is on, the
+engine instruments each Card subclass's hooks as it deals the class's
+first monster, and every call records its time under the card's class
+and under the card itself:
+
+    with profiling.profiling() as profile:
+        play_many(matchups)
+    profile.log()
+
+Only the hooks a class overrides are counted; Card's own do nothing
+interesting, and the engine runs them inline. A hook's time includes
+the hooks it calls, like cProfile's cumulative time.
+
+Worker processes profile too, if their tournament runs inside
+profiling(processes=True). Each one writes its profile to a shared
+directory after every play_many, so they are only counted for games
+played through play_many (as auto_chess.payoff_fn does), and the
+profile holds them all when the block ends.
+"""
+
+import collections
+import contextlib
+import logging
+import os
+import pickle
+import shutil
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Iterator, NamedTuple, Optional, TYPE_CHECKING
+
+from auto_chess.registry import REGISTRY
+
+if TYPE_CHECKING:
+    from auto_chess import Card
+
+
+log = logging.getLogger(__name__)
+
+
+# the environment variable which tells new processes where to write
+# their profiles
+ENV_VAR = "LUDUS_PROFILE"
+
+
+class HookStats(NamedTuple):
+    calls: int
+    seconds: float
+
+
+class Profile:
+    """Calls to and time spent in cards' hooks, by (card class, hook)
+    and by (card, hook)."""
+    def __init__(
+            self,
+            directory: Optional[str] = None,
+            *,
+            worker: bool = False,
+    ) -> None:
+        # [calls, seconds], by (the class's name, hook) and by (the
+        # card's label, hook)
+        self._classes: dict[tuple[str, str], list] = collections.defaultdict(
+            lambda: [0, 0.0])
+        self._cards: dict[tuple[str, str], list] = collections.defaultdict(
+            lambda: [0, 0.0])
+        self._names: dict[int, str] = {}
+        # where processes other than the profile's owner write theirs
+        self.directory = directory
+        self._pid = os.getpid()
+        self._owner = None if worker else self._pid
+
+    def record(self, card_class: type, card: 'Card', hook: str, seconds: float) -> None:
+        if self._pid != os.getpid():
+            # inherited by a forked worker: count only the worker's calls
+            self._clear()
+            self._pid = os.getpid()
+        stats = self._classes[card_class.__name__, hook]
+        stats[0] += 1
+        stats[1] += seconds
+        card_id = REGISTRY.card_id(card)
+        try:
+            name = self._names[card_id]
+        except KeyError:
+            name = self._names[card_id] = card_label(card)
+        stats = self._cards[name, hook]
+        stats[0] += 1
+        stats[1] += seconds
+
+    def _clear(self) -> None:
+        self._classes.clear()
+        self._cards.clear()
+
+    def merge(self, other: 'Profile') -> None:
+        """Add other's calls to this profile's."""
+        for (mine, theirs) in ((self._classes, other._classes),
+                               (self._cards, other._cards)):
+            for (key, (calls, seconds)) in theirs.items():
+                stats = mine[key]
+                stats[0] += calls
+                stats[1] += seconds
+
+    def by_class(self) -> dict[tuple[str, str], HookStats]:
+        """The stats of each (card class, hook), slowest first."""
+        return _sorted(self._classes)
+
+    def by_card(self) -> dict[tuple[str, str], HookStats]:
+        """The stats of each (card, hook), slowest first."""
+        return _sorted(self._cards)
+
+    def flush(self) -> None:
+        """Write this process's calls to the directory, if it isn't the
+        process the profile belongs to."""
+        if self.directory is None or self._pid == self._owner:
+            return
+        path = os.path.join(self.directory, f"{os.getpid()}.pickle")
+        with open(f"{path}.tmp", "wb") as out:
+            pickle.dump((dict(self._classes), dict(self._cards)), out)
+        # so the profile never reads half a file
+        os.replace(f"{path}.tmp", path)
+
+    def collect(self) -> None:
+        """Merge in the calls other processes wrote to the directory."""
+        if self.directory is None:
+            return
+        for name in os.listdir(self.directory):
+            if not name.endswith(".pickle"):
+                continue
+            other = Profile()
+            with open(os.path.join(self.directory, name), "rb") as saved:
+                (classes, cards) = pickle.load(saved)
+            other._classes.update(classes)
+            other._cards.update(cards)
+            self.merge(other)
+
+    def render(self, top: Optional[int] = 20) -> list[str]:
+        """A table of the slowest hooks, by class and then by card."""
+        lines: list[str] = []
+        for (title, stats) in (("card class", self.by_class()),
+                               ("card", self.by_card())):
+            lines.append(f"{'calls':>10} {'seconds':>10} {'us/call':>8}  "
+                         f"{title}.hook")
+            for ((owner, hook), (calls, seconds)) in list(stats.items())[:top]:
+                lines.append(f"{calls:>10} {seconds:>10.3f} "
+                             f"{1e6 * seconds / calls:>8.2f}  {owner}.{hook}")
+        return lines
+
+    def log(self, logger: logging.Logger = log, level: int = logging.INFO,
+            top: Optional[int] = 20) -> None:
+        for line in self.render(top):
+            logger.log(level, "%s", line)
+
+
+def card_label(card: 'Card') -> str:
+    """The name card's stats are kept under: its class and every field,
+    so that cards which print alike, but differ, are told apart."""
+    fields = ", ".join(f"{key}={value!r}" for (key, value) in vars(card).items())
+    return f"{type(card).__name__}({fields})"
+
+
+def _sorted(stats: dict[tuple[str, str], list]) -> dict[tuple[str, str], HookStats]:
+    return {key: HookStats(*value) for (key, value)
+            in sorted(stats.items(), key=lambda item: -item[1][1])}
+
+
+# the Profile which hook calls are currently recorded into, or None to
+# record nothing.
+PROFILE: Optional[Profile] = None
+
+
+def _forget_card_ids() -> None:
+    if PROFILE is not None:
+        PROFILE._names.clear()
+
+
+REGISTRY.on_reset(_forget_card_ids)
+
+
+# the original attributes of each instrumented (class, hook), or
+# _INHERITED if the class inherited it
+_ORIGINALS: dict[tuple[type, str], Any] = {}
+_INHERITED = object()
+
+
+def _instrumented(card_class: type, hook: str, fn: Callable) -> Callable:
+    def profiled(card, *args):
+        profile = PROFILE
+        # a subclass's hook calling super() reaches this class's
+        # wrapper, and is already being counted
+        if profile is None or type(card) is not card_class:
+            return fn(card, *args)
+        start = time.perf_counter()
+        try:
+            return fn(card, *args)
+        finally:
+            profile.record(card_class, card, hook, time.perf_counter() - start)
+
+    profiled.__wrapped__ = fn  # type: ignore[attr-defined]
+    return profiled
+
+
+def instrument(card_class: type) -> None:
+    """Count the calls to the hooks card_class overrides, from now until
+    profiling ends."""
+    from auto_chess import Card, Hooks, _defining_class
+
+    for hook in Hooks._fields:
+        if (card_class, hook) in _ORIGINALS \
+                or _defining_class(card_class, hook) is Card:
+            continue
+        _ORIGINALS[card_class, hook] = vars(card_class).get(hook, _INHERITED)
+        # set on card_class itself, even if inherited, so that calls are
+        # counted under the class of the card they were called on
+        setattr(card_class, hook,
+                _instrumented(card_class, hook, getattr(card_class, hook)))
+
+
+def _uninstrument() -> None:
+    for ((card_class, hook), original) in _ORIGINALS.items():
+        if original is _INHERITED:
+            delattr(card_class, hook)
+        else:
+            setattr(card_class, hook, original)
+    _ORIGINALS.clear()
+
+
+def _forget_dispatch() -> None:
+    """Make the engine build its dispatch tables, and so its monsters,
+    afresh, so that they see the classes' hooks as they are now."""
+    import auto_chess
+
+    auto_chess._HOOKS.clear()
+    if "auto_chess.arrays" in sys.modules:
+        sys.modules["auto_chess.arrays"]._IDLE_BOARDS.clear()
+    # instrumenting a class defines the hooks it inherited on it, which
+    # hides the batched hooks it inherited too
+    if "auto_chess.vectorized" in sys.modules:
+        sys.modules["auto_chess.vectorized"]._BATCHABLE.clear()
+
+
+@contextlib.contextmanager
+def profiling(
+        into: Optional[Profile] = None,
+        *,
+        processes: bool = False,
+) -> Iterator[Profile]:
+    """Profile the hooks called in the body, and with processes, those
+    called in worker processes started within it."""
+    global PROFILE
+    if PROFILE is not None:
+        raise RuntimeError("already profiling")
+    profile = into if into is not None else Profile()
+    directory = None
+    if processes:
+        directory = profile.directory = tempfile.mkdtemp(prefix="ludus-profile-")
+        os.environ[ENV_VAR] = directory
+    PROFILE = profile
+    _forget_dispatch()
+    try:
+        yield profile
+    finally:
+        PROFILE = None
+        _uninstrument()
+        _forget_dispatch()
+        if directory is not None:
+            os.environ.pop(ENV_VAR, None)
+            profile.collect()
+            shutil.rmtree(directory, ignore_errors=True)
+            profile.directory = None
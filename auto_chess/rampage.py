@@ -3,7 +3,7 @@
 # With each battle (aging), first gets stronger (ramps up), then gets
 # weaker (ramps down) => based on middle-age threshold
 
-from auto_chess import Card, Monster, GameState
+from auto_chess import Card, Monster, GameState, trace
 import logging
 
 
@@ -11,6 +11,8 @@ log = logging.getLogger(__name__)
 
 
 class RampAge(Card):
+    state_fields = ("current_age",)
+
     def __init__(self, *args, middle_age: int = 4, **kwargs):
         # Inflection point for stronger vs. weaker
         self.middle_age = middle_age
@@ -31,8 +33,10 @@ class RampAge(Card):
 
     def before_combat(self, monster: Monster, gamestate: GameState) -> None:
         monster["current_age"] += 1
-        log.info((f"{monster.print_at_game_state(gamestate)} "
-                  f"ages one unit to {monster['current_age']} "))
+        monster.atk_changed()
+        if trace.TRACE is not None:
+            trace.TRACE.note("%s ages one unit to %d ",
+                             trace.snapshot(monster), monster["current_age"])
         super().before_combat(monster, gamestate)
 
     def current_atk(self, monster: Monster, gamestate: GameState) -> int:
@@ -45,3 +49,20 @@ class RampAge(Card):
                     - (monster["current_age"] - self.middle_age)
         except KeyError:
             return self.base_atk
+
+    @classmethod
+    def batch_on_game_start(cls, batch, monsters) -> None:
+        batch.state("current_age")[monsters] = 0
+        super().batch_on_game_start(batch, monsters)
+
+    @classmethod
+    def batch_before_combat(cls, batch, monsters) -> None:
+        batch.state("current_age")[monsters] += 1
+        super().batch_before_combat(batch, monsters)
+
+    @classmethod
+    def batch_current_atk(cls, batch, monsters):
+        age = batch.state("current_age")[monsters]
+        middle_age = batch.param("middle_age", monsters)
+        older = (age - middle_age).clip(min=0)
+        return batch.param("base_atk", monsters) + age - 2 * older
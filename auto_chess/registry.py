@@ -0,0 +1,141 @@
+"""Interning cards as small integer ids, and decks as packed integers.
+
+Cards compare and hash by their fields, so every dict lookup keyed on
+a deck hashes a tuple per card and compares each card field by field.
+A CardRegistry instead gives each distinct card a small id, once, and
+afterwards finds it by the identity of the card object, so a deck
+packs into a single int:
+
+    key = REGISTRY.pack(deck)    # the card ids, BITS bits each
+    REGISTRY.unpack(key)         # the canonical cards of the deck
+
+Equal cards of the same class share an id whichever object they are,
+and unpack returns the object which was interned first. The registry
+holds that one object per distinct card, and only weak references to
+the others, so cards which are rebuilt every generation of an
+optimizer don't accumulate.
+
+There are only MAX_CARDS ids, though. Once all but RESERVED of them are
+taken, reset_if_full, which play_auto_chess calls before each game,
+forgets every card, and the caches keyed on their ids, which register
+with on_reset, are cleared, so a long run starts over rather than fail.
+Ids are only meaningful within the process which assigned them, and
+until its registry is next reset.
+"""
+
+from typing import Callable, Iterable, TYPE_CHECKING
+import weakref
+
+if TYPE_CHECKING:
+    from auto_chess import Card
+
+
+# bits per card in a packed deck. Ids start at 1, so a packed deck
+# knows its own length.
+BITS = 16
+MAX_CARDS = (1 << BITS) - 1
+# the ids kept for the cards a single game interns, such as those its
+# cards' hooks make mid-game, once the registry is due to be reset
+RESERVED = 1 << 12
+
+
+class CardRegistry:
+    def __init__(self, capacity: int = MAX_CARDS) -> None:
+        # the most ids it gives out before it has to be reset
+        self.capacity = min(capacity, MAX_CARDS)
+        # the card with id i is _cards[i - 1]
+        self._cards: list['Card'] = []
+        self._ids: dict[tuple[type, 'Card'], int] = {}
+        # ids by id(card), for each live card object seen so far. Each
+        # entry goes with its card, before id(card) can be reused.
+        self._by_object: dict[int, int] = {}
+        self._refs: dict[int, weakref.ref] = {}
+        # the number of resets so far
+        self.generation = 0
+        self._on_reset: list[Callable[[], None]] = []
+
+    def __len__(self) -> int:
+        """The number of distinct cards."""
+        return len(self._cards)
+
+    def card_id(self, card: 'Card') -> int:
+        try:
+            return self._by_object[id(card)]
+        except KeyError:
+            return self._intern(card)
+
+    def _intern(self, card: 'Card') -> int:
+        # Card.__eq__ ignores the class, so include it in the key
+        key = (type(card), card)
+        try:
+            card_id = self._ids[key]
+        except KeyError:
+            if len(self._cards) >= self.capacity:
+                raise OverflowError(
+                    f"more than {self.capacity} distinct cards to intern in one game")
+            self._cards.append(card)
+            card_id = self._ids[key] = len(self._cards)
+        object_id = id(card)
+        try:
+            self._refs[object_id] = weakref.ref(
+                card, lambda _: self._forget(object_id))
+        except TypeError:
+            # can't be weakly referenced, so look it up by value each time
+            return card_id
+        self._by_object[object_id] = card_id
+        return card_id
+
+    def _forget(self, object_id: int) -> None:
+        self._by_object.pop(object_id, None)
+        self._refs.pop(object_id, None)
+
+    def card(self, card_id: int) -> 'Card':
+        return self._cards[card_id - 1]
+
+    def canonical(self, card: 'Card') -> 'Card':
+        """The first interned card equal to card."""
+        return self._cards[self.card_id(card) - 1]
+
+    def pack(self, deck: Iterable['Card']) -> int:
+        """The ids of deck's cards, packed into an int, first card lowest."""
+        by_object = self._by_object
+        key = 0
+        shift = 0
+        for card in deck:
+            card_id = by_object.get(id(card)) or self._intern(card)
+            key |= card_id << shift
+            shift += BITS
+        return key
+
+    def unpack(self, key: int) -> tuple['Card', ...]:
+        """The canonical cards of the deck which packs to key."""
+        cards = self._cards
+        deck = []
+        while key:
+            deck.append(cards[(key & MAX_CARDS) - 1])
+            key >>= BITS
+        return tuple(deck)
+
+    def on_reset(self, forget: Callable[[], None]) -> None:
+        """Call forget, which should clear something keyed on card
+        ids, whenever the registry is reset."""
+        self._on_reset.append(forget)
+
+    def reset(self) -> None:
+        """Forget every card, so that ids start from 1 again."""
+        self._cards.clear()
+        self._ids.clear()
+        self._by_object.clear()
+        self._refs.clear()
+        self.generation += 1
+        for forget in self._on_reset:
+            forget()
+
+    def reset_if_full(self) -> None:
+        """Reset if fewer than RESERVED ids are left. Call it only
+        between games, when nothing holds on to an id."""
+        if len(self._cards) > self.capacity - min(RESERVED, self.capacity // 2):
+            self.reset()
+
+
+REGISTRY = CardRegistry()
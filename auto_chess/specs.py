@@ -0,0 +1,367 @@
+"""Cards defined as data: some stats plus a list of simple effects.
+
+Most special cards are a plain Card with one parameterized effect:
+exploding for N damage on death, ignoring the first N hits, and so on.
+A CardSpec describes such a card declaratively,
+
+    volatile = compile_card(CardSpec("volatile", 2, 1, (Explode(1),)))
+
+and compile_card builds a Card subclass for it whose hooks are closures
+over the spec's parameters. The class overrides only the hooks its
+effects need, so the engine's dispatch tables (auto_chess.hooks) skip
+the rest, and its hooks index the monster's state directly rather than
+going through Monster.__getitem__. It has batched hooks too, for
+auto_chess.vectorized. Otherwise a compiled card is an ordinary Card,
+and plays in the same games as hand-written ones.
+
+Each effect behaves exactly like the shipped card it is named after.
+A spec may have each kind of effect at most once, and at most one of
+the effects which change atk (Grow and Age). Armor absorbs a hit before
+Grow sees it, and the on-death effects happen in the order they are
+listed.
+"""
+
+from typing import Callable, NamedTuple, Union
+
+from auto_chess import Card, Monster, GameState, _UNSET, trace
+
+
+class Explode(NamedTuple):
+    """On death, deal damage to every enemy, like ExplodeOnDeath."""
+    damage: int = 1
+
+
+class HealAllies(NamedTuple):
+    """On death, heal every ally, like HealOnDeath."""
+    health: int = 1
+
+
+class Armor(NamedTuple):
+    """Ignore the first points hits, like IgnoreFirstDamage."""
+    points: int = 1
+
+
+class Grow(NamedTuple):
+    """Gain atk_per_hit atk whenever damaged, like GrowOnDamage."""
+    atk_per_hit: int = 1
+
+
+class Age(NamedTuple):
+    """Gain an atk each fight until middle_age, and lose one each fight
+    after, like RampAge."""
+    middle_age: int = 4
+
+
+Effect = Union[Explode, HealAllies, Armor, Grow, Age]
+
+# the card attribute which holds each effect's parameter, named as on
+# the shipped cards, for Batch.param
+_PARAMS: dict[type, str] = {
+    Explode: "explode_damage",
+    HealAllies: "explode_heal",
+    Armor: "armor_points",
+    Grow: "atk_per_hit",
+    Age: "middle_age",
+}
+
+
+class CardSpec(NamedTuple):
+    name: str
+    atk: int
+    health: int
+    effects: tuple[Effect, ...] = ()
+
+
+class SpecCard(Card):
+    """A Card compiled from a CardSpec. Make them with compile_card."""
+    def __init__(self, spec: CardSpec):
+        super().__init__(spec.atk, spec.health, spec.name)
+        self.spec = spec
+        for effect in spec.effects:
+            setattr(self, _PARAMS[type(effect)], effect[0])
+
+    def __str__(self) -> str:
+        effects = " ".join(map(str, self.spec.effects))
+        return f"<{effects} {self.name} ({self.base_atk}/{self.health})>"
+
+    def __eq__(self, other):
+        return super().__eq__(other) \
+            and getattr(other, "spec", None) == self.spec
+
+    def __hash__(self):
+        return hash(self.spec)
+
+    def __reduce__(self):
+        # the classes are made at runtime, so pickle the spec instead
+        return (compile_card, (self.spec,))
+
+
+_CLASSES: dict[CardSpec, type[SpecCard]] = {}
+
+
+def compile_card(spec: CardSpec) -> SpecCard:
+    """The card spec describes, as an instance of a class built for it."""
+    try:
+        card_class = _CLASSES[spec]
+    except KeyError:
+        card_class = _CLASSES[spec] = _compile(spec)
+    return card_class(spec)
+
+
+def _compile(spec: CardSpec) -> type[SpecCard]:
+    kinds = [type(effect) for effect in spec.effects]
+    for kind in kinds:
+        if kind not in _PARAMS:
+            raise TypeError(f"{spec.name}: {kind.__name__} is not an effect")
+    if len(set(kinds)) < len(kinds):
+        raise ValueError(f"{spec.name} has the same kind of effect twice")
+    if Grow in kinds and Age in kinds:
+        raise ValueError(f"{spec.name} has more than one effect on its atk")
+    # every effect has a single parameter
+    params = {type(effect): effect[0] for effect in spec.effects}
+    # SpecCard declares no state, so these are the whole of the
+    # class's state_layout
+    state_fields = tuple(_FIELDS[kind] for kind in kinds if kind in _FIELDS)
+    fields = {field: index for (index, field) in enumerate(state_fields)}
+
+    namespace: dict[str, object] = {"state_fields": state_fields}
+    for build in (_on_game_start, _before_combat, _current_atk,
+                  _take_damage, _on_death):
+        for (name, fn) in build(spec, params, fields).items():
+            namespace[name] = classmethod(fn) if name.startswith("batch_") \
+                else fn
+    return type(f"{SpecCard.__name__}[{spec.name}]", (SpecCard,), namespace)
+
+
+# the state each effect keeps, named as on the shipped cards
+_FIELDS: dict[type, str] = {
+    Armor: "armor_points",
+    Grow: "current_atk",
+    Age: "current_age",
+}
+
+# Each of these builds the hooks, object and batched, which the effects
+# of a spec need for one of Card's hooks, or none if they need nothing.
+# The object hooks read and write the monster's state by its index in
+# fields.
+_Built = dict[str, Callable]
+
+
+def _on_game_start(
+        spec: CardSpec,
+        params: dict[type, int],
+        fields: dict[str, int],
+) -> _Built:
+    values = {"armor_points": params.get(Armor, 0),
+              "current_atk": spec.atk,
+              "current_age": 0}
+    initial = [(field, values[field]) for field in fields]
+    if not initial:
+        return {}
+    by_index = [(fields[field], value) for (field, value) in initial]
+
+    def on_game_start(self, monster: Monster, gamestate: GameState) -> None:
+        state = monster._state
+        for (index, value) in by_index:
+            state[index] = value
+
+    def batch_on_game_start(cls, batch, monsters) -> None:
+        for (field, value) in initial:
+            batch.state(field)[monsters] = value
+
+    return {"on_game_start": on_game_start,
+            "batch_on_game_start": batch_on_game_start}
+
+
+def _before_combat(
+        spec: CardSpec,
+        params: dict[type, int],
+        fields: dict[str, int],
+) -> _Built:
+    if Age not in params:
+        return {}
+    age = fields["current_age"]
+
+    def before_combat(self, monster: Monster, gamestate: GameState) -> None:
+        state = monster._state
+        state[age] += 1
+        monster.atk_changed()
+        if trace.TRACE is not None:
+            trace.TRACE.note("%s ages one unit to %d ",
+                             trace.snapshot(monster), state[age])
+
+    def batch_before_combat(cls, batch, monsters) -> None:
+        batch.state("current_age")[monsters] += 1
+
+    return {"before_combat": before_combat,
+            "batch_before_combat": batch_before_combat}
+
+
+def _current_atk(
+        spec: CardSpec,
+        params: dict[type, int],
+        fields: dict[str, int],
+) -> _Built:
+    atk = spec.atk
+    if Grow in params:
+        grown = fields["current_atk"]
+
+        def current_atk(self, monster: Monster, gamestate: GameState) -> int:
+            value = monster._state[grown]
+            return atk if value is _UNSET else value
+
+        def batch_current_atk(cls, batch, monsters):
+            return batch.state("current_atk")[monsters]
+
+    elif Age in params:
+        middle_age = params[Age]
+        aged = fields["current_age"]
+
+        def current_atk(self, monster: Monster, gamestate: GameState) -> int:
+            age = monster._state[aged]
+            if age is _UNSET:
+                return atk
+            if age <= middle_age:
+                return atk + age
+            return atk + 2 * middle_age - age
+
+        def batch_current_atk(cls, batch, monsters):
+            age = batch.state("current_age")[monsters]
+            return atk + age - 2 * (age - middle_age).clip(min=0)
+
+    else:
+        return {}
+    return {"current_atk": current_atk,
+            "batch_current_atk": batch_current_atk}
+
+
+def _take_damage(
+        spec: CardSpec,
+        params: dict[type, int],
+        fields: dict[str, int],
+) -> _Built:
+    armored = Armor in params
+    growing = Grow in params
+    if not (armored or growing):
+        return {}
+    armor = fields.get("armor_points", -1)
+    grown = fields.get("current_atk", -1)
+    atk_per_hit = params.get(Grow, 0)
+
+    def take_damage(
+            self,
+            monster: Monster,
+            gamestate: GameState,
+            damage: int,
+    ) -> None:
+        state = monster._state
+        if armored and state[armor] > 0:
+            if trace.TRACE is not None:
+                trace.TRACE.note("%s loses an armor point",
+                                 trace.snapshot(monster))
+            state[armor] -= 1
+            return
+        if growing and damage > 0:
+            state[grown] += atk_per_hit
+            monster.atk_changed()
+        Card.take_damage(self, monster, gamestate, damage)
+
+    def batch_take_damage(cls, batch, monsters, damage) -> None:
+        if armored:
+            armor_points = batch.state("armor_points")
+            absorbed = armor_points[monsters] > 0
+            armor_points[monsters[absorbed]] -= 1
+            (monsters, damage) = (monsters[~absorbed], damage[~absorbed])
+        if growing:
+            batch.state("current_atk")[monsters[damage > 0]] += atk_per_hit
+        batch.base_take_damage(monsters, damage)
+
+    return {"take_damage": take_damage,
+            "batch_take_damage": batch_take_damage}
+
+
+def _on_death(
+        spec: CardSpec,
+        params: dict[type, int],
+        fields: dict[str, int],
+) -> _Built:
+    steps = [_DEATH_STEPS[type(effect)](effect) for effect in spec.effects
+             if type(effect) in _DEATH_STEPS]
+    if not steps:
+        return {}
+    batch_steps = [_BATCH_DEATH_STEPS[type(effect)] for effect in spec.effects
+                   if type(effect) in _BATCH_DEATH_STEPS]
+
+    def on_death(self, monster: Monster, gamestate: GameState) -> None:
+        for step in steps:
+            step(monster, gamestate)
+        Card.on_death(self, monster, gamestate)
+
+    def batch_on_death(cls, batch, monsters) -> None:
+        # each step sees what the ones before it did, as in on_death
+        for step in batch_steps:
+            batch.call(step, monsters)
+        batch.call(Card.batch_on_death, monsters)
+
+    return {"on_death": on_death, "batch_on_death": batch_on_death}
+
+
+def _explode(effect: Explode) -> Callable[[Monster, GameState], None]:
+    damage = effect.damage
+
+    def explode(monster: Monster, gamestate: GameState) -> None:
+        if trace.TRACE is not None:
+            trace.TRACE.note("%s explodes for %d damage",
+                             trace.snapshot(monster), damage)
+        opponent_gamestate = gamestate.invert()
+        for enemy in list(gamestate.opponent.monsters):
+            enemy.take_damage(opponent_gamestate, damage)
+        if gamestate.defender and gamestate.defender.is_alive():
+            gamestate.defender.take_damage(opponent_gamestate, damage)
+
+    return explode
+
+
+def _heal_allies(effect: HealAllies) -> Callable[[Monster, GameState], None]:
+    health = effect.health
+
+    def heal_allies(monster: Monster, gamestate: GameState) -> None:
+        if trace.TRACE is not None:
+            trace.TRACE.note("%s heals its allies for %d health",
+                             trace.snapshot(monster), health)
+        for ally in list(gamestate.player.monsters):
+            if ally is not monster:
+                ally.heal(gamestate, health)
+
+    return heal_allies
+
+
+def _batch_explode(batch, monsters) -> None:
+    damage = batch.param("explode_damage", monsters)
+    (enemies, present) = batch.enemies(monsters)
+    for (enemy, here) in zip(enemies.T, present.T):
+        batch.take_damage(enemy[here], damage[here])
+    batch.call(_batch_explode_at_defender, monsters, damage)
+
+
+def _batch_explode_at_defender(batch, monsters, damage) -> None:
+    defender = batch.defender(monsters)
+    hit = (defender >= 0) & (batch.hp[defender] > 0)
+    batch.take_damage(defender[hit], damage[hit])
+
+
+def _batch_heal_allies(batch, monsters) -> None:
+    health = batch.param("explode_heal", monsters)
+    (allies, present) = batch.allies(monsters)
+    for (ally, here) in zip(allies.T, present.T):
+        batch.heal(ally[here], health[here])
+
+
+_DEATH_STEPS: dict[type, Callable] = {
+    Explode: _explode,
+    HealAllies: _heal_allies,
+}
+_BATCH_DEATH_STEPS: dict[type, Callable] = {
+    Explode: _batch_explode,
+    HealAllies: _batch_heal_allies,
+}
@@ -0,0 +1,160 @@
+"""What happened in a game, beyond who won.
+
+A GameStats records how many turns a game lasted, and for each
+player's monsters, in the order of its deck, the turn each one died on
+and the health each one ended with:
+
+    (payoffs, stats) = play_auto_chess(p0_deck, p1_deck, with_stats=True)
+
+A StatsTable holds the stats of every game of a round robin, in
+fixed-width arrays laid out like its payoff matrix:
+
+    table = StatsTable(len(decks), deck_size)
+    analysis.round_robin(auto_chess.payoff_fn, decks, stats=table)
+    table.turns.mean()
+
+Games with stats are played in full by the object engine: not resolved
+by closed_form, looked up in a cache or transposition table, or ended
+early at a repeated board. Games without stats don't pay for them at
+all.
+"""
+
+from typing import NamedTuple, Optional, Sequence, TYPE_CHECKING
+
+from analysis import GamePayoffs
+from auto_chess import Card, Matchup, _Game
+
+if TYPE_CHECKING:
+    import numpy as np
+
+
+# the death turn of a monster which survived the game
+SURVIVED = -1
+# in a StatsTable, the death turn of a slot past the end of a deck
+NOT_DEALT = -2
+
+
+class GameStats(NamedTuple):
+    # the number of turns fought
+    turns: int
+    # for each player, the turn on which each monster of its deck died,
+    # counting from 1 (0 is before the first fight), or SURVIVED
+    death_turns: tuple[tuple[int, ...], tuple[int, ...]]
+    # for each player, each monster's health at the end, 0 if it died
+    health: tuple[tuple[int, ...], tuple[int, ...]]
+
+    def survivors(self, player: int) -> list[int]:
+        """The positions in player's deck of its monsters which survived."""
+        return [k for (k, turn) in enumerate(self.death_turns[player])
+                if turn == SURVIVED]
+
+
+class _StatsGame(_Game):
+    """A _Game which notes when each monster dies."""
+    def __init__(self, p0_deck: Sequence[Card], p1_deck: Sequence[Card], *,
+                 max_turns: int = 128):
+        # play every turn, so that the monsters end as they would
+        super().__init__(p0_deck, p1_deck, max_turns=max_turns,
+                         quiet_turns=max_turns)
+        self.transpositions = None
+        self._turns = 0
+        self._alive = -1
+        self._death_turns = tuple([SURVIVED] * len(player._dealt)
+                                  for player in self.players)
+
+    def start_battle(self) -> None:
+        super().start_battle()
+        self._note_deaths()
+
+    def single_turn(self) -> Optional[GamePayoffs]:
+        res = super().single_turn()
+        if res is None:
+            self._turns += 1
+            self._note_deaths()
+        return res
+
+    def _note_deaths(self) -> None:
+        # every live monster is queued between turns, so only look for
+        # the dead when the queues shrink
+        alive = len(self.players[0].monsters) + len(self.players[1].monsters)
+        if alive == self._alive:
+            return
+        self._alive = alive
+        for (player, death_turns) in zip(self.players, self._death_turns):
+            for (k, monster) in enumerate(player._dealt):
+                if death_turns[k] == SURVIVED and not monster.is_alive():
+                    death_turns[k] = self._turns
+
+    def stats(self) -> GameStats:
+        death_turns = tuple(map(tuple, self._death_turns))
+        health = tuple(tuple(max(monster._remaining_health, 0)
+                             for monster in player._dealt)
+                       for player in self.players)
+        return GameStats(self._turns, death_turns, health)  # type: ignore[arg-type]
+
+
+def play_with_stats(
+        p0_deck: Sequence[Card],
+        p1_deck: Sequence[Card],
+        *,
+        max_turns: int = 128,
+) -> tuple[GamePayoffs, GameStats]:
+    game = _StatsGame(p0_deck, p1_deck, max_turns=max_turns)
+    payoffs = game.play()
+    return (payoffs, game.stats())
+
+
+def play_many_with_stats(
+        pairs: Sequence[Matchup],
+) -> list[tuple[GamePayoffs, GameStats]]:
+    return [play_with_stats(p0_deck, p1_deck) for (p0_deck, p1_deck) in pairs]
+
+
+class StatsTable:
+    """The GameStats of the games between n_decks decks of deck_size
+    cards, as numpy arrays indexed like a round robin's payoff matrix.
+
+    Entry [i, j] is deck i's game against deck j, seen from deck i's
+    side, so player 0 is deck i whichever deck went first:
+
+    - turns[i, j] is its length, or -1 if it wasn't played,
+    - death_turns[i, j, p, k] is the turn on which card k of player p's
+      deck died, SURVIVED, or NOT_DEALT for a deck shorter than
+      deck_size,
+    - health[i, j, p, k] is that monster's health at the end.
+    """
+    turns: 'np.ndarray'
+    death_turns: 'np.ndarray'
+    health: 'np.ndarray'
+
+    def __init__(self, n_decks: int, deck_size: int):
+        import numpy
+
+        self.turns = numpy.full((n_decks, n_decks), -1, dtype=numpy.int16)
+        self.death_turns = numpy.full((n_decks, n_decks, 2, deck_size), NOT_DEALT,
+                                      dtype=numpy.int16)
+        self.health = numpy.zeros((n_decks, n_decks, 2, deck_size), dtype=numpy.int16)
+
+    def record(self, i: int, j: int, stats: GameStats) -> None:
+        """Store the stats of a game in which deck i played first
+        against deck j."""
+        views = [(i, j, (0, 1))]
+        if i != j:
+            views.append((j, i, (1, 0)))
+        for (row, column, players) in views:
+            self.turns[row, column] = stats.turns
+            for (p, player) in enumerate(players):
+                size = len(stats.death_turns[player])
+                self.death_turns[row, column, p, :size] = stats.death_turns[player]
+                self.health[row, column, p, :size] = stats.health[player]
+
+    def __getitem__(self, index: tuple[int, int]) -> GameStats:
+        (i, j) = index
+        death_turns = []
+        health = []
+        for p in range(2):
+            dealt = self.death_turns[i, j, p] != NOT_DEALT
+            death_turns.append(tuple(self.death_turns[i, j, p][dealt].tolist()))
+            health.append(tuple(self.health[i, j, p][dealt].tolist()))
+        return GameStats(int(self.turns[i, j]),
+                         tuple(death_turns), tuple(health))  # type: ignore[arg-type]
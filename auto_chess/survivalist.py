@@ -1,7 +1,7 @@
 # Swaps remaining health and attack whenever the attack stat is
 # greater, effectively weakening in exchange for more health
 
-from auto_chess import Card, Monster, GameState
+from auto_chess import Card, Monster, GameState, trace
 import logging
 
 
@@ -9,6 +9,8 @@ log = logging.getLogger(__name__)
 
 
 class Survivalist(Card):
+    state_fields = ("atk",)
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
@@ -33,10 +35,31 @@ class Survivalist(Card):
         super().heal(monster, state, health)
         self.swap_health_atk(monster, state)
 
+    # swap_health_atk stores monster["atk"] back as it found it, so the
+    # batched hooks have nothing to do after deferring to Card.
+    @classmethod
+    def batch_on_game_start(cls, batch, monsters) -> None:
+        batch.state("atk")[monsters] = batch.param("base_atk", monsters)
+        super().batch_on_game_start(batch, monsters)
+
+    @classmethod
+    def batch_current_atk(cls, batch, monsters):
+        return batch.state("atk")[monsters]
+
+    @classmethod
+    def batch_take_damage(cls, batch, monsters, damage) -> None:
+        super().batch_take_damage(batch, monsters, damage)
+
+    @classmethod
+    def batch_heal(cls, batch, monsters, health) -> None:
+        super().batch_heal(batch, monsters, health)
+
     def swap_health_atk(self, monster: Monster, gamestate: GameState) -> None:
         if monster.atk(gamestate) > monster._remaining_health:
-            log.info((f"{monster.print_at_game_state(gamestate)}"
-                      " swaps its attack for its health"))
+            if trace.TRACE is not None:
+                trace.TRACE.note("%s swaps its attack for its health",
+                                 trace.snapshot(monster))
             temp = monster["atk"]
             monster["atk"] = monster._remaining_health
             monster["atk"] = temp
+            monster.atk_changed()
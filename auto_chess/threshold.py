@@ -4,7 +4,7 @@
 # all enemies heavily (thresh) if goal age reached/surpased
 # (threshold)
 
-from auto_chess import Card, Monster, GameState
+from auto_chess import Card, Monster, GameState, trace
 import logging
 
 
@@ -12,6 +12,8 @@ log = logging.getLogger(__name__)
 
 
 class ThreshOld(Card):
+    state_fields = ("current_age",)
+
     def __init__(self, *args, target_age: int = 4, **kwargs):
         # Minimum desired age for defeat/death
         self.target_age = target_age
@@ -31,24 +33,53 @@ class ThreshOld(Card):
         super().on_game_start(monster, gamestate)
 
     def before_combat(self, monster: Monster, gamestate: GameState) -> None:
-        log.info((f"{monster.print_at_game_state(gamestate)} "
-                  f"ages one unit to {monster['current_age']} "))
+        if trace.TRACE is not None:
+            trace.TRACE.note("%s ages one unit to %d ",
+                             trace.snapshot(monster), monster["current_age"])
         monster["current_age"] += 1
         super().on_game_start(monster, gamestate)
 
     def on_death(self, monster: Monster, gamestate: GameState) -> None:
         if monster["current_age"] >= self.target_age:
-            log.info((f"{monster.print_at_game_state(gamestate)} "
-                      f"died on or after target {self.target_age} units "
-                      "and deals that much damage to all enemies"))
+            if trace.TRACE is not None:
+                trace.TRACE.note("%s died on or after target %d units "
+                                 "and deals that much damage to all enemies",
+                                 trace.snapshot(monster), self.target_age)
             opponent_gamestate = gamestate.invert()
             for enemy in list(gamestate.opponent.monsters):
                 enemy.take_damage(opponent_gamestate, self.target_age)
         else:
-            log.info((f"{monster.print_at_game_state(gamestate)} "
-                      f"died before target {self.target_age} units "
-                      "and heals its age to all allies"))
+            if trace.TRACE is not None:
+                trace.TRACE.note("%s died before target %d units "
+                                 "and heals its age to all allies",
+                                 trace.snapshot(monster), self.target_age)
             for ally in list(gamestate.player.monsters):
                 if ally is not monster:
                     ally.heal(gamestate, monster["current_age"])
         super().on_death(monster, gamestate)
+
+    @classmethod
+    def batch_on_game_start(cls, batch, monsters) -> None:
+        batch.state("current_age")[monsters] = 0
+        super().batch_on_game_start(batch, monsters)
+
+    @classmethod
+    def batch_before_combat(cls, batch, monsters) -> None:
+        batch.state("current_age")[monsters] += 1
+        super().batch_on_game_start(batch, monsters)
+
+    @classmethod
+    def batch_on_death(cls, batch, monsters) -> None:
+        age = batch.state("current_age")[monsters]
+        target_age = batch.param("target_age", monsters)
+        old = age >= target_age
+
+        (enemies, present) = batch.enemies(monsters[old])
+        for (enemy, here) in zip(enemies.T, present.T):
+            batch.take_damage(enemy[here], target_age[old][here])
+
+        young = ~old
+        (allies, present) = batch.allies(monsters[young])
+        for (ally, here) in zip(allies.T, present.T):
+            batch.heal(ally[here], age[young][here])
+        batch.call(super().batch_on_death, monsters)
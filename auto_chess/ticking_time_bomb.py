@@ -4,7 +4,7 @@
 #
 # NOTE: If killed before detonation, then nothing happens (defused)
 
-from auto_chess import Card, Monster, GameState
+from auto_chess import Card, Monster, GameState, trace
 import logging
 
 
@@ -12,6 +12,8 @@ log = logging.getLogger(__name__)
 
 
 class TimeBomb(Card):
+    state_fields = ("current_time",)
+
     def __init__(self, *args, detonation_time: int = 10, **kwargs):
         # Minimum desired tokens to detonate
         self.detonation_time = detonation_time
@@ -29,8 +31,9 @@ class TimeBomb(Card):
     def before_combat(self, monster: Monster, gamestate: GameState) -> None:
         """If enough time has elapsed, explode!"""
         if monster["current_time"] > self.detonation_time:
-            log.info((f"{monster.print_at_game_state(gamestate)} detonates "
-                      f"to kill itself and {gamestate.defender} "))
+            if trace.TRACE is not None:
+                trace.TRACE.note("%s detonates to kill itself and %s ",
+                                 trace.snapshot(monster), str(gamestate.defender))
             self.on_death(monster, gamestate)
             if gamestate.defender is not None:
                 gamestate.defender.on_death(gamestate.invert())
@@ -51,3 +54,27 @@ class TimeBomb(Card):
     def on_game_start(self, monster: Monster, gamestate: GameState) -> None:
         monster["current_time"] = 0  # Begin at no counters
         super().on_game_start(monster, gamestate)
+
+    @classmethod
+    def batch_before_combat(cls, batch, monsters) -> None:
+        """If enough time has elapsed, explode!"""
+        detonating = monsters[batch.state("current_time")[monsters]
+                              > batch.param("detonation_time", monsters)]
+        batch.on_death(detonating)
+        defender = batch.defender(detonating)
+        batch.on_death(defender[defender >= 0])
+
+    @classmethod
+    def batch_take_damage(cls, batch, monsters, damage) -> None:
+        batch.state("current_time")[monsters[damage > 0]] += 1
+        super().batch_take_damage(batch, monsters, damage)
+
+    @classmethod
+    def batch_heal(cls, batch, monsters, health) -> None:
+        batch.state("current_time")[monsters[health > 0]] += 1
+        super().batch_heal(batch, monsters, health)
+
+    @classmethod
+    def batch_on_game_start(cls, batch, monsters) -> None:
+        batch.state("current_time")[monsters] = 0  # Begin at no counters
+        super().batch_on_game_start(batch, monsters)
@@ -0,0 +1,166 @@
+"""A structured trace of the events of auto-chess games.
+
+Logging every event of every game as it happens is ruinously slow,
+even when the log level discards the messages, because their arguments
+(e.g. monster.print_at_game_state(gamestate)) are built regardless.
+Instead, the engine and the cards record compact events into the
+current Trace, if there is one, and otherwise do nothing but check:
+
+    if trace.TRACE is not None:
+        trace.TRACE.record(trace.DAMAGE, trace.snapshot(monster), damage)
+
+An event is a tuple of its code followed by its arguments. The monsters
+in them are Snapshots, which remember the monster's health at the time
+of the event. Cards' own events are NOTEs, which carry a %-style
+template and its arguments, so nothing is formatted until the trace is
+rendered.
+
+To see what happens in a single matchup, replay it:
+
+    for line in trace.replay(p0_deck, p1_deck).render():
+        print(line)
+"""
+
+import contextlib
+import logging
+from typing import Any, Iterator, NamedTuple, Optional, Sequence, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from auto_chess import Card, Monster, Player
+
+
+log = logging.getLogger(__name__)
+
+
+# event codes
+START = 0    # (p0, p1) players as strings
+NEXT = 1     # (player name, monster snapshot) monster leaves the queue to fight
+FIGHT = 2    # (monster snapshot, monster snapshot)
+DAMAGE = 3   # (monster snapshot, damage)
+HEAL = 4     # (monster snapshot, health)
+DEATH = 5    # (player name, monster snapshot)
+ENQUEUE = 6  # (player name, monster snapshot) monster returns to the queue
+BOARD = 7    # (player as a string, monster snapshots) at the end of a turn
+NOTE = 8     # (template, *arguments) anything else, usually from a card
+END = 9      # (payoffs, turns)
+
+
+class Snapshot(NamedTuple):
+    """A monster, as it was at the time of an event."""
+    name: str
+    health: int
+    card: 'Card'
+    state: Optional[dict] = None
+
+    def __str__(self) -> str:
+        return f"<monster {self.name} ({self.health}) : {self.card}>"
+
+
+def snapshot(monster: 'Monster', *, with_state: bool = False) -> Snapshot:
+    return Snapshot(
+        monster._name,
+        monster._remaining_health,
+        monster._card,
+        monster.state() if with_state else None,
+    )
+
+
+def _describe_monster(monster: Snapshot) -> str:
+    """Like str(Monster), i.e. with its state rather than its health."""
+    return f"<monster {monster.name} {monster.state}>"
+
+
+def _describe_player(player: 'Player') -> str:
+    return str(player)
+
+
+_TEMPLATES: dict[int, str] = {
+    START: "Starting game between %s and %s",
+    FIGHT: "%s is fighting %s",
+    DAMAGE: "%s takes %d damage",
+    HEAL: "%s heals %d health",
+    DEATH: "player %s's %s has died",
+    ENQUEUE: "player %s's %s goes to the back of the queue",
+}
+
+
+class Trace:
+    """The events of one or more games, in the order they happened."""
+    def __init__(self) -> None:
+        self.events: list[tuple] = []
+
+    def record(self, code: int, *args: Any) -> None:
+        self.events.append((code, *args))
+
+    def note(self, template: str, *args: Any) -> None:
+        """Record an event which renders as template % args."""
+        self.events.append((NOTE, template, *args))
+
+    def board(self, player: 'Player') -> None:
+        """Record the monsters player controls."""
+        self.events.append((
+            BOARD,
+            _describe_player(player),
+            tuple(map(snapshot, player.monsters)),
+        ))
+
+    def of(self, code: int) -> list[tuple]:
+        """The events with the given code."""
+        return [event for event in self.events if event[0] == code]
+
+    def render(self) -> list[str]:
+        """The human-readable log of the events, one line per element."""
+        lines: list[str] = []
+        for (code, *args) in self.events:
+            if code == NEXT:
+                (player, monster) = args
+                lines.append(f"player {player}'s next monster is "
+                             f"{_describe_monster(monster)}")
+            elif code == BOARD:
+                (player, monsters) = args
+                lines.append(f"{player}:")
+                lines.extend(f"  {monster}" for monster in monsters)
+            elif code == NOTE:
+                (template, *note_args) = args
+                lines.append(template % tuple(note_args))
+            elif code == END:
+                (payoffs, turns) = args
+                lines.append(f"Game over after {turns} turns: {payoffs}")
+            else:
+                lines.append(_TEMPLATES[code] % tuple(args))
+        return lines
+
+    def log(self, logger: logging.Logger = log, level: int = logging.INFO) -> None:
+        """Send the rendered events to logger."""
+        for line in self.render():
+            logger.log(level, "%s", line)
+
+
+# the Trace which events are currently recorded into, or None to
+# record nothing.
+TRACE: Optional[Trace] = None
+
+
+@contextlib.contextmanager
+def tracing(into: Optional[Trace] = None) -> Iterator[Trace]:
+    """Record the events of everything run in the body into a Trace."""
+    global TRACE
+    previous = TRACE
+    TRACE = into if into is not None else Trace()
+    try:
+        yield TRACE
+    finally:
+        TRACE = previous
+
+
+def replay(
+        p0_deck: Sequence['Card'],
+        p1_deck: Sequence['Card'],
+        **game_kwargs: Any,
+) -> Trace:
+    """Play a single game between the decks, and return its Trace."""
+    from auto_chess import _Game
+
+    with tracing() as trace:
+        _Game(p0_deck, p1_deck, **game_kwargs).play()
+    return trace
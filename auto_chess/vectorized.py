@@ -0,0 +1,633 @@
+"""A lockstep batch simulator for auto-chess, on NumPy arrays.
+
+Plain Cards (i.e. instances of auto_chess.Card itself, like the bears,
+tanks and bruisers in the tests) have no hooks: a monster's attack
+never changes, and the only thing which ever happens to it is that it
+takes its opponent's attack as damage. A batch of games between decks
+made only of such cards can therefore be simulated all at once, one
+turn of every game per step, as operations on arrays of shape
+(games, 2, slots):
+
+- atk and hp hold each monster's attack and remaining health,
+- key orders each player's queue: the monster with the lowest key is at
+  the front, and a surviving fighter goes to the back by taking the
+  player's next, highest, key.
+
+That's play_vanilla_batch.
+
+Cards with hooks can take part too, through the batched hooks on Card
+(Card.batch_take_damage and friends), which run a hook for many
+monsters of one class at once. A Batch holds the state of its games as
+flat per-monster arrays, and gives each game a stack of pending hook
+invocations, so that a cascade (e.g. an explosion which kills an enemy
+which explodes in turn) happens in exactly the same order as in the
+object engine. Every step pops one invocation from each game's stack,
+and runs each kind of invocation for all of those games at once.
+That's Batch and play_batch.
+
+Games are dropped from the arrays as soon as they end, and the result
+of every game is the same as that of auto_chess.play_auto_chess.
+"""
+
+import numpy as np
+from typing import Callable, Optional, Sequence
+
+from analysis import GamePayoffs
+from auto_chess import Card, Matchup, P0_WIN, P1_WIN, TIE, _Game, _defining_class
+from auto_chess.closed_form import is_vanilla
+
+# an array of indices into a Batch's per-monster arrays, or of values
+# for each of those monsters
+Indices = np.ndarray
+
+# the hooks which have a batched counterpart on Card, named batch_<hook>
+HOOKS = (
+    "on_game_start",
+    "before_combat",
+    "current_atk",
+    "heal",
+    "take_damage",
+    "on_death",
+)
+
+# outcome codes, as stored in the result array
+_CODES: dict[int, GamePayoffs] = {1: P0_WIN, -1: P1_WIN, 0: TIE}
+
+# the key of a slot which holds no monster, greater than any key a
+# monster could have
+_NO_KEY = np.iinfo(np.int32).max
+
+
+def _board_arrays(
+        matchups: Sequence[Matchup],
+) -> tuple[np.ndarray, np.ndarray]:
+    """Lay the decks of matchups out as (games, 2, slots) atk and hp arrays.
+
+    Slots past the end of a shorter deck hold dead monsters.
+    """
+    slots = max((len(deck) for matchup in matchups for deck in matchup),
+                default=0)
+    atk = np.zeros((len(matchups), 2, slots), dtype=np.int64)
+    hp = np.zeros((len(matchups), 2, slots), dtype=np.int64)
+    for (game, matchup) in enumerate(matchups):
+        for (player, deck) in enumerate(matchup):
+            for (slot, card) in enumerate(deck):
+                if not is_vanilla(card):
+                    raise ValueError(
+                        f"{card} has hooks, so cannot be simulated in lockstep"
+                    )
+                atk[game, player, slot] = card.base_atk
+                hp[game, player, slot] = card.health
+    return (atk, hp)
+
+
+def _outcomes(hp: np.ndarray, atk: np.ndarray) -> np.ndarray:
+    """The outcome code of each game at the start of a turn, as in _Game.maybe_end.
+
+    Games which are not over yet get None's stand-in, 2.
+    """
+    alive = hp > 0
+    has_monsters = alive.any(axis=2)
+    has_atk = (alive & (atk > 0)).any(axis=(1, 2))
+    return np.select(
+        [
+            has_monsters[:, 0] & has_monsters[:, 1] & has_atk,
+            has_monsters[:, 0] & has_monsters[:, 1],
+            has_monsters[:, 0],
+            has_monsters[:, 1],
+        ],
+        [2, 0, 1, -1],
+        default=0,
+    )
+
+
+def play_vanilla_batch(
+        matchups: Sequence[Matchup],
+        *,
+        max_turns: int = 128,
+) -> list[GamePayoffs]:
+    """Run a game for each (p0_deck, p1_deck) in matchups, in lockstep.
+
+    Every card in every deck must be a plain Card. Returns p0's payoffs
+    in the same order as matchups.
+    """
+    if not matchups:
+        return []
+    (atk, hp) = _board_arrays(matchups)
+    n_games = len(matchups)
+    slots = atk.shape[2]
+    key = np.broadcast_to(
+        np.arange(slots, dtype=np.int32),
+        atk.shape,
+    ).copy()
+    next_key = np.full((n_games, 2), slots, dtype=np.int32)
+
+    results = np.zeros(n_games, dtype=np.int8)
+    # the index in matchups of each game still in the arrays
+    games = np.arange(n_games)
+    rows = np.arange(n_games)
+    both = np.arange(2)
+
+    for _ in range(max_turns):
+        outcomes = _outcomes(hp, atk)
+        running = outcomes == 2
+        if not running.all():
+            results[games[~running]] = outcomes[~running]
+            games = games[running]
+            (atk, hp, key, next_key) = (atk[running], hp[running],
+                                        key[running], next_key[running])
+            rows = rows[:len(games)]
+        if len(games) == 0:
+            break
+
+        # pop the front monster of each player
+        front = np.where(hp > 0, key, _NO_KEY).argmin(axis=2)
+        fighter_atk = atk[rows[:, None], both, front]
+        # each fighter takes the other's attack, if it's positive
+        damage = np.maximum(fighter_atk[:, ::-1], 0)
+        hp[rows[:, None], both, front] -= damage
+        # and the survivors go to the back of the queue
+        key[rows[:, None], both, front] = next_key
+        next_key += 1
+    # games still running after max_turns are cut off as ties, which
+    # is what results already holds for them.
+
+    return [_CODES[code] for code in results.tolist()]
+
+
+_BATCHABLE: dict[type, bool] = {}
+
+
+def batchable(card_class: type) -> bool:
+    """Whether every hook card_class overrides has a batched counterpart.
+
+    That is, whether each batch_<hook> is defined by the same class as
+    <hook>, or by a subclass of it.
+    """
+    try:
+        return _BATCHABLE[card_class]
+    except KeyError:
+        _BATCHABLE[card_class] = all(
+            issubclass(
+                _defining_class(card_class, "batch_" + hook),
+                _defining_class(card_class, hook),
+            )
+            for hook in HOOKS
+        )
+        return _BATCHABLE[card_class]
+
+
+# the handlers for invocations of the batched hooks, in Batch._handlers
+_BEFORE_COMBAT = 0
+_TAKE_DAMAGE = 1
+_HEAL = 2
+_ON_DEATH = 3
+
+
+class Batch:
+    """The state of a batch of games, played in lockstep.
+
+    Every game has the same number of slots per player; monster m is
+    slot m % slots of side m // slots, and side s belongs to player
+    s % 2 of game s // 2. Slots past the end of a shorter deck hold no
+    monster, and never join a queue.
+
+    Per monster:
+    - card indexes cards, or is -1 for an empty slot,
+    - hp is the remaining health,
+    - queued is whether the monster is in its player's queue, and key
+      orders the queue, lowest first,
+    - state(name) is a column of the per-card state, which the object
+      engine stores as monster[name].
+
+    Per side, fighter is the monster popped from that side's queue to
+    fight this turn, or -1.
+    """
+    def __init__(self, matchups: Sequence[Matchup]):
+        self.slots = max(
+            (len(deck) for matchup in matchups for deck in matchup),
+            default=0,
+        )
+        n_sides = len(matchups) * 2
+
+        self.cards: list[Card] = []
+        card_ids: dict[int, int] = {}
+        self.card = np.full(n_sides * self.slots, -1, dtype=np.int64)
+        for (game, matchup) in enumerate(matchups):
+            for (player, deck) in enumerate(matchup):
+                for (slot, card) in enumerate(deck):
+                    if id(card) not in card_ids:
+                        card_ids[id(card)] = len(self.cards)
+                        self.cards.append(card)
+                    monster = (game * 2 + player) * self.slots + slot
+                    self.card[monster] = card_ids[id(card)]
+        self.classes: list[type[Card]] = list(dict.fromkeys(map(type, self.cards)))
+        self._class_of = np.array(
+            [self.classes.index(type(card)) for card in self.cards],
+            dtype=np.int64,
+        )
+        # whether each card's batch_on_game_start and
+        # batch_before_combat do anything, since Card's do not
+        (self._starts, self._acts) = (
+            np.array([_defining_class(type(card), hook) is not Card
+                      for card in self.cards] + [False], dtype=bool)
+            for hook in ("batch_on_game_start", "batch_before_combat")
+        )
+        self._params: dict[str, np.ndarray] = {}
+        self._state: dict[str, np.ndarray] = {}
+
+        self.queued = self.card >= 0
+        self.hp = np.zeros(len(self.card), dtype=np.int64)
+        self.hp[self.queued] = self.param("health", np.flatnonzero(self.queued))
+        self.key = np.tile(np.arange(self.slots, dtype=np.int64), n_sides)
+        self.next_key = np.full(n_sides, self.slots, dtype=np.int64)
+        self.fighter = np.full(n_sides, -1, dtype=np.int64)
+
+        # each game's stack of pending invocations: the handler to run,
+        # the monster to run it for, and up to two more arguments.
+        self._stack = np.zeros((len(matchups), 8, 4), dtype=np.int64)
+        self._height = np.zeros(len(matchups), dtype=np.int64)
+        # the invocations scheduled by the handlers currently running
+        self._scheduled: list[tuple[int, Indices, Indices, Indices]] = []
+        self._handlers: list[Callable[[Indices, Indices, Indices], None]] = [
+            lambda monsters, _, __: self._dispatch("batch_before_combat",
+                                                   monsters),
+            lambda monsters, amounts, _: self._dispatch("batch_take_damage",
+                                                        monsters, amounts),
+            lambda monsters, amounts, _: self._dispatch("batch_heal",
+                                                        monsters, amounts),
+            lambda monsters, _, __: self._dispatch("batch_on_death",
+                                                   monsters),
+        ]
+        self._handler_ids: dict[tuple[Callable, int], int] = {}
+
+    def __len__(self) -> int:
+        """The number of games still in the batch."""
+        return len(self._height)
+
+    # reading the batch, for batched hooks:
+    def param(self, name: str, monsters: Indices) -> Indices:
+        """The value of the attribute name of each monster's card."""
+        try:
+            column = self._params[name]
+        except KeyError:
+            column = np.array(
+                [getattr(card, name, 0) for card in self.cards],
+                dtype=np.int64,
+            )
+            self._params[name] = column
+        return column[self.card[monsters]]
+
+    def state(self, name: str) -> np.ndarray:
+        """The column of per-monster state name, for reading and writing."""
+        try:
+            return self._state[name]
+        except KeyError:
+            column = np.zeros(len(self.card), dtype=np.int64)
+            self._state[name] = column
+            return column
+
+    def side(self, monsters: Indices) -> Indices:
+        return monsters // self.slots
+
+    def defender(self, monsters: Indices) -> Indices:
+        """The opposing fighter of each monster's game, or -1 outside of combat."""
+        return self.fighter[self.side(monsters) ^ 1]
+
+    def queue(self, sides: Indices) -> tuple[Indices, Indices]:
+        """The queue of each of sides, front first, as (monsters, present).
+
+        monsters[i] holds every slot of sides[i], in queue order
+        followed by the monsters not in the queue, and present[i] is
+        whether each of them is in the queue.
+        """
+        slots = sides[:, None] * self.slots + np.arange(self.slots)
+        order = np.argsort(
+            np.where(self.queued[slots], self.key[slots], _NO_KEY),
+            axis=1,
+            kind="stable",
+        )
+        monsters = np.take_along_axis(slots, order, axis=1)
+        return (monsters, self.queued[monsters])
+
+    def allies(self, monsters: Indices) -> tuple[Indices, Indices]:
+        """The queue of each monster's player, without the monster itself.
+
+        As (monsters, present), like queue.
+        """
+        (allies, present) = self.queue(self.side(monsters))
+        return (allies, present & (allies != monsters[:, None]))
+
+    def enemies(
+            self,
+            monsters: Indices,
+            *,
+            with_defender: bool = False,
+    ) -> tuple[Indices, Indices]:
+        """The queue of each monster's opponent, as (monsters, present) like queue.
+
+        If with_defender, each queue is preceded by the opposing
+        fighter, when there is one.
+        """
+        (enemies, present) = self.queue(self.side(monsters) ^ 1)
+        if with_defender:
+            defender = self.defender(monsters)
+            enemies = np.column_stack([defender, enemies])
+            present = np.column_stack([defender >= 0, present])
+            # keep whatever is present at the front
+            order = np.argsort(~present, axis=1, kind="stable")
+            enemies = np.take_along_axis(enemies, order, axis=1)
+            present = np.take_along_axis(present, order, axis=1)
+        return (enemies, present)
+
+    @staticmethod
+    def pick(monsters: Indices, columns: Indices) -> Indices:
+        """monsters[i, columns[i]] for each row i of monsters."""
+        return monsters[np.arange(len(monsters)), columns]
+
+    @staticmethod
+    def last(monsters: Indices, present: Indices) -> tuple[Indices, Indices]:
+        """The last present monster of each row, as (monsters, whether any is)."""
+        columns = present.shape[1] - 1 - present[:, ::-1].argmax(axis=1)
+        return (Batch.pick(monsters, columns), present.any(axis=1))
+
+    def slot_mask(self, monsters: Indices, present: Indices) -> Indices:
+        """Pack the present monsters of each row into a bitmask of their slots."""
+        bits = np.where(present, 1 << (monsters % self.slots), 0)
+        return bits.sum(axis=1)
+
+    def unpack_slot_mask(
+            self,
+            monsters: Indices,
+            masks: Indices,
+    ) -> tuple[Indices, Indices]:
+        """The slots of masks, on each monster's side, as (monsters, present).
+
+        They come in queue order, as long as they haven't left the queue.
+        """
+        sides = self.side(monsters)
+        slots = sides[:, None] * self.slots + np.arange(self.slots)
+        present = (masks[:, None] >> np.arange(self.slots)) & 1 == 1
+        order = np.argsort(np.where(present, self.key[slots], _NO_KEY),
+                           axis=1, kind="stable")
+        return (np.take_along_axis(slots, order, axis=1),
+                np.take_along_axis(present, order, axis=1))
+
+    def atk(self, monsters: Indices) -> Indices:
+        """The current attack of each monster, through its card's batch_current_atk."""
+        atks = np.zeros(len(monsters), dtype=np.int64)
+        for (klass, selected) in self._by_class(monsters):
+            atks[selected] = klass.batch_current_atk(self, monsters[selected])
+        return atks
+
+    # scheduling hooks, for batched hooks:
+    def before_combat(self, monsters: Indices) -> None:
+        self._schedule(_BEFORE_COMBAT, monsters)
+
+    def take_damage(self, monsters: Indices, damage: Indices) -> None:
+        self._schedule(_TAKE_DAMAGE, monsters, damage)
+
+    def heal(self, monsters: Indices, health: Indices) -> None:
+        self._schedule(_HEAL, monsters, health)
+
+    def on_death(self, monsters: Indices) -> None:
+        self._schedule(_ON_DEATH, monsters)
+
+    def call(self, fn: Callable, monsters: Indices, *args: Indices) -> None:
+        """Schedule fn(batch, monsters, *args), with up to two args."""
+        key = (fn, len(args))
+        try:
+            handler = self._handler_ids[key]
+        except KeyError:
+            handler = len(self._handlers)
+            self._handler_ids[key] = handler
+            self._handlers.append(
+                lambda monsters, amounts, aux:
+                fn(self, monsters, *(amounts, aux)[:key[1]])
+            )
+        self._schedule(handler, monsters, *args)
+
+    # the base Card's hooks:
+    def base_heal(self, monsters: Indices, health: Indices) -> None:
+        healed = health > 0
+        (monsters, health) = (monsters[healed], health[healed])
+        self.hp[monsters] = np.minimum(self.hp[monsters] + health,
+                                       self.param("health", monsters))
+
+    def base_take_damage(self, monsters: Indices, damage: Indices) -> None:
+        hit = (damage > 0) & (self.hp[monsters] > 0)
+        (monsters, damage) = (monsters[hit], damage[hit])
+        self.hp[monsters] -= damage
+        self.on_death(monsters[self.hp[monsters] <= 0])
+
+    def base_on_death(self, monsters: Indices) -> None:
+        self.hp[monsters] = 0
+        self.queued[monsters] = False
+
+    # running the games:
+    def _by_class(self, monsters: Indices) -> list[tuple[type[Card], Indices]]:
+        """Split monsters up by the class of their cards, as (class, mask)."""
+        classes = self._class_of[self.card[monsters]]
+        if len(self.classes) == 1:
+            return [(self.classes[0], np.ones(len(monsters), dtype=bool))]
+        return [(self.classes[klass], classes == klass)
+                for klass in np.unique(classes)]
+
+    def _dispatch(self, hook: str, monsters: Indices, *args: Indices) -> None:
+        for (klass, selected) in self._by_class(monsters):
+            getattr(klass, hook)(
+                self,
+                monsters[selected],
+                *(arg[selected] for arg in args),
+            )
+
+    def _schedule(
+            self,
+            handler: int,
+            monsters: Indices,
+            amounts: Optional[Indices] = None,
+            aux: Optional[Indices] = None,
+    ) -> None:
+        if len(monsters) == 0:
+            return
+        zeros = np.zeros(len(monsters), dtype=np.int64)
+        self._scheduled.append((
+            handler,
+            monsters,
+            zeros if amounts is None else amounts,
+            zeros if aux is None else aux,
+        ))
+
+    def _push_scheduled(self) -> None:
+        """Push everything scheduled onto the stacks, so it pops in order."""
+        if not self._scheduled:
+            return
+        records = np.concatenate([
+            np.column_stack([np.full(len(monsters), handler),
+                             monsters, amounts, aux])
+            for (handler, monsters, amounts, aux) in self._scheduled
+        ])
+        self._scheduled = []
+        games = records[:, 1] // (2 * self.slots)
+        order = np.argsort(games, kind="stable")
+        (records, games) = (records[order], games[order])
+
+        # each game's records were scheduled by a single handler, in
+        # order; the first must end up on top of its stack.
+        starts = np.flatnonzero(np.r_[True, games[1:] != games[:-1]])
+        counts = np.diff(np.r_[starts, len(games)])
+        rank = np.arange(len(games)) - np.repeat(starts, counts)
+        position = self._height[games] + np.repeat(counts, counts) - 1 - rank
+
+        depth = self._stack.shape[1]
+        if position.max() >= depth:
+            grown = np.zeros(
+                (len(self), max(depth * 2, position.max() + 1), 4),
+                dtype=np.int64,
+            )
+            grown[:, :depth] = self._stack
+            self._stack = grown
+        self._stack[games, position] = records
+        self._height[games[starts]] += counts
+
+    def _run(self) -> None:
+        """Run invocations until every game's stack is empty."""
+        self._push_scheduled()
+        while True:
+            games = np.flatnonzero(self._height)
+            if len(games) == 0:
+                return
+            self._height[games] -= 1
+            records = self._stack[games, self._height[games]]
+            handlers = records[:, 0]
+            for handler in np.unique(handlers):
+                selected = handlers == handler
+                (_, monsters, amounts, aux) = records[selected].T
+                self._handlers[handler](monsters, amounts, aux)
+            self._push_scheduled()
+
+    def _fight(self, p0_fighters: Indices) -> None:
+        p1_fighters = self.fighter[self.side(p0_fighters) + 1]
+        # before_combat may have killed one or both monsters
+        alive = (self.hp[p0_fighters] > 0) & (self.hp[p1_fighters] > 0)
+        (p0_fighters, p1_fighters) = (p0_fighters[alive], p1_fighters[alive])
+        # read these in parallel before writing anything, in case
+        # taking damage changes them
+        (p0_atk, p1_atk) = (self.atk(p0_fighters), self.atk(p1_fighters))
+        self.take_damage(p0_fighters, p1_atk)
+        self.take_damage(p1_fighters, p0_atk)
+
+    def _start(self) -> None:
+        self._dispatch("batch_on_game_start",
+                       np.flatnonzero(self._starts[self.card]))
+        self._run()
+
+    def _outcomes(self) -> Indices:
+        """The outcome code of each game at the start of a turn, as in _Game.maybe_end.
+
+        Games which are not over yet get None's stand-in, 2.
+        """
+        has_monsters = self.queued.reshape(len(self), 2, self.slots).any(axis=2)
+        queued = np.flatnonzero(self.queued)
+        has_atk = np.zeros(len(self), dtype=bool)
+        has_atk[queued[self.atk(queued) > 0] // (2 * self.slots)] = True
+        return np.select(
+            [
+                has_monsters[:, 0] & has_monsters[:, 1] & has_atk,
+                has_monsters[:, 0] & has_monsters[:, 1],
+                has_monsters[:, 0],
+                has_monsters[:, 1],
+            ],
+            [2, 0, 1, -1],
+            default=0,
+        )
+
+    def _turn(self) -> None:
+        sides = np.arange(len(self) * 2)
+        # pop the front monster of each player
+        (queues, _) = self.queue(sides)
+        self.fighter = queues[:, 0]
+        self.queued[self.fighter] = False
+
+        p0_fighters = self.fighter[0::2]
+        for fighters in (p0_fighters, self.fighter[1::2]):
+            self.before_combat(fighters[self._acts[self.card[fighters]]])
+        self.call(Batch._fight, p0_fighters)
+        self._run()
+
+        # the survivors go to the back of the queue
+        alive = self.hp[self.fighter] > 0
+        self.key[self.fighter[alive]] = self.next_key[alive]
+        self.next_key[alive] += 1
+        self.queued[self.fighter[alive]] = True
+        self.fighter[:] = -1
+
+    def _keep(self, games: Indices) -> None:
+        """Drop every game but those where games is True."""
+        monsters = np.repeat(games, 2 * self.slots)
+        sides = np.repeat(games, 2)
+        self.card = self.card[monsters]
+        self.hp = self.hp[monsters]
+        self.queued = self.queued[monsters]
+        self.key = self.key[monsters]
+        for (name, column) in self._state.items():
+            self._state[name] = column[monsters]
+        self.next_key = self.next_key[sides]
+        self.fighter = self.fighter[sides]
+        self._stack = self._stack[games]
+        self._height = self._height[games]
+
+    def play(self, *, max_turns: int = 128) -> list[GamePayoffs]:
+        """Play out every game of the batch, and return p0's payoffs."""
+        results = np.zeros(len(self), dtype=np.int8)
+        # the index in the original batch of each game still in it
+        games = np.arange(len(self))
+        self._start()
+        for _ in range(max_turns):
+            outcomes = self._outcomes()
+            running = outcomes == 2
+            if not running.all():
+                results[games[~running]] = outcomes[~running]
+                games = games[running]
+                self._keep(running)
+            if len(games) == 0:
+                break
+            self._turn()
+        # games still running after max_turns are cut off as ties,
+        # which is what results already holds for them.
+        return [_CODES[code] for code in results.tolist()]
+
+
+def play_batch(
+        matchups: Sequence[Matchup],
+        *,
+        max_turns: int = 128,
+) -> list[GamePayoffs]:
+    """Run a game for each (p0_deck, p1_deck) in matchups.
+
+    Games between plain Cards are played by play_vanilla_batch, and
+    those between cards whose classes are all batchable are played in
+    lockstep by a Batch. The rest fall back to the object engine.
+    Returns p0's payoffs in the same order as matchups.
+    """
+    results: list[Optional[GamePayoffs]] = [None] * len(matchups)
+    vanilla: list[int] = []
+    lockstep: list[int] = []
+    for (i, (p0_deck, p1_deck)) in enumerate(matchups):
+        cards = (*p0_deck, *p1_deck)
+        if all(map(is_vanilla, cards)):
+            vanilla.append(i)
+        elif all(batchable(type(card)) for card in cards):
+            lockstep.append(i)
+        else:
+            results[i] = _Game(p0_deck, p1_deck, max_turns=max_turns).play()
+
+    for (indices, play) in (
+            (vanilla, play_vanilla_batch),
+            (lockstep, lambda batch, max_turns:
+             Batch(batch).play(max_turns=max_turns)),
+    ):
+        played = play([matchups[i] for i in indices], max_turns=max_turns)
+        for (i, payoffs) in zip(indices, played):
+            results[i] = payoffs
+    return results  # type: ignore[return-value]
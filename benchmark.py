@@ -0,0 +1,274 @@
+"""Games per second of play_auto_chess on representative pools.
+
+Each case plays a fixed random sample of matchups between decks of one
+size from one pool, either cold, with every cache emptied before each
+game, or warm, after playing the same matchups once already. Run
+
+    python benchmark.py --save benchmark_baseline.json
+
+to record a baseline, and after changing the engine,
+
+    python benchmark.py --compare benchmark_baseline.json
+
+to flag the cases which got more than --tolerance slower; it exits with
+status 1 if any did. The time a new interpreter takes to import
+auto_chess and analysis is recorded and compared too, as the "import"
+case. Baselines are only comparable on the machine which recorded
+them.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from typing import Callable, NamedTuple, Optional, Sequence
+
+import auto_chess as ac
+import auto_chess.closed_form
+import run_tournament as tourney
+
+
+log = logging.getLogger(__name__)
+
+
+def _build_cards() -> list[ac.Card]:
+    import analysis.simulated_annealing as sa
+    # the parameters of plot.py's "Cards A"
+    return sa.build_cards(1, 3, 4, 3, 3, 1, 7, 8, 5, 7)
+
+
+POOLS: dict[str, Callable[[], list[ac.Card]]] = {
+    "simple": lambda: tourney.SIMPLE_CARDS,
+    "all": lambda: tourney.ALL_CARDS,
+    "build_cards": _build_cards,
+}
+DECK_SIZES = (1, 3, 5)
+CACHES = ("cold", "warm")
+
+
+class Case(NamedTuple):
+    pool: str
+    deck_size: int
+    cache: str
+
+    @property
+    def name(self) -> str:
+        return f"{self.pool}/{self.deck_size}/{self.cache}"
+
+
+def all_cases() -> list[Case]:
+    return [Case(pool, deck_size, cache)
+            for pool in POOLS for deck_size in DECK_SIZES for cache in CACHES]
+
+
+def _matchups(
+        cards: Sequence[ac.Card],
+        deck_size: int,
+        games: int,
+        seed: int,
+) -> list[ac.Matchup]:
+    rng = random.Random(seed)
+    return [(rng.choices(cards, k=deck_size), rng.choices(cards, k=deck_size))
+            for _ in range(games)]
+
+
+def _clear_caches() -> None:
+    """Empty every cache of results a game can be answered from, and
+    the arrays engine's idle boards. The disk cache is bypassed rather
+    than emptied, by run_case."""
+    ac.GAME_CACHE.clear()
+    auto_chess.closed_form.DUELS.clear()
+    if ac.TRANSPOSITIONS is not None:
+        ac.TRANSPOSITIONS.clear()
+    if "auto_chess.arrays" in sys.modules:
+        sys.modules["auto_chess.arrays"]._IDLE_BOARDS.clear()
+
+
+def _rate(play: Callable[[], None], games: int, min_time: float) -> float:
+    """Games per second of play, which plays games games, called until
+    min_time has passed."""
+    played = 0
+    start = time.perf_counter()
+    while True:
+        play()
+        played += games
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return played / elapsed
+
+
+def run_case(
+        case: Case,
+        *,
+        games: int = 2000,
+        repeat: int = 3,
+        min_time: float = 0.2,
+        seed: int = 0,
+) -> float:
+    """The best games per second of repeat runs of case, each of at
+    least min_time seconds."""
+    matchups = _matchups(POOLS[case.pool](), case.deck_size, games, seed)
+
+    def play_cold() -> None:
+        for (p0_deck, p1_deck) in matchups:
+            _clear_caches()
+            ac.play_auto_chess(p0_deck, p1_deck)
+
+    def play_warm() -> None:
+        for (p0_deck, p1_deck) in matchups:
+            ac.play_auto_chess(p0_deck, p1_deck)
+
+    # the disk cache would make every run after the first warm
+    disk_cache, ac.DISK_CACHE = ac.DISK_CACHE, None
+    best = 0.0
+    try:
+        for _ in range(repeat):
+            _clear_caches()
+            if case.cache == "warm":
+                play_warm()
+                best = max(best, _rate(play_warm, games, min_time))
+            else:
+                best = max(best, _rate(play_cold, games, min_time))
+    finally:
+        ac.DISK_CACHE = disk_cache
+        _clear_caches()
+    return best
+
+
+IMPORT_CASE = "import"
+_IMPORT_SCRIPT = ("import time; start = time.perf_counter(); "
+                  "import auto_chess, analysis; "
+                  "print(time.perf_counter() - start)")
+
+
+def import_seconds(*, repeat: int = 3) -> float:
+    """The best time of repeat cold imports of auto_chess and analysis,
+    each in a new interpreter."""
+    return min(
+        float(subprocess.run([sys.executable, "-c", _IMPORT_SCRIPT],
+                             capture_output=True, text=True, check=True,
+                             cwd=os.path.dirname(os.path.abspath(__file__))).stdout)
+        for _ in range(repeat))
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(
+        cases: Sequence[Case],
+        *,
+        games: int = 2000,
+        repeat: int = 3,
+        min_time: float = 0.2,
+) -> dict:
+    """The results of cases, as stored in a baseline file."""
+    results = {}
+    for case in cases:
+        results[case.name] = run_case(case, games=games, repeat=repeat,
+                                      min_time=min_time)
+        log.info("%-20s %10.0f games/s", case.name, results[case.name])
+    seconds = import_seconds(repeat=repeat)
+    log.info("%-20s %10.1f ms", IMPORT_CASE, seconds * 1000)
+    return {
+        "commit": _commit(),
+        "python": platform.python_version(),
+        "machine": platform.node(),
+        "games": games,
+        "games_per_second": results,
+        "import_seconds": seconds,
+    }
+
+
+class Regression(NamedTuple):
+    case: str
+    baseline: float
+    current: float
+
+    @property
+    def change(self) -> float:
+        return self.current / self.baseline - 1
+
+
+def compare(
+        baseline: dict,
+        current: dict,
+        *,
+        tolerance: float = 0.2,
+) -> list[Regression]:
+    """The cases which are more than tolerance slower than in baseline.
+    For the import case, baseline and current are seconds rather than
+    games per second."""
+    regressions = []
+    for (case, rate) in current["games_per_second"].items():
+        before = baseline["games_per_second"].get(case)
+        if before is not None and rate < before * (1 - tolerance):
+            regressions.append(Regression(case, before, rate))
+    before = baseline.get("import_seconds")
+    seconds = current.get("import_seconds")
+    if (before is not None and seconds is not None
+            and seconds > before * (1 + tolerance)):
+        regressions.append(Regression(IMPORT_CASE, before, seconds))
+    return regressions
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--save", metavar="PATH", help="write the results to PATH")
+    parser.add_argument("--compare", metavar="PATH",
+                        help="flag regressions against the baseline at PATH")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="the slowdown to tolerate, as a fraction (default 0.2)")
+    parser.add_argument("--games", type=int, default=2000)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--min-time", type=float, default=0.2,
+                        help="the least seconds to time each repetition for")
+    parser.add_argument("--cases", nargs="*", metavar="POOL/SIZE/CACHE",
+                        help="run only these cases")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    log.setLevel(logging.INFO)
+    cases = [case for case in all_cases()
+             if not args.cases or case.name in args.cases]
+    current = run(cases, games=args.games, repeat=args.repeat,
+                  min_time=args.min_time)
+    if args.save:
+        with open(args.save, "w") as out:
+            json.dump(current, out, indent=2)
+    if not args.compare:
+        return 0
+    with open(args.compare) as saved:
+        baseline = json.load(saved)
+    if baseline.get("machine") != current["machine"]:
+        log.warning("the baseline was recorded on %s, not here",
+                    baseline.get("machine"))
+    regressions = compare(baseline, current, tolerance=args.tolerance)
+    for regression in regressions:
+        if regression.case == IMPORT_CASE:
+            log.error("%-20s %10.1f -> %10.1f ms (%+.0f%%)", regression.case,
+                      regression.baseline * 1000, regression.current * 1000,
+                      100 * regression.change)
+        else:
+            log.error("%-20s %10.0f -> %10.0f games/s (%+.0f%%)", regression.case,
+                      regression.baseline, regression.current,
+                      100 * regression.change)
+    if regressions:
+        return 1
+    log.info("no regressions against %s (commit %s)",
+             args.compare, baseline.get("commit"))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
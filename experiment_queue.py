@@ -3,6 +3,7 @@ import analysis.metrics as metrics
 import logging
 import pickle
 import auto_chess as ac
+import auto_chess.persistent
 from typing import Callable, Dict, Iterable
 from analysis import DeckResults
 
@@ -12,6 +13,9 @@ log = logging.getLogger(__name__)
 
 GROUP_SIZE = 4 # 256
 
+# games already played by earlier runs, and by the other experiments
+MATCHUP_CACHE = "matchups.sqlite"
+
 def tt_sd(results: Iterable[DeckResults],
         *,
         key: Callable[[float], float] = lambda n: n,
@@ -132,6 +136,7 @@ if __name__ == "__main__":
     logging.basicConfig(level=logging.WARNING)
     log.setLevel(logging.INFO)
     sa.log.setLevel(logging.INFO)
+    ac.persistent.enable(MATCHUP_CACHE)
     for (experiment, name) in EXPERIMENTS:
         log.info("running experiment %s\n\n", name)
         outfile = f"{name}.txt"
@@ -36,7 +36,7 @@ def compare_sampling(cards: list[ac.Card], deck_size=3) -> None:
             )
             start_time = time.time()
             data = sampling.group_tournament(
-                ac.play_auto_chess,
+                ac.payoff_fn,
                 decks,
                 group_size=group_size,
             )
@@ -50,7 +50,7 @@ def compare_sampling(cards: list[ac.Card], deck_size=3) -> None:
             )
 
     real_results = analysis.round_robin(
-        ac.play_auto_chess,
+        ac.payoff_fn,
         decks,
         multiprocess=True,
     )
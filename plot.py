@@ -26,13 +26,13 @@ def run_group(cards, group_size=None):
     decks = ac.possible_decks(3, cards)
     if group_size != None:
         return list(sampling.group_tournament(
-            ac.play_auto_chess,
+            ac.payoff_fn,
             decks,
             group_size=group_size
         ))
     else:
         return list(sampling.round_robin(
-                    ac.play_auto_chess,
+                    ac.payoff_fn,
                     decks,
                     multiprocess=True
                 ))
@@ -1,4 +1,5 @@
 import auto_chess as ac
+from auto_chess import profiling
 import analysis
 import analysis.sampling as sampling
 import analysis.metrics as metrics
@@ -19,6 +20,7 @@ from auto_chess.ticking_time_bomb import TimeBomb
 from typing import Iterable, List
 import math
 import logging
+import sys
 
 log = logging.getLogger(__name__)
 
@@ -85,7 +87,7 @@ def run_tourney(cards: List[ac.Card], deck_size=3, stages_before_finals=1024) ->
     #     multiprocess=True,
     # )
     return sampling.group_tournament(
-        ac.play_auto_chess,
+        ac.payoff_fn,
         list(decks),
         group_size = 64,
     )
@@ -96,7 +98,13 @@ if __name__ == "__main__":
     log.setLevel(logging.INFO)
     analysis.log.setLevel(logging.INFO)
     sampling.log.setLevel(logging.INFO)
-    res = list(run_tourney(ALL_CARDS))
+    if "--profile" in sys.argv:
+        # which cards' hooks the tournament spent its time in
+        with profiling.profiling(processes=True) as profile:
+            res = list(run_tourney(ALL_CARDS))
+        profile.log(log)
+    else:
+        res = list(run_tourney(ALL_CARDS))
     for (name, metric) in METRICS:
         log.info("metric %s = %f", name, metric(res))
 
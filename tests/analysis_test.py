@@ -3,6 +3,9 @@ from analysis.simulated_annealing import genetic_optimize
 from analysis.simulated_annealing import build_cards
 # from analysis.metrics import average_payoff_metric
 from analysis.metrics import std_dev_metric
+import analysis
+import auto_chess as ac
+import pytest
 
 
 # def test_simulated_annealing():
@@ -12,4 +15,147 @@ from analysis.metrics import std_dev_metric
 
 def test_genetic_alg():
     sol = genetic_optimize(std_dev_metric, 4, 10, build_cards)
-    assert sol.all()
\ No newline at end of file
+    assert sol.all()
+
+
+def small_decks() -> list:
+    # every two-card deck of ten 2/2 cards: enough games to fill
+    # several batches, few enough to play in a moment
+    return ac.possible_decks(2, build_cards(*[2] * 10))
+
+
+def test_batched_payoff_fn():
+    decks = small_decks()
+    calls = []
+
+    def many(pairs):
+        calls.append(len(pairs))
+        return ac.play_many(pairs)
+    flushes = []
+    batched = analysis.BatchedPayoffFn(ac.play_auto_chess, many,
+                                       flush=lambda: flushes.append(len(calls)))
+    assert list(analysis.round_robin(batched, decks)) == \
+        list(analysis.round_robin(ac.play_auto_chess, decks))
+    assert sum(calls) == len(decks) * (len(decks) + 1) // 2
+    assert max(calls) == analysis.BATCH_SIZE
+    # once after each chunk
+    assert flushes == list(range(1, len(calls) + 1))
+
+
+def test_multiprocess_round_robin():
+    decks = small_decks()
+    expected = [r.avg_payoff for r in analysis.round_robin(ac.play_auto_chess, decks)]
+    for payoff_fn in (ac.payoff_fn, ac.play_auto_chess):
+        results = analysis.round_robin(payoff_fn, decks, multiprocess=True)
+        assert [r.avg_payoff for r in results] == expected
+
+    def fragile(deck_0, deck_1):
+        if deck_0 is decks[1] and deck_1 is decks[0]:
+            raise RuntimeError("broken")
+        return ac.play_auto_chess(deck_0, deck_1)
+    # the failed game costs both decks; the rest are played as usual
+    results = list(analysis.round_robin(
+        analysis.BatchedPayoffFn(fragile, lambda pairs: [fragile(*p) for p in pairs]),
+        decks, multiprocess=True))
+    assert results[0].avg_payoff < expected[0] and results[1].avg_payoff < expected[1]
+    assert [r.avg_payoff for r in results[2:]] == expected[2:]
+
+    assert analysis._chunk_size(1e-3, 10_000, 2) == 100
+    assert analysis._chunk_size(1e-6, 10_000, 2) == 1250
+    assert analysis._chunk_size(1.0, 10_000, 2) == 1
+
+
+def test_worker_pool():
+    import os
+    from analysis.sampling import group_tournament
+
+    decks = small_decks()
+    expected = [r.avg_payoff for r in analysis.round_robin(ac.payoff_fn, decks)]
+    with analysis.WorkerPool(2) as pool:
+        workers = set(pool.uimap(lambda _: os.getpid(), range(16)))
+        assert os.getpid() not in workers
+        for _ in range(2):
+            results = analysis.round_robin(ac.payoff_fn, decks, pool=pool)
+            assert [r.avg_payoff for r in results] == expected
+        results = group_tournament(ac.payoff_fn, decks, group_size=4, pool=pool)
+        assert sorted(map(str, (r.deck for r in results))) == sorted(map(str, decks))
+        # the same workers, still running
+        assert set(pool.uimap(lambda _: os.getpid(), range(16))) <= workers
+        # which don't keep a finished tournament's shared matrix mapped
+        analysis.round_robin(ac.payoff_fn, decks, pool=pool, shared_matrix=True)
+        if os.path.exists("/proc/self/maps"):
+            assert not any(pool.uimap(_maps_tournament_file, range(16)))
+
+
+def _maps_tournament_file(_) -> bool:
+    with open("/proc/self/maps") as maps:
+        return any("ludus-tournament" in line for line in maps)
+
+
+def test_shared_matrix(tmp_path):
+    from analysis.packed import PackedMatrix
+
+    decks = small_decks()
+    expected = [r.avg_payoff for r in analysis.round_robin(
+        ac.payoff_fn, decks, matrix_path=str(tmp_path / "expected.npy"))]
+    for packed in (False, True):
+        results = analysis.round_robin(ac.payoff_fn, decks, multiprocess=True,
+                                       shared_matrix=True, packed=packed)
+        assert [r.avg_payoff for r in results] == pytest.approx(expected)
+    analysis.round_robin(ac.payoff_fn, decks, multiprocess=True, shared_matrix=True,
+                         matrix_path=str(tmp_path / "shared.npy"))
+    assert (PackedMatrix.open(str(tmp_path / "shared.npy")).entries
+            == PackedMatrix.open(str(tmp_path / "expected.npy")).entries).all()
+
+
+def test_packed_matrix(tmp_path):
+    import numpy as np
+    from analysis.packed import ERROR, PackedMatrix
+
+    decks = small_decks()
+    path = str(tmp_path / "payoffs.npy")
+    results = list(analysis.round_robin(ac.payoff_fn, decks, matrix_path=path))
+    matrix = PackedMatrix.open(path)
+    assert matrix.n_decks == len(decks)
+    assert len(matrix.entries) == len(decks) * (len(decks) - 1) // 2
+    # each pair plays once, the later deck first
+    dense = np.zeros((len(decks), len(decks)))
+    for i in range(len(decks)):
+        for j in range(i):
+            dense[i, j] = ac.play_auto_chess(decks[i], decks[j]).p0_payoff
+            dense[j, i] = -dense[i, j]
+    assert (matrix.to_dense() == dense).all()
+    assert (matrix.column(3) == dense[:, 3]).all() and matrix[2, 7] == dense[2, 7]
+    assert [r.avg_payoff for r in results] == pytest.approx(dense.mean(axis=1))
+
+    # a game which raised costs both decks
+    matrix = PackedMatrix.zeros(3)
+    matrix.record(np.array([1, 2, 2]), np.array([0, 0, 1]),
+                  np.array([1, -1, 0]), np.array([-1, -1, 0]))
+    assert matrix.entries.tolist() == [1, ERROR, 0]
+    assert matrix.to_dense().tolist() == [[0, -1, -1], [1, 0, 0], [-1, 0, 0]]
+    assert matrix.row_means().tolist() == pytest.approx([-2 / 3, 1 / 3, -1 / 3])
+    with pytest.raises(ValueError):
+        matrix.record(np.array([1]), np.array([0]), np.array([0.5]), np.array([-0.5]))
+
+
+def test_streaming():
+    from analysis.streaming import RunningMeans
+
+    decks = small_decks()
+    expected = [r.avg_payoff for r in analysis.round_robin(ac.payoff_fn, decks)]
+    means = RunningMeans(len(decks), sample_size=20, seed=0)
+    results = analysis.round_robin(ac.payoff_fn, decks, streaming=means)
+    assert [r.avg_payoff for r in results] == pytest.approx(expected)
+    assert means.games == len(decks) * (len(decks) + 1) // 2
+    assert (means.counts == len(decks)).all()
+    sample = means.sample()
+    assert len(sample) == 20 and len(set((i, j) for (i, j, _) in sample)) == 20
+    for (i, j, payoffs) in sample:
+        assert j <= i
+        if i != j:
+            assert payoffs == ac.play_auto_chess(decks[i], decks[j])
+
+    with pytest.raises(ValueError):
+        analysis.round_robin(ac.payoff_fn, decks, streaming=RunningMeans(len(decks)),
+                             packed=True)
@@ -84,3 +84,629 @@ def test_negative_heal():
 def test_grows_on_attack():
     bezerker = GrowOnDamage(0, 7, "bezerker", atk_per_hit=2)
     assert ac.play_auto_chess([bezerker], [BEAR, BEAR]) == ac.P0_WIN
+
+
+def all_special_cards():
+    from auto_chess.friendly_vampire import FriendlyVampire
+    from auto_chess.healthdonor import HealthDonor
+    from auto_chess.morph_enemies import MorphOpponents
+    from auto_chess.painsplitter import PainSplitter
+    from auto_chess.rampage import RampAge
+    from auto_chess.survivalist import Survivalist
+    from auto_chess.threshold import ThreshOld
+    from auto_chess.ticking_time_bomb import TimeBomb
+    return [
+        BEAR, TANK, BRUISER,
+        ExplodeOnDeath(2, 1, "volatile", explode_damage=1),
+        FriendlyVampire(1, 3, "friendly vampire", heal_amount=1),
+        GrowOnDamage(0, 5, "bezerker", atk_per_hit=1),
+        HealOnDeath(1, 2, "suicidal cleric", explode_heal=1),
+        HealthDonor(1, 4, "good friend", heal_percent=50),
+        IgnoreFirstDamage(2, 1, "armor", armor_points=1),
+        MorphOpponents(0, 3, "morph ball"),
+        PainSplitter(2, 2, "bad friend", dmg_percent=50),
+        RampAge(0, 4, "old fogey", middle_age=4),
+        Survivalist(2, 2, "coward"),
+        ThreshOld(2, 2, "curmudgeon", target_age=4),
+        TimeBomb(1, 8, "time bomb", detonation_time=10),
+    ]
+
+
+def sample_matchups(count, deck_size=3, seed=0):
+    import random
+    rng = random.Random(seed)
+    cards = all_special_cards()
+    return [
+        (rng.choices(cards, k=deck_size), rng.choices(cards, k=deck_size))
+        for _ in range(count)
+    ]
+
+
+def test_array_engine_matches_object_engine():
+    from auto_chess.arrays import _ArrayGame
+    for (deck_0, deck_1) in sample_matchups(500):
+        assert ac._Game(deck_0, deck_1).play() == _ArrayGame(deck_0, deck_1).play()
+
+
+def test_array_engine_reuses_boards():
+    from auto_chess import arrays
+    deck = (BEAR, TANK, BRUISER)
+    key = ac.REGISTRY.pack(deck)
+    assert arrays._ArrayGame(deck, deck).play() == ac.TIE
+    boards = list(arrays._IDLE_BOARDS[key])
+    assert len(boards) == 2
+    assert arrays._ArrayGame(deck, [BRUISER]).play() == ac.P0_WIN
+    assert boards[-1] in arrays._IDLE_BOARDS[key]
+    boards[-1].reset()
+    assert boards[-1].health == [card.health for card in deck]
+
+
+def test_array_engine_tells_card_classes_apart():
+    from auto_chess.arrays import _ArrayGame
+    from auto_chess.morph_enemies import MorphOpponents
+    # equal as Cards, but only one of them morphs the bear
+    (plain, morph) = (ac.Card(0, 3, "m"), MorphOpponents(0, 3, "m"))
+    for deck in ([plain], [morph], [plain, morph], [morph, plain]):
+        assert _ArrayGame(deck, [BEAR]).play() == ac._Game(deck, [BEAR]).play()
+    assert ac._Game([morph], [BEAR]).play() != ac._Game([plain], [BEAR]).play()
+
+
+def test_vanilla_batch_matches_play_auto_chess():
+    import random
+    from auto_chess.vectorized import play_vanilla_batch
+    rng = random.Random(0)
+    cards = [ac.Card(rng.randint(-1, 4), rng.randint(1, 6), f"vanilla {i}")
+             for i in range(8)]
+    matchups = [
+        (rng.choices(cards, k=rng.randint(1, 4)),
+         rng.choices(cards, k=rng.randint(1, 4)))
+        for _ in range(1000)
+    ]
+    assert play_vanilla_batch(matchups) == [
+        ac._Game(deck_0, deck_1).play() for (deck_0, deck_1) in matchups
+    ]
+
+
+def test_vanilla_batch_rejects_hooks():
+    from auto_chess.vectorized import play_vanilla_batch
+    bomb = ExplodeOnDeath(1, 1, "bomb", explode_damage=1)
+    with pytest.raises(ValueError):
+        play_vanilla_batch([([BEAR], [bomb])])
+
+
+class Thorns(ac.Card):
+    """Deals its attack back to whoever damages it, with no batched hooks."""
+    def take_damage(self, monster, gamestate, damage):
+        if gamestate.defender is not None:
+            gamestate.defender.take_damage(gamestate.invert(), self.base_atk)
+        super().take_damage(monster, gamestate, damage)
+
+
+def test_batchable():
+    from auto_chess.vectorized import batchable
+    for card in all_special_cards():
+        assert batchable(type(card))
+    assert not batchable(Thorns)
+
+
+def test_batch_matches_object_engine():
+    from auto_chess.vectorized import play_batch
+    thorns = Thorns(1, 3, "thorns")
+    matchups = sample_matchups(2000, deck_size=4) + [
+        ([thorns, BEAR], [BRUISER, TANK]),
+        ([BEAR, BEAR], [TANK]),
+    ]
+    assert play_batch(matchups) == [
+        ac._Game(deck_0, deck_1).play() for (deck_0, deck_1) in matchups
+    ]
+
+
+def test_trace_replay():
+    bomb = ExplodeOnDeath(1, 1, "bomb", explode_damage=1)
+    trace = ac.trace.replay([bomb, TANK], [BEAR])
+    deaths = trace.of(ac.trace.DEATH)
+    assert [(player, monster.card) for (_, player, monster) in deaths] \
+        == [("zero", bomb), ("one", BEAR)]
+    assert trace.events[-1] == (ac.trace.END, ac.P0_WIN, 1)
+    lines = trace.render()
+    assert lines[0].startswith("Starting game between <player zero")
+    assert any(line.endswith("explodes for 1 damage") for line in lines)
+    assert any("takes 2 damage" in line for line in lines)
+
+
+def test_trace_off_by_default():
+    assert ac.trace.TRACE is None
+    with ac.trace.tracing() as trace:
+        ac.play_auto_chess([BRUISER, TANK], [BEAR, BEAR])
+        ac.play_auto_chess([TANK], [BEAR])
+    assert ac.trace.TRACE is None
+    assert trace.of(ac.trace.START) and trace.of(ac.trace.FIGHT)
+    ac.play_auto_chess([BRUISER], [BEAR])
+    assert len(trace.of(ac.trace.START)) == 2
+
+
+def test_has_atk_follows_atk_changes():
+    grower = GrowOnDamage(0, 5, "grower", atk_per_hit=1)
+    player = ac.Player([grower, ac.Card(0, 1, "zeroatk")])
+    gamestate = ac.GameState(player, ac.Player([]), None, None)
+    player._on_game_start(gamestate)
+    assert not player.has_atk(gamestate)
+    monster = player._next_monster()
+    player._enqueue_monster(monster)
+    assert not player.has_atk(gamestate)
+    monster.take_damage(gamestate, 1)
+    assert player.has_atk(gamestate)
+    monster.take_damage(gamestate, 4)
+    assert len(player.monsters) == 1
+    assert not player.has_atk(gamestate)
+
+
+def test_has_atk_follows_health_changes():
+    class Wounded(ac.Card):
+        def current_atk(self, monster, gamestate):
+            return self.health - monster._remaining_health
+    # the wounded monster has no atk until the bomb damages it
+    bomb = ExplodeOnDeath(0, 1, "bomb", explode_damage=3)
+    (deck_0, deck_1) = ([bomb, ac.Card(0, 20, "wall")],
+                        [ac.Card(1, 1, "cub"), Wounded(0, 5, "wounded")])
+    assert ac._Game(deck_0, deck_1).play() == ac.P1_WIN
+
+
+def test_repeated_board_ends_game():
+    from auto_chess.friendly_vampire import FriendlyVampire
+    vampire = FriendlyVampire(0, 3, "vampire", heal_amount=1)
+    wall = ac.Card(1, 10, "wall")
+    trace = ac.trace.replay([vampire, vampire], [wall])
+    (_, payoffs, turns) = trace.events[-1]
+    assert payoffs == ac.TIE
+    assert turns < 16
+    assert ac.trace.replay([vampire, vampire], [wall], quiet_turns=128) \
+        .events[-1] == (ac.trace.END, ac.TIE, 128)
+    assert ac.play_auto_chess([vampire, vampire], [wall]) == ac.TIE
+
+
+def test_hooks_table():
+    assert ac.hooks(ac.Card) == ac.Hooks(None, None, None, None, None, None)
+    table = ac.hooks(IgnoreFirstDamage)
+    assert table.before_combat is None and table.current_atk is None
+    assert table.take_damage is IgnoreFirstDamage.take_damage
+    assert table.on_game_start is IgnoreFirstDamage.on_game_start
+    assert ac.hooks(Thorns).take_damage is Thorns.take_damage
+    assert ac.Monster(TANK)._hooks is ac.hooks(ac.Card)
+
+
+def test_closed_form_matches_object_engine():
+    import random
+    from auto_chess import closed_form
+    rng = random.Random(1)
+    for _ in range(2000):
+        cards = [ac.Card(rng.randint(-1, 4), rng.randint(1, rng.choice([4, 40, 300])),
+                         f"vanilla {i}")
+                 for i in range(rng.randint(1, 6))]
+        (deck_0, deck_1) = (rng.choices(cards, k=rng.randint(1, 5)),
+                            rng.choices(cards, k=rng.randint(1, 5)))
+        max_turns = rng.choice([128, 10])
+        assert closed_form.resolve(deck_0, deck_1, max_turns=max_turns) == \
+            ac._Game(deck_0, deck_1, max_turns=max_turns).play()
+
+
+def test_duel_table():
+    from auto_chess import closed_form
+    table = closed_form.DuelTable()
+    table.add([BEAR, TANK, BRUISER, IgnoreFirstDamage(1, 1, "armor")])
+    assert len(table) == 9
+    assert table.duel(BRUISER, TANK) == ac.P1_WIN
+    assert table.duel(BEAR, BEAR) == ac.TIE
+
+
+def test_transpositions():
+    from auto_chess.caching import TranspositionTable
+    table = TranspositionTable(maxsize=256)
+    matchups = sample_matchups(300, deck_size=4, seed=3)
+    for max_turns in (128, 6):
+        for _ in range(2):
+            for (deck_0, deck_1) in matchups:
+                assert ac._Game(deck_0, deck_1, max_turns=max_turns,
+                                transpositions=table).play() == \
+                    ac._Game(deck_0, deck_1, max_turns=max_turns).play()
+    stats = table.stats()
+    assert stats.hits > 0 and stats.evictions > 0
+    assert stats.size == len(table) == 256
+    assert 0 < stats.hit_rate < 1
+
+
+def test_compiled_cards_match_handwritten():
+    from auto_chess.rampage import RampAge
+    from auto_chess.specs import (
+        Age, Armor, CardSpec, Explode, Grow, HealAllies, compile_card,
+    )
+    from auto_chess.vectorized import play_batch
+    compiled = {
+        "volatile": compile_card(CardSpec("volatile", 2, 1, (Explode(1),))),
+        "bezerker": compile_card(CardSpec("bezerker", 0, 5, (Grow(1),))),
+        "suicidal cleric": compile_card(
+            CardSpec("suicidal cleric", 1, 2, (HealAllies(1),))),
+        "armor": compile_card(CardSpec("armor", 2, 1, (Armor(1),))),
+        "old fogey": compile_card(CardSpec("old fogey", 0, 4, (Age(4),))),
+    }
+    assert compiled["volatile"] == compile_card(
+        CardSpec("volatile", 2, 1, (Explode(1),)))
+    assert compiled["volatile"] != ExplodeOnDeath(2, 1, "volatile")
+    assert ac.hooks(type(compiled["armor"])).current_atk is None
+    assert isinstance(ac.hooks(type(compiled["old fogey"])).current_atk,
+                      type(test_compiled_cards_match_handwritten))
+
+    def compile_deck(deck):
+        return [compiled.get(card.name, card) for card in deck]
+
+    matchups = sample_matchups(500, deck_size=4)
+    assert [ac._Game(compile_deck(deck_0), compile_deck(deck_1)).play()
+            for (deck_0, deck_1) in matchups] \
+        == [ac._Game(deck_0, deck_1).play() for (deck_0, deck_1) in matchups]
+
+    # several effects on one card, against hand-written cards
+    combined = [
+        compile_card(CardSpec("plated", 1, 3, (Armor(2), Grow(1)))),
+        compile_card(CardSpec("martyr", 1, 2, (Explode(1), HealAllies(1)))),
+        compile_card(CardSpec("veteran", 0, 4, (Age(2), Armor(1)))),
+    ]
+    others = [BEAR, TANK, RampAge(0, 4, "old fogey"), *combined]
+    matchups = [(combined, others[i:i + 3]) for i in range(len(others))] \
+        + [(others[i:i + 3], combined) for i in range(len(others))]
+    assert play_batch(matchups) == \
+        [ac._Game(deck_0, deck_1).play() for (deck_0, deck_1) in matchups]
+
+
+def test_card_spec_errors():
+    from auto_chess.specs import Age, CardSpec, Explode, Grow, compile_card
+    with pytest.raises(ValueError):
+        compile_card(CardSpec("twice", 1, 1, (Explode(1), Explode(2))))
+    with pytest.raises(ValueError):
+        compile_card(CardSpec("confused", 1, 1, (Grow(1), Age(2))))
+
+
+def test_registry():
+    from auto_chess.registry import CardRegistry
+    registry = CardRegistry()
+    bear = ac.Card(2, 2, "bear")
+    armor = IgnoreFirstDamage(2, 2, "bear")
+    assert registry.card_id(BEAR) == registry.card_id(bear) == 1
+    assert registry.card_id(armor) == 2
+    assert registry.canonical(bear) is BEAR
+    deck = [TANK, bear, armor, BRUISER, TANK]
+    key = registry.pack(deck)
+    assert registry.unpack(key) == (TANK, BEAR, armor, BRUISER, TANK)
+    assert registry.unpack(key)[1] is BEAR
+    assert registry.pack([]) == 0 and registry.unpack(0) == ()
+    assert len(registry) == 4
+
+    ac.play_auto_chess([BEAR, TANK, BRUISER], [bear, bear, bear])
+    key = (ac.REGISTRY.pack([BEAR, TANK, BRUISER]), ac.REGISTRY.pack([BEAR] * 3))
+    assert key in ac.GAME_CACHE
+
+
+def test_registry_forgets_cards(monkeypatch):
+    import gc
+    from auto_chess.registry import CardRegistry
+    registry = CardRegistry(capacity=10)
+    registry.card_id(BEAR)
+    for _ in range(100):
+        registry.pack([ac.Card(2, 2, "bear"), IgnoreFirstDamage(2, 2, "bear")])
+    gc.collect()
+    # equal cards share an id, and only the first of them is kept alive
+    assert len(registry) == 2 and len(registry._by_object) == 2
+
+    resets = []
+    registry.on_reset(lambda: resets.append(len(registry)))
+    registry.pack([ac.Card(1, health, "fresh") for health in range(1, 4)])
+    registry.reset_if_full()
+    assert resets == [] and len(registry) == 5
+    with pytest.raises(OverflowError):
+        registry.pack([ac.Card(1, health, "fresh") for health in range(4, 10)])
+    registry.reset_if_full()
+    assert resets == [0] and registry.generation == 1
+    assert registry.card_id(TANK) == 1
+
+    # play_auto_chess starts over between games rather than run out,
+    # and the game cache forgets the old ids
+    monkeypatch.setattr(ac.REGISTRY, "capacity", 40)
+    ac.REGISTRY.reset()
+    generation = ac.REGISTRY.generation
+    for atk in range(40):
+        deck = [ac.Card(atk, 3, "fresh"), GrowOnDamage(atk, 3, "fresh")]
+        assert ac.play_auto_chess(deck, [BEAR, TANK]) == \
+            ac._Game(deck, [BEAR, TANK]).play()
+    assert ac.REGISTRY.generation > generation
+    assert len(ac.GAME_CACHE) < 40
+
+
+def test_monster_state():
+    from auto_chess.survivalist import Survivalist
+    armor = ac.Monster(IgnoreFirstDamage(2, 1, "armor", armor_points=2))
+    assert armor._fields == {"armor_points": 0}
+    with pytest.raises(KeyError):
+        armor["armor_points"]
+    armor.on_game_start(None)
+    armor["armor_points"] -= 1
+    armor["undeclared"] = "kept aside"
+    assert armor["armor_points"] == 1 and armor["undeclared"] == "kept aside"
+    assert armor.state() == {"armor_points": 1, "undeclared": "kept aside"}
+    with pytest.raises(KeyError):
+        armor["missing"]
+    assert not hasattr(armor, "__dict__")
+
+    class Coward(Survivalist):
+        state_fields = ("fled",)
+    assert ac.state_layout(Coward) == {"atk": 0, "fled": 1}
+
+    # names are only made for monsters which are described
+    first = ac.Monster(BEAR)
+    second = ac.Monster(BEAR)
+    assert first._lazy_name is None
+    assert str(second).startswith("<monster bear-")
+    assert first._lazy_name is None
+
+
+def test_play_many():
+    matchups = sample_matchups(300, deck_size=3, seed=4)
+    matchups += [(deck_1, deck_0) for (deck_0, deck_1) in matchups]
+    matchups += [(deck_0, deck_0) for (deck_0, _) in matchups[:50]]
+    expected = [ac._Game(deck_0, deck_1).play() for (deck_0, deck_1) in matchups]
+    ac.GAME_CACHE.clear()
+    assert ac.play_many(matchups) == expected
+    # one deck's players are reset for each of its games
+    matchups = sample_matchups(200, deck_size=4, seed=5)
+    deck = matchups[0][0]
+    opponents = [deck_1 for (_, deck_1) in matchups] * 2
+    assert ac.play_against(deck, opponents) == \
+        [ac._Game(deck, opponent).play() for opponent in opponents]
+
+
+def test_player_reset():
+    from auto_chess.survivalist import Survivalist
+    player = ac.Player([IgnoreFirstDamage(1, 2, "armor"), Survivalist(2, 2, "coward")])
+    game = ac._Game([], [], players=(player, ac.Player([BEAR])))
+    assert game.play() == ac.P0_WIN
+    player.reset()
+    assert [(monster._remaining_health, monster.state())
+            for monster in player.monsters] == [(2, {}), (2, {})]
+    assert player.has_atk(game.gamestates()[0])
+
+
+def test_disk_cache(tmp_path, monkeypatch):
+    from auto_chess import persistent
+    path = str(tmp_path / "matchups.sqlite")
+    # the name doesn't change what a card does; its params and class do
+    fingerprint = persistent.card_fingerprint
+    assert fingerprint(ac.Card(2, 2, "bear")) == fingerprint(ac.Card(2, 2, "cub"))
+    assert fingerprint(ExplodeOnDeath(2, 2, "bear")) != fingerprint(BEAR)
+    assert fingerprint(IgnoreFirstDamage(2, 2, "armor", armor_points=2)) \
+        != fingerprint(IgnoreFirstDamage(2, 2, "armor"))
+
+    matchups = sample_matchups(40, deck_size=3, seed=6)
+    matchups += sample_matchups(20, deck_size=4, seed=7)
+    expected = [ac._Game(deck_0, deck_1).play() for (deck_0, deck_1) in matchups]
+    try:
+        store = persistent.enable(path, flush_every=16)
+        ac.GAME_CACHE.clear()
+        assert ac.play_many(matchups) == expected
+        assert len(store) == len(matchups)
+        persistent.disable()
+
+        # a new store, as in another process, finds every result there
+        # without playing
+        store = persistent.enable(path)
+        ac.GAME_CACHE.clear()
+        monkeypatch.setattr(ac, "_play", None)
+        assert [ac.play_auto_chess(deck_0, deck_1) for (deck_0, deck_1) in matchups] \
+            == expected
+        monkeypatch.undo()
+
+        # changing a card's code orphans its results
+        (deck_0, deck_1) = ([BEAR], [TANK])
+        store.put(deck_0, deck_1, ac.P0_WIN)
+        monkeypatch.setattr(persistent, "_CLASS_DIGESTS", {})
+        monkeypatch.setattr(persistent, "_CARD_DIGESTS", {})
+        monkeypatch.setattr(persistent, "_module_digest", lambda name: b"edited")
+        assert store.get(deck_0, deck_1) is None
+        monkeypatch.undo()
+        store.flush()
+        assert store.get(deck_0, deck_1) == ac.P0_WIN
+        # and so does changing the engine, such as the closed forms
+        monkeypatch.setattr(persistent, "_CLASS_DIGESTS", {})
+        monkeypatch.setattr(persistent, "_CARD_DIGESTS", {})
+        monkeypatch.setattr(persistent, "_ENGINE_DIGEST", b"edited")
+        assert store.get(deck_0, deck_1) is None
+    finally:
+        persistent.disable()
+
+
+def test_game_cache():
+    from auto_chess.caching import LRUCache
+    cache = LRUCache(3)
+    for key in "abcd":
+        cache.put(key, key)
+    assert "a" not in cache and cache.get("b") == "b" and cache.get("a") is None
+    cache.resize(1)
+    assert list(cache._entries) == ["b"]
+    assert cache.stats() == (1, 1, 3, 1, 1)
+    with pytest.raises(ValueError):
+        cache.resize(0)
+
+    # decks of any size are cached, and at most maxsize of them
+    ac.GAME_CACHE.clear()
+    ac.GAME_CACHE.resize(8)
+    try:
+        matchups = [pair for size in (1, 2, 3, 5) for pair in sample_matchups(4, size)]
+        results = ac.play_many(matchups)
+        assert ac.play_many(matchups[-8:]) == results[-8:]
+        stats = ac.GAME_CACHE.stats()
+        assert (stats.hits, stats.misses, stats.size) == (8, 16, 8)
+        assert stats.evictions == 8
+        assert ac.play_auto_chess(*matchups[0]) == results[0]
+        assert ac.GAME_CACHE.stats().misses == 17
+    finally:
+        ac.GAME_CACHE.resize(ac.GAME_CACHE_SIZE)
+        ac.GAME_CACHE.clear()
+
+
+def test_import_is_light():
+    # workers and tests import auto_chess before playing anything, so
+    # it must not pull in the scientific stack. benchmark.py tracks how
+    # long it takes.
+    import os
+    import subprocess
+    import sys
+    heavy = ["numpy", "pathos", "pygad", "multiprocess", "dill"]
+    script = ("import sys; import auto_chess, analysis; "
+              f"print([m for m in {heavy!r} if m in sys.modules])")
+    out = subprocess.run([sys.executable, "-c", script], capture_output=True,
+                         text=True, check=True,
+                         cwd=os.path.dirname(os.path.dirname(__file__))).stdout
+    assert out.strip() == "[]"
+
+
+def test_golden_corpus(tmp_path):
+    from auto_chess import golden
+    cards = all_special_cards()[:6]
+    corpus = golden.generate(cards, 2)
+    path = str(tmp_path / "corpus.golden")
+    corpus.save(path)
+    corpus = golden.Corpus.load(path)
+    assert len(corpus) == 36 ** 2
+    k = 100
+    assert corpus.payoffs(k) == ac._Game(*corpus.matchup(k)).play()
+    for backend in golden.BACKENDS:
+        assert golden.check(corpus, backend) is None
+
+    def broken(matchups):
+        return [ac.P1_WIN if len(p0_deck + p1_deck) == 4 and p0_deck[0] == TANK
+                else ac._Game(p0_deck, p1_deck).play()
+                for (p0_deck, p1_deck) in matchups]
+    divergence = golden.check(corpus, broken)
+    first = next(k for k in range(len(corpus))
+                 if corpus.matchup(k)[0][0] == TANK and corpus.payoffs(k) != ac.P1_WIN)
+    assert divergence.k == first
+    assert divergence.actual == ac.P1_WIN
+    assert divergence.expected == corpus.payoffs(first)
+    assert divergence.trace().of(ac.trace.END)[0][1] == divergence.expected
+
+
+def test_benchmark(monkeypatch, tmp_path):
+    import benchmark
+    from auto_chess import persistent
+    from auto_chess.caching import TranspositionTable
+    case = benchmark.Case("simple", 3, "warm")
+    assert case.name == "simple/3/warm" and case in benchmark.all_cases()
+    # the cases empty the transposition table, and bypass the disk cache
+    table = TranspositionTable()
+    store = persistent.MatchupStore(str(tmp_path / "matchups.sqlite"))
+    monkeypatch.setattr(ac, "TRANSPOSITIONS", table)
+    monkeypatch.setattr(ac, "DISK_CACHE", store)
+    current = benchmark.run([case, case._replace(cache="cold")], games=20, repeat=1,
+                            min_time=0.0)
+    assert len(table) == 0 and len(store) == 0 and ac.DISK_CACHE is store
+    assert set(current["games_per_second"]) == {"simple/3/warm", "simple/3/cold"}
+    assert 0 < current["import_seconds"] < 10
+    assert len(ac.GAME_CACHE) == 0
+    baseline = {"games_per_second": {"simple/3/warm": 1000.0, "simple/3/cold": 1.0},
+                "import_seconds": 0.1}
+    current["games_per_second"] = {"simple/3/warm": 700.0, "simple/3/cold": 1.0,
+                                   "all/3/cold": 2.0}
+    current["import_seconds"] = 0.14
+    assert benchmark.compare(baseline, current) == \
+        [benchmark.Regression("simple/3/warm", 1000.0, 700.0),
+         benchmark.Regression("import", 0.1, 0.14)]
+    assert benchmark.compare(baseline, current, tolerance=0.5) == []
+
+
+def test_profiling():
+    from auto_chess import profiling
+
+    class Shrapnel(ExplodeOnDeath):
+        def on_death(self, monster, gamestate):
+            super().on_death(monster, gamestate)
+
+    bomb = ExplodeOnDeath(1, 1, "volatile", explode_damage=1)
+    shrapnel = Shrapnel(1, 1, "shrapnel", explode_damage=1)
+    armor = IgnoreFirstDamage(1, 2, "armor")
+    matchups = [([bomb, bomb], [BEAR, TANK]), ([shrapnel, armor], [bomb, armor])]
+    expected = [ac._Game(*matchup).play() for matchup in matchups]
+    with profiling.profiling() as profile:
+        assert [ac._Game(*matchup).play() for matchup in matchups] == expected
+        assert hasattr(Shrapnel.on_death, "__wrapped__")
+    assert profiling.PROFILE is None
+    assert "on_death" in vars(Shrapnel) and "on_death" not in vars(IgnoreFirstDamage)
+    assert ac.hooks(Shrapnel).on_death is vars(Shrapnel)["on_death"]
+
+    by_class = profile.by_class()
+    # each death once, under the card's own class, however many
+    # classes' hooks it ran through
+    assert by_class["ExplodeOnDeath", "on_death"].calls == 3
+    assert by_class["Shrapnel", "on_death"].calls == 1
+    assert by_class["IgnoreFirstDamage", "take_damage"].calls >= 2
+    assert ("Card", "take_damage") not in by_class
+    by_card = profile.by_card()
+    assert by_card[profiling.card_label(bomb), "on_death"] \
+        == by_class["ExplodeOnDeath", "on_death"]
+    assert sum(stats.calls for stats in by_card.values()) \
+        == sum(stats.calls for stats in by_class.values())
+    assert len(profile.render(top=1)) == 4
+
+    # workers' profiles, written after each play_many, are merged in
+    merged = profiling.Profile()
+    with profiling.profiling(merged, processes=True):
+        worker = profiling.Profile(merged.directory, worker=True)
+        worker.record(ExplodeOnDeath, bomb, "on_death", 0.5)
+        worker.flush()
+    assert merged.by_class() == {("ExplodeOnDeath", "on_death"): (1, 0.5)}
+
+    # cards which print alike are counted apart
+    from auto_chess import vectorized
+
+    class Inert(ExplodeOnDeath):
+        pass
+    inert = Inert(1, 1, "volatile", explode_damage=1)
+    assert str(inert) == str(bomb)
+    with profiling.profiling() as profile:
+        ac._Game([bomb, inert], [TANK]).play()
+        # instrumented, Inert hides the batched hook it inherits
+        assert not vectorized.batchable(Inert)
+    assert len(profile.by_card()) == 2
+    # but only while profiling
+    assert vectorized.batchable(Inert)
+
+
+def test_game_stats():
+    import analysis
+    from auto_chess.stats import NOT_DEALT, SURVIVED, StatsTable, play_with_stats
+
+    (payoffs, stats) = ac.play_auto_chess([BEAR, TANK], [BRUISER], with_stats=True)
+    assert payoffs == ac.P0_WIN
+    assert stats == (1, ((1, SURVIVED), (1,)), ((0, 4), (0,)))
+    assert stats.survivors(0) == [1] and stats.survivors(1) == []
+
+    # neither side can attack, so no turn is fought
+    wall = ac.Card(0, 3, "wall")
+    (payoffs, stats) = play_with_stats([wall], [wall], max_turns=40)
+    assert payoffs == ac.TIE
+    assert stats == (0, ((SURVIVED,), (SURVIVED,)), ((3,), (3,)))
+
+    bomb = ExplodeOnDeath(1, 1, "volatile", explode_damage=2)
+    decks = [[BEAR], [BRUISER, TANK], [bomb, BEAR], [TANK, bomb]]
+    table = StatsTable(len(decks), 2)
+    results = analysis.round_robin(ac.payoff_fn, decks, stats=table)
+    assert [r.avg_payoff for r in results] \
+        == [r.avg_payoff for r in analysis.round_robin(ac.payoff_fn, decks)]
+    for i in range(len(decks)):
+        for j in range(len(decks)):
+            if i <= j:
+                assert table[i, j] == ac.play_auto_chess(decks[i], decks[j],
+                                                         with_stats=True)[1]
+            else:
+                (turns, death_turns, health) = table[j, i]
+                assert table[i, j] == (turns, death_turns[::-1], health[::-1])
+    assert table.death_turns[0, 1, 0, 1] == NOT_DEALT
+
+    with pytest.raises(ValueError):
+        analysis.round_robin(ac.play_auto_chess, decks, stats=table)